@@ -0,0 +1,253 @@
+#!/usr/bin/env python3
+"""
+End-to-end render latency benchmark for the statusline scripts.
+
+Each variant is run as Claude Code runs it - a fresh process reading a stdin
+payload - against local stand-ins for every external dependency (see
+statusline_fakes.py): a throwaway HOME with transcripts, a stub `ccusage` and
+fake CCR, Qdrant and codeindex servers. Reports p50/p95/p99 wall time, CPU
+time (user + system, including helpers the script waited for and, on Linux,
+the detached background refreshers it started) and peak RSS per variant and
+payload, and stores them as JSON for later comparison.
+
+Usage:
+    python3 bench-statusline.py                      # all variants, built-in payloads
+    python3 bench-statusline.py --runs 50 --payload recorded.json
+    python3 bench-statusline.py --compare baseline.json --threshold 15
+
+Author: Claude Code Community
+License: MIT
+"""
+
+import argparse
+import json
+import math
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+from statusline_fakes import FakeServices, install_fake_ccusage, make_fake_home, write_ccr_config
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+VARIANTS = ['claude-statusline.py', 'claude-statusline-v1092.py', 'ccstatus-fixed.py']
+COMPARED_METRICS = [('wallMs', 'p50'), ('wallMs', 'p95'), ('cpuMs', 'p50'), ('peakRssKb', 'max')]
+
+def recorded_payloads(session_id, transcript_path, cwd):
+    """Payloads as captured from Claude Code with debug-input.py, re-pointed at the fake HOME"""
+    return {
+        'context-window': {
+            'hook_event_name': 'Status',
+            'session_id': session_id,
+            'transcript_path': transcript_path,
+            'cwd': cwd,
+            'model': {'id': 'claude-sonnet-4-5-20250929', 'display_name': 'Sonnet 4.5'},
+            'workspace': {'current_dir': cwd, 'project_dir': cwd},
+            'version': '2.0.76',
+            'output_style': {'name': 'default'},
+            'cost': {'total_cost_usd': 1.8421, 'total_duration_ms': 912000,
+                     'total_api_duration_ms': 301000, 'total_lines_added': 120,
+                     'total_lines_removed': 31},
+            'exceeds_200k_tokens': False,
+            'context_window': {
+                'total_input_tokens': 1_830_000, 'total_output_tokens': 45_000,
+                'context_window_size': 200000, 'used_percentage': 41.5,
+                'current_usage': {'input_tokens': 12, 'output_tokens': 850,
+                                  'cache_creation_input_tokens': 2100,
+                                  'cache_read_input_tokens': 80040},
+            },
+        },
+        'legacy': {
+            'session_id': session_id,
+            'transcript_path': transcript_path,
+            'model': {'id': 'claude-opus-4-1-20250805', 'display_name': 'Opus 4.1'},
+            'workspace': {'current_dir': cwd},
+            'version': '1.0.88',
+        },
+        'empty': {},
+    }
+
+def percentile(samples, pct):
+    """Nearest-rank percentile"""
+    ordered = sorted(samples)
+    return ordered[max(0, math.ceil(pct / 100 * len(ordered)) - 1)]
+
+def summarize(samples):
+    return {
+        'p50': round(percentile(samples, 50), 3),
+        'p95': round(percentile(samples, 95), 3),
+        'p99': round(percentile(samples, 99), 3),
+        'mean': round(sum(samples) / len(samples), 3),
+        'max': round(max(samples), 3),
+    }
+
+def become_subreaper():
+    """Adopt the detached helpers renders leave behind so they can be waited for (Linux only)"""
+    if not sys.platform.startswith('linux'):
+        return False
+    try:
+        import ctypes
+        libc = ctypes.CDLL(None, use_errno=True)
+        return libc.prctl(36, 1, 0, 0, 0) == 0  # PR_SET_CHILD_SUBREAPER
+    except (OSError, AttributeError):
+        return False
+
+def reap_helpers():
+    """Wait for every orphaned helper; returns (count, cpu ms)"""
+    count, cpu_ms = 0, 0.0
+    while True:
+        try:
+            _, _, usage = os.wait4(-1, 0)
+        except ChildProcessError:
+            return count, cpu_ms
+        count += 1
+        cpu_ms += (usage.ru_utime + usage.ru_stime) * 1000
+
+def run_once(script, payload, env, cwd, subreaper=False):
+    """Render once; returns (wall ms, cpu ms, peak rss KB, exit status, background helpers)"""
+    start = time.perf_counter()
+    proc = subprocess.Popen([sys.executable, script], stdin=subprocess.PIPE,
+                            stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, env=env, cwd=cwd)
+    proc.stdin.write(payload.encode('utf-8'))
+    proc.stdin.close()
+    proc.stdout.read()
+    _, status, usage = os.wait4(proc.pid, 0)
+    wall_ms = (time.perf_counter() - start) * 1000
+    proc.returncode = os.waitstatus_to_exitcode(status)
+    proc.stdout.close()
+
+    cpu_ms = (usage.ru_utime + usage.ru_stime) * 1000
+    # Background refreshers outlive the render; as their subreaper we wait for
+    # them here so their CPU counts and they never overlap the next render
+    helpers = 0
+    if subreaper:
+        helpers, helper_cpu_ms = reap_helpers()
+        cpu_ms += helper_cpu_ms
+
+    rss_kb = usage.ru_maxrss / 1024 if sys.platform == 'darwin' else usage.ru_maxrss
+    return wall_ms, cpu_ms, rss_kb, proc.returncode, helpers
+
+def bench(variants, payloads, runs, warmup, env, cwd, subreaper):
+    results = {}
+    for variant in variants:
+        script = os.path.join(SCRIPT_DIR, variant)
+        results[variant] = {}
+        for name, payload in payloads.items():
+            for _ in range(warmup):
+                run_once(script, payload, env, cwd, subreaper)
+            wall, cpu, rss, failures, helpers = [], [], [], 0, 0
+            for _ in range(runs):
+                wall_ms, cpu_ms, rss_kb, returncode, spawned = run_once(script, payload, env, cwd, subreaper)
+                wall.append(wall_ms)
+                cpu.append(cpu_ms)
+                rss.append(rss_kb)
+                failures += returncode != 0
+                helpers += spawned
+            results[variant][name] = {
+                'wallMs': summarize(wall),
+                'cpuMs': summarize(cpu),
+                'peakRssKb': {'max': max(rss), 'p50': percentile(rss, 50)},
+                'failures': failures,
+                'helpers': helpers if subreaper else None,
+            }
+            row = results[variant][name]
+            print(f"{variant:28s} {name:16s} wall p50 {row['wallMs']['p50']:7.1f} ms"
+                  f"  p95 {row['wallMs']['p95']:7.1f}  p99 {row['wallMs']['p99']:7.1f}"
+                  f"  cpu p50 {row['cpuMs']['p50']:6.1f} ms  rss {row['peakRssKb']['max'] / 1024:5.1f} MB"
+                  + (f"  helpers {helpers}" if subreaper else "")
+                  + (f"  ({failures} failed)" if failures else ""))
+    return results
+
+def compare(baseline, current, threshold):
+    """Print per-metric changes against a stored run; True if anything regressed"""
+    regressed = False
+    print(f"\nCompared with {baseline.get('timestamp', 'baseline')} (threshold {threshold:.0f}%):")
+    for variant, rows in current['results'].items():
+        for name, row in rows.items():
+            old_row = baseline.get('results', {}).get(variant, {}).get(name)
+            if not old_row:
+                continue
+            for metric, stat in COMPARED_METRICS:
+                old, new = old_row[metric][stat], row[metric][stat]
+                change = (new - old) / old * 100 if old else 0.0
+                flag = ""
+                if change > threshold:
+                    flag = "  ⚠️ regression"
+                    regressed = True
+                print(f"  {variant:28s} {name:16s} {metric}.{stat:4s} {old:10.1f} → {new:10.1f} ({change:+.1f}%){flag}")
+    return regressed
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--runs', type=int, default=30, help='measured renders per variant and payload')
+    parser.add_argument('--warmup', type=int, default=2, help='unmeasured renders first')
+    parser.add_argument('--variant', action='append', choices=VARIANTS, help='limit to these scripts')
+    parser.add_argument('--payload', action='append', default=[], help='extra recorded stdin payload (JSON file)')
+    parser.add_argument('--output', help='results file (default: statusline-bench-<timestamp>.json)')
+    parser.add_argument('--compare', help='earlier results file to compare against')
+    parser.add_argument('--threshold', type=float, default=10.0, help='regression threshold in percent')
+    args = parser.parse_args()
+
+    root = tempfile.mkdtemp(prefix='statusline-bench-')
+    home = os.path.join(root, 'home')
+    cwd = os.path.join(root, 'work', 'bench-project')
+    bin_dir = os.path.join(root, 'bin')
+    session_id, transcript = make_fake_home(home, cwd)[0]
+    install_fake_ccusage(bin_dir, cwd)
+
+    try:
+        services = FakeServices(cwd).start()
+    except OSError as e:
+        shutil.rmtree(root, ignore_errors=True)
+        print(f"❌ Cannot start the fake Qdrant/codeindex servers on ports 6333/3847: {e}")
+        print("   Stop the real services while benchmarking.")
+        return 2
+    write_ccr_config(home, services.ccr_port)
+
+    payloads = {name: json.dumps(data) for name, data in recorded_payloads(session_id, transcript, cwd).items()}
+    for path in args.payload:
+        with open(path, 'r') as f:
+            payloads[os.path.splitext(os.path.basename(path))[0]] = f.read()
+
+    env = dict(os.environ, HOME=home, PWD=cwd, PATH=bin_dir + os.pathsep + os.environ.get('PATH', ''))
+    for name in ('CLAUDE_STATUSLINE_USAGE', 'CLAUDE_STATUSLINE_BUDGET_MS', 'CLAUDE_STATUSLINE_SCRIPT'):
+        env.pop(name, None)
+
+    subreaper = become_subreaper()
+    print(f"Benchmarking {args.runs} renders per variant and payload")
+    if not subreaper:
+        print("Background refreshers are not counted (needs Linux to adopt them)")
+    print("=" * 60)
+    try:
+        results = bench(args.variant or VARIANTS, payloads, args.runs, args.warmup, env, cwd, subreaper)
+    finally:
+        services.stop()
+        shutil.rmtree(root, ignore_errors=True)
+
+    document = {
+        'timestamp': datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'runs': args.runs,
+        'helpersCounted': subreaper,
+        'results': results,
+    }
+    output = args.output or f"statusline-bench-{datetime.now().strftime('%Y%m%d-%H%M%S')}.json"
+    with open(output, 'w') as f:
+        json.dump(document, f, indent=2)
+    print("=" * 60)
+    print(f"Results written to {output}")
+
+    if args.compare:
+        with open(args.compare, 'r') as f:
+            baseline = json.load(f)
+        if compare(baseline, document, args.threshold):
+            return 1
+    return 0
+
+if __name__ == "__main__":
+    exit(main())
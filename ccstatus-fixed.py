@@ -14,6 +14,8 @@ from datetime import datetime
 import os
 import re
 
+from statusline_models import format_model_name
+
 def format_number(num):
     """Format number with K/M/B suffix"""
     if num >= 1_000_000_000:
@@ -207,29 +209,10 @@ def calculate_status(claude_data=None):
                 model = model_display
             elif model_id:
                 # Convert model ID to display name
-                if 'sonnet' in model_id.lower():
-                    if '4' in model_id:
-                        model = "Claude 3.5 Sonnet 4"
-                    else:
-                        model = "Claude 3.5 Sonnet"
-                elif 'opus' in model_id.lower():
-                    model = "Claude 3 Opus"
-                elif 'haiku' in model_id.lower():
-                    model = "Claude 3 Haiku"
-                else:
-                    model = model_id
+                model = format_model_name(model_id)
         else:
             # Handle simple string model names
-            model_str = str(model_info).lower()
-            if 'sonnet' in model_str:
-                # Check if this is the current Sonnet 4 model being used
-                model = "Claude 3.5 Sonnet 4"
-            elif 'opus' in model_str:
-                model = "Claude 3 Opus"
-            elif 'haiku' in model_str:
-                model = "Claude 3 Haiku"
-            else:
-                model = str(model_info)
+            model = format_model_name(str(model_info))
     
     # Format costs
     session_str = f"${session_cost:.2f}" if session_found else "N/A"
@@ -0,0 +1,167 @@
+#!/usr/bin/env python3
+"""
+Thin client for the persistent Claude Code statusline daemon.
+Forwards the stdin payload over a Unix socket and prints the rendered line,
+spawning `claude-statusline.py --daemon` on first use.
+
+Author: Claude Code Community
+License: MIT
+"""
+
+import json
+import os
+import socket
+import sys
+import time
+
+SOCKET_PATH = os.path.expanduser('~/.claude/statusline.sock')
+DAEMON_SCRIPT = os.environ.get(
+    'CLAUDE_STATUSLINE_SCRIPT',
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), 'claude-statusline.py')
+)
+CACHE_DIR = os.path.expanduser('~/.claude/statusline-cache')
+LAST_LINE_FILE = os.path.join(CACHE_DIR, 'client-last-lines.json')
+LAST_LINE_LIMIT = 32  # (cwd, session) pairs whose last line is remembered
+SPAWN_WAIT = 2.0      # seconds to wait for a freshly spawned daemon to listen
+UNAVAILABLE_LINE = "🤖 Claude | 💰 Status unavailable (daemon busy)"
+
+# The daemon answers within the render budget, as the one-shot script does; a
+# reply much later than that is not worth waiting for, so the last line shown
+# is printed again instead. A direct run also pays for interpreter startup.
+RENDER_BUDGET_MS = 150.0
+try:
+    RENDER_BUDGET_MS = float(os.environ.get('CLAUDE_STATUSLINE_BUDGET_MS', '150'))
+except ValueError:
+    pass
+REPLY_TIMEOUT = RENDER_BUDGET_MS / 1000 + 0.25
+DIRECT_TIMEOUT = RENDER_BUDGET_MS / 1000 + 1.0
+
+def request_status(request):
+    """Send one request to the daemon and return its reply"""
+    client = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        client.settimeout(REPLY_TIMEOUT)
+        client.connect(SOCKET_PATH)
+        client.sendall(request)
+        client.shutdown(socket.SHUT_WR)
+        chunks = []
+        while True:
+            chunk = client.recv(65536)
+            if not chunk:
+                break
+            chunks.append(chunk)
+        return b''.join(chunks).decode('utf-8', 'replace')
+    finally:
+        client.close()
+
+def line_key(cwd, payload):
+    """Key for the last line shown in this directory for this session"""
+    try:
+        session_id = json.loads(payload or '{}').get('session_id')
+    except (ValueError, AttributeError):
+        session_id = None
+    return json.dumps([cwd, session_id or ''])
+
+def load_last_lines():
+    """Last line shown per key, oldest first"""
+    try:
+        with open(LAST_LINE_FILE, 'r') as f:
+            lines = json.load(f)
+        return lines if isinstance(lines, dict) else {}
+    except (OSError, ValueError):
+        return {}
+
+def remember_line(key, line):
+    """Keep the line just shown so a late reply can be covered by it next time"""
+    lines = load_last_lines()
+    if not line or lines.get(key) == line:
+        return
+    lines.pop(key, None)
+    lines[key] = line
+    while len(lines) > LAST_LINE_LIMIT:
+        lines.pop(next(iter(lines)))
+    try:
+        os.makedirs(CACHE_DIR, exist_ok=True)
+        tmp = f"{LAST_LINE_FILE}.{os.getpid()}.tmp"
+        with open(tmp, 'w') as f:
+            json.dump(lines, f)
+        os.replace(tmp, LAST_LINE_FILE)
+    except OSError:
+        pass
+
+def last_line(key):
+    """The last line shown for this key, or a placeholder"""
+    return load_last_lines().get(key) or UNAVAILABLE_LINE
+
+def spawn_daemon():
+    """Start the daemon fully detached from this process and its terminal"""
+    import subprocess
+    subprocess.Popen(
+        [sys.executable, DAEMON_SCRIPT, '--daemon'],
+        stdin=subprocess.DEVNULL,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+        start_new_session=True,
+        close_fds=True
+    )
+
+def run_direct(payload):
+    """Fallback: render in a one-shot process exactly like the plain script.
+
+    Returns None when the script does not answer within DIRECT_TIMEOUT.
+    """
+    import subprocess
+    try:
+        result = subprocess.run(
+            [sys.executable, DAEMON_SCRIPT],
+            input=payload,
+            capture_output=True,
+            text=True,
+            timeout=DIRECT_TIMEOUT
+        )
+    except subprocess.TimeoutExpired:
+        return None
+    return result.stdout.rstrip('\n')
+
+def show(key, line):
+    """Print a fresh line and remember it"""
+    print(line)
+    remember_line(key, line)
+
+def main():
+    """Main entry point"""
+    payload = sys.stdin.read()
+    cwd = os.environ.get('PWD') or os.getcwd()
+    request = json.dumps({'cwd': cwd, 'payload': payload}).encode('utf-8')
+    key = line_key(cwd, payload)
+
+    try:
+        show(key, request_status(request))
+        return
+    except socket.timeout:
+        print(last_line(key))
+        return
+    except OSError:
+        pass  # No daemon listening yet
+
+    spawn_daemon()
+    deadline = time.monotonic() + SPAWN_WAIT
+    while time.monotonic() < deadline:
+        time.sleep(0.02)
+        try:
+            show(key, request_status(request))
+            return
+        except socket.timeout:
+            print(last_line(key))
+            return
+        except OSError:
+            continue
+
+    line = run_direct(payload)
+    if line is None:
+        print(last_line(key))
+    else:
+        show(key, line)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,235 @@
+#!/usr/bin/env python3
+"""
+Fast path for the Claude Code statusline.
+Renders the model, session cost and context window straight from the stdin
+payload, then appends the expensive segments (spend, burn rate, git branch,
+codeindex, CCR model) only if `claude-statusline.py --refresh-enrichment` has
+already cached them. A stale or missing cache entry is refreshed in the
+background after the line is printed, so it shows up on the next render.
+
+Imports are kept to what the payload needs; startup-to-print stays within
+FAST_PATH_BUDGET_MS of a bare interpreter start (see test-fast-path.py).
+
+Author: Claude Code Community
+License: MIT
+"""
+
+import json
+import os
+import sys
+import time
+import zlib
+
+CACHE_DIR = os.path.expanduser('~/.claude/statusline-cache')
+ENRICHMENT_FILE = os.path.join(CACHE_DIR, 'enrichment.json')
+ENRICHMENT_TTL = 10.0  # seconds
+try:
+    ENRICHMENT_TTL = float(os.environ.get('CLAUDE_STATUSLINE_FAST_TTL', '10'))
+except ValueError:
+    pass
+REFRESH_MARKER_TTL = 60  # a refresh marker older than this belongs to a dead refresher
+STATUSLINE_SCRIPT = os.environ.get(
+    'CLAUDE_STATUSLINE_SCRIPT',
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), 'claude-statusline.py')
+)
+FAST_PATH_BUDGET_MS = 25  # startup-to-print, on top of `python3 -c pass`
+
+RESET = "\033[0m"
+GREEN = "\033[32m"
+YELLOW = "\033[33m"
+RED = "\033[31m"
+
+def format_number(num):
+    """Format number with K/M/B suffix"""
+    if num >= 1_000_000_000:
+        return f"{num/1_000_000_000:.1f}B"
+    elif num >= 1_000_000:
+        return f"{num/1_000_000:.1f}M"
+    elif num >= 1_000:
+        return f"{num/1_000:.1f}K"
+    else:
+        return str(num)
+
+def context_color(pct):
+    """Green below 50%, yellow below 80%, red from there on"""
+    if pct is None:
+        return ""
+    if pct >= 80:
+        return RED
+    if pct >= 50:
+        return YELLOW
+    return GREEN
+
+def read_context(claude_data):
+    """(tokens, window size, percent used) from the payload's context_window"""
+    tokens = window = pct = None
+    cw_data = claude_data.get('context_window')
+    if isinstance(cw_data, dict):
+        window = cw_data.get('context_window_size')
+        pct = cw_data.get('used_percentage')
+        current_usage = cw_data.get('current_usage')
+        if isinstance(current_usage, dict):
+            total = sum(current_usage.get(field) or 0 for field in (
+                'input_tokens', 'output_tokens',
+                'cache_creation_input_tokens', 'cache_read_input_tokens'))
+            if total > 0:
+                tokens = total
+        if tokens is None and pct is not None and window is not None:
+            tokens = int(window * pct / 100)
+    if window is None and isinstance(claude_data.get('model'), dict):
+        window = claude_data['model'].get('context_window_tokens')
+    return tokens, window, pct
+
+def format_context(tokens, window, pct):
+    """📊 segment, or None when the payload carries no context data"""
+    c = context_color(pct)
+    if tokens is not None and window is not None:
+        text = f"📊 {c}{format_number(tokens)}/{format_number(window)}"
+        if pct is not None:
+            if isinstance(pct, float) and pct != int(pct):
+                text += f" ({pct:.1f}%)"
+            else:
+                text += f" ({int(pct)}%)"
+        return text + RESET
+    if pct is not None and window is not None:
+        return f"📊 {c}{int(pct)}% of {format_number(window)}{RESET}"
+    if tokens is not None:
+        return f"📊 {format_number(tokens)} tokens"
+    return None
+
+def payload_model(claude_data):
+    """Display name for the model named in the payload, if any"""
+    model_data = claude_data.get('model')
+    model_id = model_data
+    if isinstance(model_data, dict):
+        model_id = model_data.get('name', model_data.get('id', model_data.get('model', '')))
+    if not model_id or not isinstance(model_id, str):
+        return None
+    from statusline_models import format_model_name
+    return format_model_name(model_id)
+
+def load_enrichment(key):
+    """Cached expensive segments for this cwd and session, or None"""
+    try:
+        with open(ENRICHMENT_FILE, 'r') as f:
+            entry = json.load(f).get(key)
+    except (OSError, AttributeError, ValueError):
+        return None
+    return entry if isinstance(entry, dict) else None
+
+def refresh_marker_path(key):
+    """Same marker as claude-statusline.py's refresh_marker('enrichment', key)"""
+    return os.path.join(CACHE_DIR, f"enrichment-{zlib.crc32(key.encode('utf-8')):08x}.refreshing")
+
+def claim_refresh(key):
+    """Same claim as claude-statusline.py's claim_refresh, for this entry's marker"""
+    marker = refresh_marker_path(key)
+    try:
+        os.makedirs(CACHE_DIR, exist_ok=True)
+        os.close(os.open(marker, os.O_CREAT | os.O_EXCL | os.O_WRONLY, 0o600))
+        return True
+    except FileExistsError:
+        import fcntl
+        try:
+            with open(os.path.join(CACHE_DIR, 'refresh-takeover.lock'), 'w') as lock:
+                fcntl.flock(lock, fcntl.LOCK_EX)
+                if time.time() - os.path.getmtime(marker) > REFRESH_MARKER_TTL:
+                    os.utime(marker)
+                    return True
+        except OSError:
+            pass
+        return False
+    except OSError:
+        return False
+
+def spawn_refresh(cwd, session_id, key):
+    """Refresh this entry in a detached `--refresh-enrichment` process"""
+    import subprocess
+    request = json.dumps({'cwd': cwd, 'sessionId': session_id})
+    try:
+        subprocess.Popen(
+            [sys.executable, STATUSLINE_SCRIPT, '--refresh-enrichment', request],
+            stdin=subprocess.DEVNULL,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+            start_new_session=True,
+            close_fds=True
+        )
+    except OSError:
+        try:
+            os.unlink(refresh_marker_path(key))
+        except OSError:
+            pass
+
+def render(claude_data, entry):
+    """Build the status line from the payload plus whatever enrichment is cached"""
+    entry = entry or {}
+    tokens, window, pct = read_context(claude_data)
+
+    model = entry.get('ccrModel') or payload_model(claude_data) or entry.get('blockModels') or "Claude"
+    model_display = f"🤖 {model}"
+    if claude_data.get('exceeds_200k_tokens'):
+        model_display += f" {RED}⚠️ CONTEXT FULL{RESET}"
+    elif pct is not None and pct >= 80:
+        model_display += f" {RED}⚠️ {int(pct)}%{RESET}"
+    elif pct is not None and pct >= 50:
+        model_display += f" {YELLOW}⚠️{RESET}"
+    parts = [model_display]
+
+    if entry.get('gitBranch'):
+        parts.append(f"🌿 {entry['gitBranch']}")
+    if entry.get('codeindex'):
+        parts.append(entry['codeindex'])
+
+    session_cost = None
+    if isinstance(claude_data.get('cost'), dict):
+        session_cost = claude_data['cost'].get('total_cost_usd')
+    session_str = f"${session_cost:.2f}" if isinstance(session_cost, (int, float)) else "N/A"
+    if entry:
+        parts.append(f"💰 {session_str} session / ${entry.get('todayCost', 0.0):.2f} today"
+                     f" / ${entry.get('blockCost', 0.0):.2f} block ({entry.get('timeRemaining', '0m')} left)")
+        if entry.get('spendWindows'):
+            parts.append(entry['spendWindows'])
+        parts.append(f"🔥 {entry.get('burnRate', '0/min')}")
+    else:
+        parts.append(f"💰 {session_str} session")
+
+    context = format_context(tokens, window, pct)
+    if context:
+        parts.append(context)
+    elif entry:
+        parts.append(f"{format_number(entry.get('blockTokens', 0))} tokens")
+
+    if entry:
+        parts.append(f"{entry.get('blockUsedPercent', 0.0):.1f}% used")
+        if entry.get('timeLeft'):
+            parts.append(entry['timeLeft'])
+    return " | ".join(parts)
+
+def main():
+    """Main entry point"""
+    try:
+        claude_data = json.loads(sys.stdin.read() or '{}')
+    except ValueError:
+        claude_data = {}
+    if not isinstance(claude_data, dict):
+        claude_data = {}
+
+    cwd = os.environ.get('PWD') or os.getcwd()
+    session_id = claude_data.get('session_id')
+    key = json.dumps([cwd or '', session_id or ''])
+    entry = load_enrichment(key)
+
+    try:
+        print(render(claude_data, entry), flush=True)
+    except Exception as e:
+        print(f"🤖 Claude | 💰 Status unavailable | Error: {str(e)}", flush=True)
+
+    # The line is out and Claude Code sees EOF; only now pay for refreshing the cache
+    sys.stdout.close()
+    fresh = entry and time.time() - entry.get('fetchedAt', 0) < ENRICHMENT_TTL
+    if not fresh and claim_refresh(key):
+        spawn_refresh(cwd, session_id, key)
+
+if __name__ == "__main__":
+    main()
@@ -14,6 +14,8 @@ from datetime import datetime
 import os
 import re
 
+from statusline_models import format_model_name
+
 def format_number(num):
     """Format number with K/M/B suffix"""
     if num >= 1_000_000_000:
@@ -25,91 +27,6 @@ def format_number(num):
     else:
         return str(num)
 
-
-def format_model_name(model_id):
-    """Format raw model ID into a friendly display name"""
-    if not model_id:
-        return None
-
-    model_id_lower = model_id.lower()
-
-    # Anthropic models (order matters - check more specific patterns first)
-    if 'opus-4-6' in model_id_lower or 'opus 4.6' in model_id_lower:
-        return "Opus 4.6"
-    elif 'opus-4-5' in model_id_lower or 'opus 4.5' in model_id_lower:
-        return "Opus 4.5"
-    elif 'opus-4-1' in model_id_lower or 'opus 4.1' in model_id_lower:
-        return "Opus 4.1"
-    elif 'opus-4' in model_id_lower or 'opus 4' in model_id_lower:
-        return "Opus 4"
-    elif 'sonnet-4-6' in model_id_lower or 'sonnet 4.6' in model_id_lower:
-        return "Sonnet 4.6"
-    elif 'sonnet-4-5' in model_id_lower or 'sonnet 4.5' in model_id_lower:
-        return "Sonnet 4.5"
-    elif 'sonnet-4' in model_id_lower or 'sonnet 4' in model_id_lower:
-        return "Sonnet 4"
-    elif 'sonnet-3-5' in model_id_lower or 'sonnet 3.5' in model_id_lower or 'sonnet-20241022' in model_id_lower:
-        return "Sonnet 3.5"
-    elif 'sonnet' in model_id_lower:
-        return "Sonnet"
-    elif 'haiku-4-5' in model_id_lower or 'haiku 4.5' in model_id_lower:
-        return "Haiku 4.5"
-    elif 'haiku' in model_id_lower:
-        return "Haiku"
-
-    # Google models (order matters - check more specific patterns first)
-    elif 'gemini-3.1-pro' in model_id_lower:
-        return "Gemini 3.1 Pro"
-    elif 'gemini-3-pro' in model_id_lower or 'gemini-3.0-pro' in model_id_lower:
-        return "Gemini 3 Pro"
-    elif 'gemini-3-flash' in model_id_lower or 'gemini-3.0-flash' in model_id_lower:
-        return "Gemini 3 Flash"
-    elif 'gemini-2.5-pro' in model_id_lower:
-        return "Gemini 2.5 Pro"
-    elif 'gemini-2.5-flash-lite' in model_id_lower:
-        return "Gemini 2.5 Flash Lite"
-    elif 'gemini-2.5-flash' in model_id_lower:
-        return "Gemini 2.5 Flash"
-    elif 'gemini-2' in model_id_lower:
-        return "Gemini 2"
-    elif 'gemini' in model_id_lower:
-        return "Gemini"
-
-    # xAI models (order matters - check more specific patterns first)
-    elif 'grok-4-2' in model_id_lower or 'grok-4.2' in model_id_lower:
-        return "Grok 4.2 Beta"
-    elif 'grok-4-1-fast' in model_id_lower or 'grok-4.1-fast' in model_id_lower:
-        return "Grok 4.1 Fast"
-    elif 'grok-4-1' in model_id_lower or 'grok-4.1' in model_id_lower:
-        return "Grok 4.1"
-    elif 'grok-4-fast' in model_id_lower:
-        return "Grok 4 Fast"
-    elif 'grok-4' in model_id_lower:
-        return "Grok 4"
-    elif 'grok' in model_id_lower:
-        return "Grok"
-
-    # OpenAI models
-    elif 'o3' in model_id_lower:
-        return "O3"
-    elif 'gpt-5-4-pro' in model_id_lower or 'gpt-5.4-pro' in model_id_lower:
-        return "GPT-5.4 Pro"
-    elif 'gpt-5-4' in model_id_lower or 'gpt-5.4' in model_id_lower:
-        return "GPT-5.4"
-    elif 'gpt-5-3' in model_id_lower or 'gpt-5.3' in model_id_lower:
-        return "GPT-5.3"
-    elif 'gpt-5' in model_id_lower:
-        return "GPT-5"
-    elif 'gpt-4' in model_id_lower:
-        return "GPT-4"
-
-    # Generic fallback
-    elif 'claude-' in model_id_lower:
-        return model_id.replace('claude-', '').replace('-', ' ').title()
-    else:
-        return model_id.replace('-', ' ').title()
-
-
 def get_ccusage_data():
     """Get usage data from ccusage tool with improved error handling"""
     try:
@@ -10,9 +10,328 @@ License: MIT
 import subprocess
 import json
 import sys
-from datetime import datetime
+from datetime import datetime, timedelta, timezone
 import os
 import re
+import struct
+import time
+
+from statusline_models import format_model_name
+
+# Unix socket used by the persistent daemon (see run_daemon / claude-statusline-client.py)
+DAEMON_SOCKET = os.path.expanduser('~/.claude/statusline.sock')
+DAEMON_IDLE_TIMEOUT = 900  # seconds
+try:
+    DAEMON_IDLE_TIMEOUT = int(os.environ.get('CLAUDE_STATUSLINE_IDLE', '900'))
+except ValueError:
+    pass
+
+# Claude Code transcripts and the statusline's own persisted state
+CLAUDE_PROJECTS_DIR = os.path.expanduser('~/.claude/projects')
+CACHE_DIR = os.path.expanduser('~/.claude/statusline-cache')
+
+# Usage totals come from a native pass over the transcripts unless
+# CLAUDE_STATUSLINE_USAGE=ccusage; ccusage is also the fallback when no
+# transcript directory exists.
+USAGE_SOURCE = os.environ.get('CLAUDE_STATUSLINE_USAGE', 'native')
+USAGE_PROJECT_DIRS = [
+    CLAUDE_PROJECTS_DIR,
+    os.path.expanduser('~/.config/claude/projects'),
+]
+BLOCK_DURATION = timedelta(hours=5)
+
+# Seconds each ccusage view stays fresh in the shared cache before it is
+# refreshed in the background (see get_ccusage_data)
+CCUSAGE_CACHE_TTLS = {
+    'blocks': 15,
+    'session': 60,
+    'daily': 60,
+}
+SESSION_INDEX_FILE = os.path.join(CACHE_DIR, 'session-index.json')
+
+# Usage rollups by (day, project, model) and by 5-hour block, behind the usage and
+# spend figures. Daily rows older than the retention window are compacted into
+# monthly rows. Renders never touch the store: a detached `--refresh-usage`
+# process (or the daemon) ingests new transcript lines and writes a summary that
+# renders read while it is fresh, i.e. the transcripts' (path, size, mtime) set
+# is unchanged and it is at most USAGE_SUMMARY_TTL seconds old.
+ROLLUP_DB = os.path.join(CACHE_DIR, 'usage-rollup.db')
+ROLLUP_RETENTION_DAYS = 400
+ROLLUP_WRITE_TIMEOUT = 10  # seconds an ingest waits for another writer
+USAGE_SUMMARY_FILE = os.path.join(CACHE_DIR, 'usage-summary.json')
+USAGE_SUMMARY_TTL = 60
+
+# Burn rate engine: per-minute buckets in a fixed ring, a sliding window and an
+# EWMA over them, and a 5-hour block limit that is fixed or learned from history.
+# CLAUDE_STATUSLINE_BLOCK_LIMIT: a token count, "max" (largest past block) or
+# "auto" (the larger of the standard limit and the largest past block).
+BURN_RING_MINUTES = 60
+BURN_WINDOW_MINUTES = 15
+try:
+    BURN_WINDOW_MINUTES = int(os.environ.get('CLAUDE_STATUSLINE_BURN_WINDOW', '15'))
+except ValueError:
+    pass
+DEFAULT_BLOCK_LIMIT = 97_675_753  # Standard 5-hour block limit
+BLOCK_LIMIT_SETTING = os.environ.get('CLAUDE_STATUSLINE_BLOCK_LIMIT', 'auto')
+
+# Memory-mapped token totals published by token-metrics-proxy.py; the layout
+# must match SNAPSHOT_HEADER / SNAPSHOT_SLOT there
+METRICS_SNAPSHOT_FILE = os.path.expanduser('~/.claude/token-metrics.bin')
+METRICS_SNAPSHOT_MAX_AGE_NS = 60 * 10**9
+METRICS_SNAPSHOT_HEADER = struct.Struct('<4sIQQ4QI4x')
+METRICS_SNAPSHOT_SLOT = struct.Struct('<64sQ4Q')
+CCUSAGE_REFRESH_TIMEOUT = 30  # background refreshes can afford a slow ccusage
+REFRESH_MARKER_TTL = 60  # a refresh marker older than this belongs to a dead refresher
+SINGLE_FLIGHT_POLL = 0.01  # seconds between attempts to take a busy single-flight lock
+
+# USD per million tokens: (input, output, cache write, cache read).
+# Order matters - more specific patterns first.
+MODEL_PRICING = [
+    ('opus-4-1', (15.0, 75.0, 18.75, 1.5)),
+    ('opus-4-2', (15.0, 75.0, 18.75, 1.5)),
+    ('opus-4-0', (15.0, 75.0, 18.75, 1.5)),
+    ('opus-3', (15.0, 75.0, 18.75, 1.5)),
+    ('3-opus', (15.0, 75.0, 18.75, 1.5)),
+    ('opus', (5.0, 25.0, 6.25, 0.5)),
+    ('sonnet', (3.0, 15.0, 3.75, 0.3)),
+    ('haiku-3-5', (0.8, 4.0, 1.0, 0.08)),
+    ('3-5-haiku', (0.8, 4.0, 1.0, 0.08)),
+    ('3-haiku', (0.25, 1.25, 0.3, 0.03)),
+    ('haiku', (1.0, 5.0, 1.25, 0.1)),
+]
+
+# Relative weight of each model's tokens against the block limit, substring
+# matched like MODEL_PRICING. Extend with CLAUDE_STATUSLINE_MODEL_WEIGHTS='{"haiku": 0.2}';
+# a setting with any non-numeric weight is ignored as a whole.
+MODEL_BURN_WEIGHTS = [('opus', 1.0), ('sonnet', 1.0), ('haiku', 1.0)]
+try:
+    MODEL_BURN_WEIGHTS = [(pattern, float(weight)) for pattern, weight in
+                          json.loads(os.environ.get('CLAUDE_STATUSLINE_MODEL_WEIGHTS', '{}')).items()] + MODEL_BURN_WEIGHTS
+except (ValueError, TypeError, AttributeError):
+    pass
+
+# Localhost services, queried over pooled keep-alive HTTP connections.
+# A port of None means "read it from the CCR config" (see get_ccr_port).
+SERVICE_ENDPOINTS = {
+    'ccr': {'port': None, 'connect_timeout': 0.2, 'read_timeout': 1.0, 'probe': '/'},
+    'qdrant': {'port': 6333, 'connect_timeout': 0.2, 'read_timeout': 2.0, 'probe': '/readyz'},
+    'codeindex': {'port': 3847, 'connect_timeout': 0.2, 'read_timeout': 2.0, 'probe': '/health'},
+}
+
+# Per-service circuit breakers shared by every statusline process. After
+# BREAKER_FAILURES consecutive timeouts/refusals a service is skipped outright;
+# once its back-off expires a background probe decides whether to close the
+# breaker or back off twice as long.
+BREAKER_FILE = os.path.join(CACHE_DIR, 'breakers.json')
+BREAKER_FAILURES = 3
+try:
+    BREAKER_FAILURES = max(1, int(os.environ.get('CLAUDE_STATUSLINE_BREAKER_FAILURES', '3')))
+except ValueError:
+    pass
+BREAKER_BACKOFF = 5  # seconds, first back-off after opening
+BREAKER_MAX_BACKOFF = 300
+
+# Timeouts learned from observed latency. The last LATENCY_SAMPLES response
+# times (ms) of each service and ccusage view are kept in LATENCY_FILE; once
+# there are LATENCY_MIN_SAMPLES of them the timeout is their
+# LATENCY_PERCENTILE times LATENCY_HEADROOM; either way it is clamped to
+# TIMEOUT_BOUNDS. A call still running when the process exits (a provider
+# abandoned at the render budget) counts as taking as long as it has so far.
+# Override bounds with CLAUDE_STATUSLINE_TIMEOUT_BOUNDS='{"ccusage": [2, 20]}'.
+LATENCY_FILE = os.path.join(CACHE_DIR, 'latency.json')
+LATENCY_SAMPLES = 64
+LATENCY_MIN_SAMPLES = 8
+LATENCY_PERCENTILE = 99
+LATENCY_HEADROOM = 2.0
+TIMEOUT_BOUNDS = {  # seconds, (min, max)
+    'ccr': (0.05, 3.0),
+    'qdrant': (0.05, 5.0),
+    'codeindex': (0.05, 5.0),
+    'ccusage': (2.0, 30.0),
+}
+try:
+    TIMEOUT_BOUNDS.update({key: (float(low), float(high)) for key, (low, high) in
+                           json.loads(os.environ.get('CLAUDE_STATUSLINE_TIMEOUT_BOUNDS', '{}')).items()})
+except (ValueError, TypeError, AttributeError):
+    pass
+# A service request still unanswered after its HEDGE_PERCENTILE latency (but
+# at least HEDGE_MIN_MS) is sent again on a second connection; first answer wins.
+# CLAUDE_STATUSLINE_HEDGE=0 turns this off.
+HEDGE_REQUESTS = os.environ.get('CLAUDE_STATUSLINE_HEDGE', '1') != '0'
+HEDGE_PERCENTILE = 95
+HEDGE_MIN_MS = 25
+
+# Facts extracted from the codeindex /logs output, with a cursor so each render
+# only parses entries added since the previous one (see update_codeindex_log_state)
+CODEINDEX_LOG_STATE = os.path.join(CACHE_DIR, 'codeindex-logs.json')
+CODEINDEX_LOGS_TTL = 2  # seconds; /logs is fetched by one terminal at a time
+CODEINDEX_RECENT_ENTRIES = 50  # an insert within this many entries means "indexing"
+CODEINDEX_LOG_TAIL = 16  # entries remembered to find the cursor again after the log is trimmed
+CODEINDEX_COLLECTION_RE = re.compile(r'codeindex-[A-Za-z0-9._-]*[A-Za-z0-9]')
+CODEINDEX_TRACKING_RE = re.compile(r'tracking (\d+) files')
+CODEINDEX_COMPLETED_RE = re.compile(r'(\d+) files, (\d+) chunks')
+
+# Qdrant collection names and points counts, refreshed in one batch at most
+# every COLLECTION_INDEX_TTL seconds and shared by all terminals through disk
+COLLECTION_INDEX_FILE = os.path.join(CACHE_DIR, 'qdrant-collections.json')
+COLLECTION_INDEX_TTL = 10
+COLLECTION_MATCH_LIMIT = 256  # cwd -> collection matches remembered in the index
+
+# Indexing progress: points_count samples taken at each index refresh give the
+# ingestion rate; chunks per file is learned from completed indexes in the logs
+CODEINDEX_SAMPLE_LIMIT = 32
+CODEINDEX_SAMPLE_MAX_AGE = 600  # seconds of samples kept per collection
+CODEINDEX_RATE_WINDOW = 120  # seconds of samples the rate is computed over
+CODEINDEX_STALL_SECONDS = 60  # no new chunks for this long while indexing = stalled
+DEFAULT_CHUNKS_PER_FILE = 100
+
+# Every provider runs concurrently; the line is rendered after this many
+# milliseconds with whatever has arrived (see gather_providers)
+RENDER_BUDGET_MS = 150.0
+try:
+    RENDER_BUDGET_MS = float(os.environ.get('CLAUDE_STATUSLINE_BUDGET_MS', '150'))
+except ValueError:
+    pass
+LAST_KNOWN_LIMIT = 32  # argument sets (cwds, sessions) remembered per provider
+
+# Pre-rendered expensive segments for claude-statusline-fast.py, keyed by (cwd, session)
+ENRICHMENT_FILE = os.path.join(CACHE_DIR, 'enrichment.json')
+
+# Opt-in tracing: CLAUDE_STATUSLINE_TRACE=1 (or a file path) appends a span per
+# provider, service call, parse and render step in Chrome trace event format;
+# CLAUDE_STATUSLINE_PROFILE=<path> dumps a cProfile of the next invocation
+_trace_setting = os.environ.get('CLAUDE_STATUSLINE_TRACE', '')
+TRACE_FILE = (os.path.join(CACHE_DIR, 'trace.json') if _trace_setting in ('1', 'true', 'yes')
+              else os.path.expanduser(_trace_setting) if _trace_setting not in ('', '0', 'false', 'no')
+              else None)
+TRACE_MAX_BYTES = 32 * 1024 * 1024
+try:
+    TRACE_MAX_BYTES = int(float(os.environ.get('CLAUDE_STATUSLINE_TRACE_MAX_MB', '32')) * 1024 * 1024)
+except ValueError:
+    pass
+TRACE_BACKUPS = 4  # rotated files kept as trace.json.1 ... trace.json.4
+PROFILE_FILE = os.environ.get('CLAUDE_STATUSLINE_PROFILE')
+
+# Provider results are memoized in-process only while running as the daemon.
+# TTLs are in seconds; a one-shot run never reuses anything.
+PROVIDER_TTLS = {
+    'usage': 10,
+    'ccr_model': 5,
+    'codeindex': 5,
+}
+_daemon_mode = False
+_provider_memo = {}
+_request_cwd = None
+
+def memoized_provider(name, func, *args):
+    """Call a provider, reusing its last result inside the daemon while it is fresh"""
+    if not _daemon_mode:
+        return func(*args)
+    key = (name,) + args
+    now = time.monotonic()
+    cached = _provider_memo.get(key)
+    if cached and cached[0] > now:
+        return cached[1]
+    value = func(*args)
+    _provider_memo[key] = (now + PROVIDER_TTLS.get(name, 0), value)
+    return value
+
+_trace_events = [] if TRACE_FILE else None  # pending events; None when tracing is off
+_trace_named = False
+
+class TraceSpan:
+    """Times one step as a complete ("X") event in Chrome trace event format"""
+    __slots__ = ('name', 'cat', 'args', 'start')
+
+    def __init__(self, name, cat, args):
+        self.name = name
+        self.cat = cat
+        self.args = args
+        self.start = 0
+
+    def __enter__(self):
+        self.start = time.time_ns()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        import threading
+        if exc is not None:
+            self.error(exc)
+        end = time.time_ns()
+        _trace_events.append({
+            'name': self.name, 'cat': self.cat, 'ph': 'X',
+            'ts': self.start // 1000, 'dur': (end - self.start) // 1000,
+            'pid': os.getpid(), 'tid': threading.get_native_id(), 'args': self.args,
+        })
+        return False
+
+    def annotate(self, **fields):
+        """Attach more args to the event"""
+        self.args.update(fields)
+
+    def error(self, exc):
+        """Record an exception that the step swallows"""
+        self.args['error'] = f"{type(exc).__name__}: {exc}"
+
+class _NoSpan:
+    """Shared stand-in when tracing is off: entering and leaving it does nothing"""
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+    def annotate(self, **fields):
+        pass
+
+    def error(self, exc):
+        pass
+
+_NO_SPAN = _NoSpan()
+
+def trace_span(name, cat='render', **args):
+    """Span for `name` when tracing is on, otherwise the shared no-op span"""
+    if _trace_events is None:
+        return _NO_SPAN
+    return TraceSpan(name, cat, args)
+
+def flush_trace():
+    """Append pending events to the trace file, rotating it past TRACE_MAX_BYTES.
+
+    The file is a JSON array that is never closed, which trace viewers accept,
+    so processes can keep appending to it under a lock.
+    """
+    global _trace_events, _trace_named
+    if not _trace_events:
+        return
+    import fcntl
+    events, _trace_events = _trace_events, []
+    if not _trace_named:
+        role = next((arg[2:] for arg in sys.argv[1:] if arg.startswith('--')), 'render')
+        events.insert(0, {'name': 'process_name', 'ph': 'M', 'pid': os.getpid(),
+                          'args': {'name': f"statusline {role} ({os.getpid()})"}})
+        _trace_named = True
+    data = ''.join(json.dumps(event, separators=(',', ':'), default=str) + ',\n' for event in events)
+    try:
+        os.makedirs(os.path.dirname(TRACE_FILE) or '.', exist_ok=True)
+        with open(TRACE_FILE + '.lock', 'w') as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                size = os.path.getsize(TRACE_FILE)
+            except OSError:
+                size = 0
+            if size and size + len(data) > TRACE_MAX_BYTES:
+                for i in range(TRACE_BACKUPS - 1, 0, -1):
+                    if os.path.exists(f"{TRACE_FILE}.{i}"):
+                        os.replace(f"{TRACE_FILE}.{i}", f"{TRACE_FILE}.{i + 1}")
+                os.replace(TRACE_FILE, f"{TRACE_FILE}.1")
+                size = 0
+            with open(TRACE_FILE, 'a') as f:
+                f.write(('[\n' if size == 0 else '') + data)
+    except OSError:
+        pass
 
 def format_number(num):
     """Format number with K/M/B suffix"""
@@ -27,45 +346,1209 @@ def format_number(num):
 
 
 
-def get_ccusage_data():
-    """Get usage data from ccusage tool"""
-    try:
-        # Get block data for current session
-        blocks_result = subprocess.run(
-            ["ccusage", "blocks", "--json", "--offline"],
-            capture_output=True,
-            text=True,
-            timeout=5
-        )
-        blocks_data = json.loads(blocks_result.stdout) if blocks_result.returncode == 0 else {}
-        
-        # Get session data
-        session_result = subprocess.run(
-            ["ccusage", "session", "--json", "--offline"],
-            capture_output=True,
-            text=True,
-            timeout=5
-        )
-        session_data = json.loads(session_result.stdout) if session_result.returncode == 0 else {}
-        
-        # Get daily data for today
-        daily_result = subprocess.run(
-            ["ccusage", "daily", "--json", "--offline"],
-            capture_output=True,
-            text=True,
-            timeout=5
+def run_ccusage_view(view, timeout=None):
+    """Run one `ccusage <view> --json --offline`, returning its JSON or None on failure.
+
+    Without an explicit timeout, the view's learned timeout applies.
+    """
+    key = f"ccusage-{view}"
+    if timeout is None:
+        timeout = adaptive_timeout(key, CCUSAGE_REFRESH_TIMEOUT, TIMEOUT_BOUNDS['ccusage'])
+    with trace_span(f"ccusage {view}", cat='service', timeout=timeout) as span:
+        start = time.perf_counter()
+        try:
+            result = subprocess.run(
+                ["ccusage", view, "--json", "--offline"],
+                capture_output=True,
+                text=True,
+                timeout=timeout
+            )
+            record_latency(key, (time.perf_counter() - start) * 1000)
+            if result.returncode != 0:
+                span.annotate(returncode=result.returncode)
+                return None
+            data = json.loads(result.stdout)
+            return data if isinstance(data, dict) else None
+        except subprocess.TimeoutExpired as e:
+            # At least this slow: lets the timeout grow on a loaded machine
+            record_latency(key, timeout * 1000)
+            span.error(e)
+            return None
+        except (OSError, json.JSONDecodeError, ValueError) as e:
+            span.error(e)
+            return None
+
+_latency_memo = None
+_latency_pending = {}
+_latency_inflight = {}  # token -> (key, start) for calls still running
+
+def load_latency():
+    """Recent latency samples per key from the shared file (memoized on file mtime)"""
+    global _latency_memo
+    try:
+        mtime = os.stat(LATENCY_FILE).st_mtime_ns
+    except OSError:
+        return {}
+    if _latency_memo and _latency_memo[0] == mtime:
+        return _latency_memo[1]
+    try:
+        with open(LATENCY_FILE, 'r') as f:
+            samples = json.load(f)
+    except (OSError, json.JSONDecodeError, ValueError):
+        return {}
+    if not isinstance(samples, dict):
+        return {}
+    _latency_memo = (mtime, samples)
+    return samples
+
+def record_latency(key, ms):
+    """Queue a latency sample; flush_latency() persists it"""
+    _latency_pending.setdefault(key, []).append(round(ms, 1))
+
+def flush_latency(at_exit=False):
+    """Merge queued samples into LATENCY_FILE, keeping the last LATENCY_SAMPLES per key.
+
+    At exit, calls still in flight are recorded with their elapsed time so far;
+    leaving them out would teach timeouts from the fast calls only.
+    """
+    global _latency_pending
+    if at_exit:
+        now = time.perf_counter()
+        for key, start in list(_latency_inflight.values()):
+            record_latency(key, (now - start) * 1000)
+    pending, _latency_pending = _latency_pending, {}
+    if not pending:
+        return
+    import fcntl
+    try:
+        os.makedirs(CACHE_DIR, exist_ok=True)
+        with open(LATENCY_FILE + '.lock', 'w') as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            samples = dict(load_latency())
+            for key, new in pending.items():
+                old = samples.get(key) if isinstance(samples.get(key), list) else []
+                samples[key] = (old + new)[-LATENCY_SAMPLES:]
+            write_json_atomic(LATENCY_FILE, samples)
+    except OSError:
+        pass
+
+def latency_percentile(key, pct):
+    """Nearest-rank percentile of the recent samples in ms, or None with too few"""
+    samples = load_latency().get(key)
+    if not isinstance(samples, list) or len(samples) < LATENCY_MIN_SAMPLES:
+        return None
+    ordered = sorted(samples)
+    return ordered[max(0, -(-pct * len(ordered) // 100) - 1)]
+
+def adaptive_timeout(key, default, bounds):
+    """Timeout in seconds for `key`, learned from its latency (else `default`) and clamped to bounds"""
+    observed = latency_percentile(key, LATENCY_PERCENTILE)
+    timeout = default if observed is None else observed * LATENCY_HEADROOM / 1000
+    low, high = bounds
+    return min(high, max(low, timeout))
+
+def read_ccusage_cache(view):
+    """Return (fetched_at, data) from the shared ccusage cache, or (None, None)"""
+    try:
+        with open(os.path.join(CACHE_DIR, f"ccusage-{view}.json"), 'r') as f:
+            cached = json.load(f)
+        return cached['fetchedAt'], cached['data']
+    except (OSError, KeyError, TypeError, json.JSONDecodeError, ValueError):
+        return None, None
+
+def write_ccusage_cache(view, data):
+    """Store a good ccusage result for every statusline on this host"""
+    try:
+        write_json_atomic(os.path.join(CACHE_DIR, f"ccusage-{view}.json"),
+                          {'fetchedAt': time.time(), 'data': data})
+    except OSError:
+        pass
+    if view == 'session':
+        update_session_index(data.get('sessions'))
+
+def claim_refresh(name):
+    """Mark `name` as being refreshed; False if another process already claimed it"""
+    marker = os.path.join(CACHE_DIR, f"{name}.refreshing")
+    try:
+        os.makedirs(CACHE_DIR, exist_ok=True)
+        fd = os.open(marker, os.O_CREAT | os.O_EXCL | os.O_WRONLY, 0o600)
+        os.close(fd)
+        return True
+    except FileExistsError:
+        # A refresher that died must not block refreshes forever. Takeovers are
+        # serialized so only one of several processes seeing the stale marker wins.
+        import fcntl
+        try:
+            with open(os.path.join(CACHE_DIR, 'refresh-takeover.lock'), 'w') as lock:
+                fcntl.flock(lock, fcntl.LOCK_EX)
+                if time.time() - os.path.getmtime(marker) > REFRESH_MARKER_TTL:
+                    os.utime(marker)
+                    return True
+        except OSError:
+            pass
+        return False
+    except OSError:
+        return False
+
+def refresh_marker(kind, key):
+    """Marker name for refreshing `kind` for one argument set, so other sets refresh independently"""
+    import zlib
+    return f"{kind}-{zlib.crc32(key.encode('utf-8')):08x}"
+
+def single_flight(name, cached, compute, wait):
+    """Run an expensive refresh in one process at a time across every statusline on the host.
+
+    cached() returns (value, fresh) from the shared cache; a fresh value is
+    returned as-is. Otherwise the process that takes CACHE_DIR/<name>.lock runs
+    compute(), which stores and returns the new value. While it runs, callers
+    that have a stale value return it at once, and callers with nothing cached
+    wait up to `wait` seconds for the lock holder, then return whatever it
+    left in the cache (None if it failed).
+    """
+    value, fresh = cached()
+    if fresh:
+        return value
+    import fcntl
+    try:
+        os.makedirs(CACHE_DIR, exist_ok=True)
+        lock = open(os.path.join(CACHE_DIR, f"{name}.lock"), 'w')
+    except OSError:
+        return compute()
+    with lock:
+        deadline = time.monotonic() + (wait if value is None else 0)
+        waited = False
+        while True:
+            try:
+                fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                break
+            except BlockingIOError:
+                if time.monotonic() >= deadline:
+                    return value
+                waited = True
+                time.sleep(SINGLE_FLIGHT_POLL)
+        latest, fresh = cached()
+        if fresh or waited:
+            return latest  # The previous lock holder's result, good or not
+        return compute()
+
+def release_refresh(name):
+    """Clear the refresh marker for `name`"""
+    try:
+        os.unlink(os.path.join(CACHE_DIR, f"{name}.refreshing"))
+    except OSError:
+        pass
+
+def spawn_background(args):
+    """Run this script with `args` in a detached process so the render never waits"""
+    try:
+        subprocess.Popen(
+            [sys.executable, os.path.abspath(__file__)] + args,
+            stdin=subprocess.DEVNULL,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+            start_new_session=True,
+            close_fds=True
         )
-        daily_data = json.loads(daily_result.stdout) if daily_result.returncode == 0 else {}
-        
-        return blocks_data, session_data, daily_data
-    except subprocess.TimeoutExpired:
-        return {}, {}, {}
-    except Exception as e:
-        return {}, {}, {}
+        return True
+    except OSError:
+        return False
+
+def spawn_ccusage_refresh(views):
+    """Refresh stale views in the background"""
+    views = [view for view in views if claim_refresh(f"ccusage-{view}")]
+    if views and not spawn_background(['--refresh-ccusage'] + views):
+        for view in views:
+            release_refresh(f"ccusage-{view}")
+
+def fetch_ccusage_view(view, wait=0):
+    """Run ccusage for a view that is not fresh in the cache, one process at a time.
+
+    Concurrent statuslines share the run through single_flight; returns the
+    view's data, or None if ccusage failed and nothing is cached.
+    """
+    def cached():
+        fetched_at, data = read_ccusage_cache(view)
+        return data, data is not None and time.time() - fetched_at <= CCUSAGE_CACHE_TTLS[view]
+
+    def compute():
+        data = run_ccusage_view(view)
+        if data is not None:
+            write_ccusage_cache(view, data)
+        return data
+
+    return single_flight(f"ccusage-{view}", cached, compute, wait)
+
+def refresh_ccusage_views(views):
+    """Background refresher entry point (`--refresh-ccusage VIEW...`)"""
+    for view in views:
+        if view not in CCUSAGE_CACHE_TTLS:
+            continue
+        try:
+            fetch_ccusage_view(view, wait=CCUSAGE_REFRESH_TIMEOUT)
+        finally:
+            release_refresh(f"ccusage-{view}")
+
+def get_ccusage_data():
+    """Get usage data from ccusage, served stale-while-revalidate from the shared disk cache.
+
+    Fresh cached views are returned as-is. Stale ones are returned immediately
+    while a detached process refreshes them. A view that has never been cached
+    is empty until that process has run: ccusage never runs in the render
+    process, whose provider threads are abandoned when the budget runs out.
+    """
+    results = {}
+    stale_views = []
+    now = time.time()
+    for view, ttl in CCUSAGE_CACHE_TTLS.items():
+        fetched_at, cached = read_ccusage_cache(view)
+        results[view] = cached if cached is not None else {}
+        if cached is None or now - fetched_at > ttl:
+            stale_views.append(view)
+
+    if stale_views:
+        spawn_ccusage_refresh(stale_views)
+
+    return results['blocks'], results['session'], results['daily']
+
+def get_model_pricing(model_id):
+    """Return (input, output, cache_write, cache_read) USD per million tokens"""
+    model_id_lower = (model_id or '').lower()
+    for pattern, pricing in MODEL_PRICING:
+        if pattern in model_id_lower:
+            return pricing
+    return (0.0, 0.0, 0.0, 0.0)
+
+def parse_usage_entry(line):
+    """Parse one transcript JSONL line into a usage record, or None if it has no usage"""
+    # Cheap pre-filter: most transcript lines are user/tool entries without usage
+    if '"usage"' not in line:
+        return None
+    try:
+        entry = json.loads(line)
+    except (json.JSONDecodeError, ValueError):
+        return None
+    if not isinstance(entry, dict):
+        return None
+    message = entry.get('message')
+    if not isinstance(message, dict) or not isinstance(message.get('usage'), dict):
+        return None
+
+    usage = message['usage']
+    model = message.get('model') or ''
+    record = {
+        'key': f"{message['id']}:{entry.get('requestId', '')}" if message.get('id') else None,
+        'timestamp': entry.get('timestamp', ''),
+        'sessionId': entry.get('sessionId', ''),
+        'cwd': entry.get('cwd', ''),
+        'model': model,
+        'inputTokens': usage.get('input_tokens', 0) or 0,
+        'outputTokens': usage.get('output_tokens', 0) or 0,
+        'cacheCreationTokens': usage.get('cache_creation_input_tokens', 0) or 0,
+        'cacheReadTokens': usage.get('cache_read_input_tokens', 0) or 0,
+    }
+
+    # Prefer the cost Claude Code recorded, otherwise price it ourselves
+    if isinstance(entry.get('costUSD'), (int, float)):
+        record['cost'] = float(entry['costUSD'])
+    else:
+        price_in, price_out, price_write, price_read = get_model_pricing(model)
+        record['cost'] = (
+            record['inputTokens'] * price_in
+            + record['outputTokens'] * price_out
+            + record['cacheCreationTokens'] * price_write
+            + record['cacheReadTokens'] * price_read
+        ) / 1_000_000
+    return record
+
+def find_session_transcript(session_id, transcript_path=None):
+    """Locate the JSONL transcript for a Claude Code session"""
+    if transcript_path and os.path.isfile(transcript_path):
+        return transcript_path
+    if not session_id or '/' in session_id:
+        return None
+    import glob
+    matches = glob.glob(os.path.join(CLAUDE_PROJECTS_DIR, '*', f"{session_id}.jsonl"))
+    return matches[0] if matches else None
+
+def write_json_atomic(path, data):
+    """Write JSON through a temp file and rename so readers never see a partial file"""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump(data, f, separators=(',', ':'))
+    os.replace(tmp_path, path)
+
+def read_session_usage(session_id, transcript_path=None):
+    """Return running usage totals for one session, parsing only newly appended lines.
+
+    The byte offset and totals are persisted per session under CACHE_DIR, so each
+    render only pays for the turns added since the previous render.
+    """
+    if not session_id or '/' in session_id or session_id.startswith('.'):
+        return None
+    path = find_session_transcript(session_id, transcript_path)
+    if not path:
+        return None
+
+    state_file = os.path.join(CACHE_DIR, 'sessions', f"{session_id}.json")
+    state = None
+    try:
+        with open(state_file, 'r') as f:
+            state = json.load(f)
+    except (OSError, json.JSONDecodeError, ValueError):
+        state = None
+
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+
+    # Start over if the transcript moved, was replaced or got truncated
+    if (not state or state.get('path') != path or state.get('inode') != st.st_ino
+            or st.st_size < state.get('offset', 0)):
+        state = {
+            'path': path,
+            'inode': st.st_ino,
+            'offset': 0,
+            'recentKeys': [],
+            'totals': new_usage_totals(),
+        }
+
+    if st.st_size == state['offset']:
+        return state['totals']
+
+    with open(path, 'rb') as f:
+        f.seek(state['offset'])
+        chunk = f.read(st.st_size - state['offset'])
+
+    # Only consume complete lines; a partially written line is picked up next time
+    end = chunk.rfind(b'\n')
+    if end < 0:
+        return state['totals']
+    chunk = chunk[:end + 1]
+
+    totals = state['totals']
+    # Claude Code writes one line per content block with the same usage, so
+    # de-duplicate on message id + request id (duplicates are always adjacent)
+    recent_keys = state['recentKeys']
+    seen = set(recent_keys)
+    for raw_line in chunk.decode('utf-8', 'replace').splitlines():
+        record = parse_usage_entry(raw_line)
+        if record is None:
+            continue
+        if record['key'] is not None:
+            if record['key'] in seen:
+                continue
+            seen.add(record['key'])
+            recent_keys.append(record['key'])
+        add_usage(totals, record)
+
+    state['recentKeys'] = recent_keys[-256:]
+    state['offset'] += len(chunk)
+    try:
+        write_json_atomic(state_file, state)
+    except OSError:
+        pass
+    return totals
+
+def parse_timestamp(value):
+    """Parse an ISO-8601 transcript timestamp into an aware datetime"""
+    try:
+        if value.endswith('Z'):
+            value = value[:-1] + '+00:00'
+        return datetime.fromisoformat(value)
+    except (AttributeError, ValueError):
+        return None
+
+def iter_transcript_files():
+    """Yield (project_name, path) for every transcript JSONL file"""
+    for projects_dir in USAGE_PROJECT_DIRS:
+        try:
+            projects = os.listdir(projects_dir)
+        except OSError:
+            continue
+        for project in projects:
+            project_dir = os.path.join(projects_dir, project)
+            try:
+                names = os.listdir(project_dir)
+            except OSError:
+                continue
+            for name in names:
+                if name.endswith('.jsonl'):
+                    yield project, os.path.join(project_dir, name)
+
+def new_usage_totals():
+    """Empty token/cost accumulator in ccusage field naming"""
+    return {
+        'inputTokens': 0,
+        'outputTokens': 0,
+        'cacheCreationTokens': 0,
+        'cacheReadTokens': 0,
+        'totalTokens': 0,
+        'totalCost': 0.0,
+    }
+
+def add_usage(totals, record):
+    """Accumulate one usage record into a totals dict"""
+    totals['inputTokens'] += record['inputTokens']
+    totals['outputTokens'] += record['outputTokens']
+    totals['cacheCreationTokens'] += record['cacheCreationTokens']
+    totals['cacheReadTokens'] += record['cacheReadTokens']
+    totals['totalTokens'] += (record['inputTokens'] + record['outputTokens']
+                              + record['cacheCreationTokens'] + record['cacheReadTokens'])
+    totals['totalCost'] += record['cost']
+
+def usage_row_totals(values):
+    """Totals dict from (input, output, cache creation, cache read, cost) columns"""
+    input_tokens, output_tokens, cache_creation, cache_read, cost = values
+    return {
+        'inputTokens': input_tokens,
+        'outputTokens': output_tokens,
+        'cacheCreationTokens': cache_creation,
+        'cacheReadTokens': cache_read,
+        'totalTokens': input_tokens + output_tokens + cache_creation + cache_read,
+        'totalCost': cost,
+    }
+
+def usage_models(concatenated):
+    """Model names from a GROUP_CONCAT column"""
+    return [model for model in (concatenated or '').split(',') if model]
+
+def build_usage_block(row, now):
+    """Build one ccusage-style 5-hour block from its usage_blocks row"""
+    start_ts, first_ts, last_ts, entries = row[:4]
+    totals = usage_row_totals(row[4:9])
+    start = datetime.fromtimestamp(start_ts, timezone.utc)
+    end = start + BLOCK_DURATION
+    last_time = datetime.fromtimestamp(last_ts, timezone.utc)
+
+    is_active = (now - last_time) < BLOCK_DURATION and now < end
+    block = {
+        'id': start.isoformat().replace('+00:00', 'Z'),
+        'startTime': start.isoformat().replace('+00:00', 'Z'),
+        'endTime': end.isoformat().replace('+00:00', 'Z'),
+        'actualEndTime': last_time.isoformat().replace('+00:00', 'Z'),
+        'isActive': is_active,
+        'isGap': False,
+        'entries': entries,
+        'tokenCounts': {
+            'inputTokens': totals['inputTokens'],
+            'outputTokens': totals['outputTokens'],
+            'cacheCreationInputTokens': totals['cacheCreationTokens'],
+            'cacheReadInputTokens': totals['cacheReadTokens'],
+        },
+        'totalTokens': totals['totalTokens'],
+        'costUSD': totals['totalCost'],
+        'models': json.loads(row[9]),
+        'burnRate': None,
+        'projection': None,
+    }
+
+    duration_mins = (last_ts - first_ts) / 60
+    if duration_mins > 0:
+        block['burnRate'] = {
+            'tokensPerMinute': totals['totalTokens'] / duration_mins,
+            'tokensPerMinuteForIndicator': (totals['inputTokens'] + totals['outputTokens']) / duration_mins,
+            'costPerHour': totals['totalCost'] / duration_mins * 60,
+        }
+        if is_active:
+            remaining_mins = max(0.0, (end - now).total_seconds() / 60)
+            block['projection'] = {
+                'totalTokens': round(totals['totalTokens'] + block['burnRate']['tokensPerMinute'] * remaining_mins),
+                'totalCost': round(totals['totalCost'] + block['burnRate']['costPerHour'] / 60 * remaining_mins, 2),
+                'remainingMinutes': round(remaining_mins),
+            }
+    return block
+
+def build_usage_blocks(rows, now):
+    """Blocks from time-ordered usage_blocks rows, with gap markers between them like ccusage"""
+    blocks = []
+    previous_last = None
+    for row in rows:
+        if previous_last is not None:
+            gap_start = datetime.fromtimestamp(previous_last, timezone.utc) + BLOCK_DURATION
+            first_time = datetime.fromtimestamp(row[1], timezone.utc)
+            if first_time > gap_start:
+                blocks.append({
+                    'id': 'gap-' + gap_start.isoformat().replace('+00:00', 'Z'),
+                    'startTime': gap_start.isoformat().replace('+00:00', 'Z'),
+                    'endTime': first_time.isoformat().replace('+00:00', 'Z'),
+                    'isActive': False,
+                    'isGap': True,
+                    'entries': 0,
+                    'totalTokens': 0,
+                    'costUSD': 0.0,
+                    'models': [],
+                })
+        blocks.append(build_usage_block(row, now))
+        previous_last = row[2]
+    return blocks
+
+def aggregate_usage(now=None):
+    """Produce ccusage-shaped (blocks, session, daily) data from the rollup store.
+
+    New transcript lines are ingested first (see ingest_rollup), so each call
+    only parses what was appended since the previous one; blocks, sessions and
+    days are then read back as indexed queries. Returns None when no transcript
+    directory exists so callers can fall back to ccusage.
+    """
+    if not any(os.path.isdir(d) for d in USAGE_PROJECT_DIRS):
+        return None
+    now = now or datetime.now(timezone.utc)
+    db = open_rollup_db(timeout=ROLLUP_WRITE_TIMEOUT)
+    try:
+        ingest_rollup(db)
+        block_rows = db.execute(
+            """SELECT start, first, last, entries, input_tokens, output_tokens,
+                      cache_creation_tokens, cache_read_tokens, cost, models
+               FROM usage_blocks ORDER BY start"""
+        ).fetchall()
+        day_rows = db.execute(
+            """SELECT day, SUM(input_tokens), SUM(output_tokens), SUM(cache_creation_tokens),
+                      SUM(cache_read_tokens), SUM(cost), GROUP_CONCAT(DISTINCT model)
+               FROM daily_usage GROUP BY day ORDER BY day"""
+        ).fetchall()
+        # Compacted history still counts towards its project
+        session_rows = db.execute(
+            """SELECT project, SUM(input_tokens), SUM(output_tokens), SUM(cache_creation_tokens),
+                      SUM(cache_read_tokens), SUM(cost), GROUP_CONCAT(DISTINCT model), MAX(day)
+               FROM (SELECT project, model, day, input_tokens, output_tokens,
+                            cache_creation_tokens, cache_read_tokens, cost FROM daily_usage
+                     UNION ALL
+                     SELECT project, model, month || '-01', input_tokens, output_tokens,
+                            cache_creation_tokens, cache_read_tokens, cost FROM monthly_usage)
+               GROUP BY project"""
+        ).fetchall()
+    finally:
+        db.close()
+
+    daily_list = [dict(usage_row_totals(row[1:6]), date=row[0], modelsUsed=usage_models(row[6]))
+                  for row in day_rows]
+    sessions = [dict(usage_row_totals(row[1:6]), sessionId=row[0], projectPath=row[0],
+                     lastActivity=row[7], modelsUsed=usage_models(row[6])) for row in session_rows]
+    session_list = sorted(sessions, key=lambda s: s['lastActivity'], reverse=True)
+    blocks_data = {'blocks': build_usage_blocks(block_rows, now)}
+    session_data = {'sessions': session_list, 'totals': sum_usage_totals(session_list)}
+    daily_data = {'daily': daily_list, 'totals': sum_usage_totals(daily_list)}
+    update_session_index(session_list)
+    return blocks_data, session_data, daily_data
+
+def sum_usage_totals(rows):
+    """Grand totals across aggregated rows"""
+    totals = new_usage_totals()
+    for row in rows:
+        for key in totals:
+            totals[key] += row[key]
+    return totals
+
+def encode_project_path(path):
+    """Encode a directory the way Claude Code names its ~/.claude/projects/ folders"""
+    return re.sub(r'[^a-zA-Z0-9]', '-', path.rstrip('/') or '/')
+
+def session_id_suffixes(session_id):
+    """Every hyphen-delimited tail of a session id, e.g. 'my-proj' and 'proj' for '-a-my-proj'"""
+    return [session_id[i + 1:] for i, ch in enumerate(session_id) if ch == '-' and session_id[i + 1:]]
+
+_session_index_memo = None
+
+def load_session_index():
+    """Load the persisted session index (memoized on file mtime inside the daemon)"""
+    global _session_index_memo
+    try:
+        mtime = os.stat(SESSION_INDEX_FILE).st_mtime_ns
+    except OSError:
+        return None
+    if _session_index_memo and _session_index_memo[0] == mtime:
+        return _session_index_memo[1]
+    try:
+        with open(SESSION_INDEX_FILE, 'r') as f:
+            index = json.load(f)
+    except (OSError, json.JSONDecodeError, ValueError):
+        return None
+    if not isinstance(index, dict) or index.get('version') != 1:
+        return None
+    _session_index_memo = (mtime, index)
+    return index
+
+def update_session_index(sessions, persist=True):
+    """Bring the session index in line with a fresh session list, touching only changed entries.
+
+    The index maps each sessionId (an encoded project path) to its totals, and
+    every hyphen-delimited suffix of it to the sessionIds that end with it, so
+    lookups never scan the session list.
+    """
+    index = load_session_index() or {'version': 1, 'entries': {}, 'suffixes': {}}
+    entries = index['entries']
+    suffixes = index['suffixes']
+
+    current = {}
+    for session in sessions or []:
+        session_id = session.get('sessionId')
+        if session_id:
+            current[session_id] = {
+                'totalCost': session.get('totalCost', 0.0),
+                'totalTokens': session.get('totalTokens', 0),
+                'lastActivity': session.get('lastActivity', ''),
+            }
+
+    changed = False
+    for session_id in [sid for sid in entries if sid not in current]:
+        del entries[session_id]
+        for suffix in session_id_suffixes(session_id):
+            ids = suffixes.get(suffix, [])
+            if session_id in ids:
+                ids.remove(session_id)
+            if not ids:
+                suffixes.pop(suffix, None)
+        changed = True
+
+    for session_id, entry in current.items():
+        if entries.get(session_id) == entry:
+            continue
+        if session_id not in entries:
+            for suffix in session_id_suffixes(session_id):
+                ids = suffixes.setdefault(suffix, [])
+                if session_id not in ids:
+                    ids.append(session_id)
+        entries[session_id] = entry
+        changed = True
+
+    if changed and persist:
+        try:
+            write_json_atomic(SESSION_INDEX_FILE, index)
+        except OSError:
+            pass
+    return index
+
+def find_indexed_session(index, cwd):
+    """Look up the session for cwd: exact project, then nearest ancestor, then basename.
+
+    Basename matches shared by several projects resolve to the most recently
+    active one (ties broken by sessionId), so the answer is deterministic.
+    """
+    if not index or not cwd:
+        return None
+    entries = index['entries']
+
+    path = cwd.rstrip('/')
+    while path:
+        entry = entries.get(encode_project_path(path))
+        if entry is not None:
+            return entry
+        path = os.path.dirname(path)
+        if path == '/':
+            break
+
+    basename = os.path.basename(cwd.rstrip('/'))
+    candidates = index['suffixes'].get(encode_project_path(basename)) if basename else None
+    if not candidates:
+        return None
+    # max() keeps the first of equal keys, so pre-sorting breaks ties by sessionId
+    best = max(sorted(candidates), key=lambda sid: entries[sid].get('lastActivity') or '')
+    return entries[best]
+
+def get_usage_data():
+    """Get (blocks, session, daily) usage, natively by default with ccusage as fallback"""
+    if USAGE_SOURCE != 'ccusage' and any(os.path.isdir(d) for d in USAGE_PROJECT_DIRS):
+        summary = current_usage_summary()
+        return tuple(summary['usage']) if summary else None
+    return get_ccusage_data()
+
+def get_model_weight(model_id):
+    """Weight of a model's tokens against the block limit (1.0 when unlisted)"""
+    model_id_lower = (model_id or '').lower()
+    for pattern, weight in MODEL_BURN_WEIGHTS:
+        if pattern in model_id_lower:
+            return weight
+    return 1.0
+
+class BurnRateTracker:
+    """Per-minute token/cost buckets in a fixed ring plus the running 5-hour block.
+
+    add() is O(1) per usage record; rates are computed on demand from at most
+    BURN_RING_MINUTES buckets. Records older than the ring are still counted
+    towards their block but not towards the rates.
+    """
+
+    def __init__(self, state=None):
+        state = state or {}
+        self.head = state.get('head', 0)
+        self.stamps = state.get('stamps') or [-1] * BURN_RING_MINUTES
+        self.tokens = state.get('tokens') or [0] * BURN_RING_MINUTES
+        self.weighted = state.get('weighted') or [0.0] * BURN_RING_MINUTES
+        self.cost = state.get('cost') or [0.0] * BURN_RING_MINUTES
+        self.block = state.get('block')
+        self.learned_limit = state.get('learnedLimit', 0)
+
+    def to_dict(self):
+        return {
+            'head': self.head, 'stamps': self.stamps, 'tokens': self.tokens,
+            'weighted': self.weighted, 'cost': self.cost,
+            'block': self.block, 'learnedLimit': self.learned_limit,
+        }
+
+    def add(self, entry_time, record):
+        """Fold one usage record in"""
+        ts = entry_time.timestamp()
+        tokens = (record['inputTokens'] + record['outputTokens']
+                  + record['cacheCreationTokens'] + record['cacheReadTokens'])
+        weighted = tokens * get_model_weight(record['model'])
+
+        block = self.block
+        block_seconds = BLOCK_DURATION.total_seconds()
+        if block is not None and ts < block['start']:
+            block = None  # Late record from an already closed block
+        elif block is None or ts - block['start'] >= block_seconds or ts - block['last'] >= block_seconds:
+            if block is not None:
+                self.learned_limit = max(self.learned_limit, round(block['weighted']))
+            # Blocks start on the hour of their first entry, in UTC
+            block = self.block = {'start': ts - ts % 3600, 'last': ts,
+                                  'tokens': 0, 'weighted': 0.0, 'cost': 0.0}
+        if block is not None:
+            block['last'] = max(block['last'], ts)
+            block['tokens'] += tokens
+            block['weighted'] += weighted
+            block['cost'] += record['cost']
+
+        minute = int(ts // 60)
+        if minute <= self.head - BURN_RING_MINUTES:
+            return
+        self.head = max(self.head, minute)
+        slot = minute % BURN_RING_MINUTES
+        if self.stamps[slot] != minute:
+            self.stamps[slot] = minute
+            self.tokens[slot] = 0
+            self.weighted[slot] = 0.0
+            self.cost[slot] = 0.0
+        self.tokens[slot] += tokens
+        self.weighted[slot] += weighted
+        self.cost[slot] += record['cost']
+
+    def block_limit(self):
+        """Block token limit from CLAUDE_STATUSLINE_BLOCK_LIMIT or the learned maximum"""
+        if BLOCK_LIMIT_SETTING == 'max':
+            return self.learned_limit or DEFAULT_BLOCK_LIMIT
+        if BLOCK_LIMIT_SETTING.isdigit():
+            return int(BLOCK_LIMIT_SETTING)
+        return max(DEFAULT_BLOCK_LIMIT, self.learned_limit)
+
+    def snapshot(self, now=None):
+        """Sliding-window and EWMA burn rates plus the active block's projection"""
+        now_ts = (now or datetime.now(timezone.utc)).timestamp()
+        now_minute = int(now_ts // 60)
+        window = max(1, min(BURN_WINDOW_MINUTES, BURN_RING_MINUTES))
+        alpha = 2 / (window + 1)
+
+        window_tokens = window_weighted = window_cost = 0.0
+        ewma_tokens = ewma_weighted = 0.0
+        # Oldest to newest, one step per minute; empty minutes decay the EWMA
+        for minute in range(now_minute - BURN_RING_MINUTES + 1, now_minute + 1):
+            slot = minute % BURN_RING_MINUTES
+            if self.stamps[slot] == minute:
+                tokens, weighted, cost = self.tokens[slot], self.weighted[slot], self.cost[slot]
+            else:
+                tokens = weighted = cost = 0
+            ewma_tokens += alpha * (tokens - ewma_tokens)
+            ewma_weighted += alpha * (weighted - ewma_weighted)
+            if minute > now_minute - window:
+                window_tokens += tokens
+                window_weighted += weighted
+                window_cost += cost
+
+        limit = self.block_limit()
+        result = {
+            'tokensPerMinute': ewma_tokens,
+            'windowTokensPerMinute': window_tokens / window,
+            'costPerHour': window_cost / window * 60,
+            'blockLimit': limit,
+            'blockActive': False,
+        }
+
+        block = self.block
+        block_seconds = BLOCK_DURATION.total_seconds()
+        if block and now_ts - block['last'] < block_seconds and now_ts < block['start'] + block_seconds:
+            block_remaining = (block['start'] + block_seconds - now_ts) / 60
+            to_limit = block_remaining
+            if ewma_weighted > 0:
+                to_limit = min(block_remaining, max(0.0, limit - block['weighted']) / ewma_weighted)
+            result.update({
+                'blockActive': True,
+                'blockTokens': block['tokens'],
+                'blockUsedPercent': block['weighted'] / limit * 100 if limit else 0.0,
+                'blockRemainingMinutes': round(block_remaining),
+                'minutesToLimit': round(to_limit),
+            })
+        return result
+
+ROLLUP_SCHEMA = """
+CREATE TABLE IF NOT EXISTS daily_usage (
+    day TEXT NOT NULL,
+    project TEXT NOT NULL,
+    model TEXT NOT NULL,
+    input_tokens INTEGER NOT NULL DEFAULT 0,
+    output_tokens INTEGER NOT NULL DEFAULT 0,
+    cache_creation_tokens INTEGER NOT NULL DEFAULT 0,
+    cache_read_tokens INTEGER NOT NULL DEFAULT 0,
+    cost REAL NOT NULL DEFAULT 0,
+    PRIMARY KEY (day, project, model)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS monthly_usage (
+    month TEXT NOT NULL,
+    project TEXT NOT NULL,
+    model TEXT NOT NULL,
+    input_tokens INTEGER NOT NULL DEFAULT 0,
+    output_tokens INTEGER NOT NULL DEFAULT 0,
+    cache_creation_tokens INTEGER NOT NULL DEFAULT 0,
+    cache_read_tokens INTEGER NOT NULL DEFAULT 0,
+    cost REAL NOT NULL DEFAULT 0,
+    PRIMARY KEY (month, project, model)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS seen_entries (
+    key TEXT PRIMARY KEY,
+    day TEXT NOT NULL
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS seen_entries_day ON seen_entries (day);
+CREATE TABLE IF NOT EXISTS pending_entries (
+    ts REAL NOT NULL,
+    model TEXT NOT NULL,
+    input_tokens INTEGER NOT NULL,
+    output_tokens INTEGER NOT NULL,
+    cache_creation_tokens INTEGER NOT NULL,
+    cache_read_tokens INTEGER NOT NULL,
+    cost REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS usage_blocks (
+    start REAL PRIMARY KEY,
+    first REAL NOT NULL,
+    last REAL NOT NULL,
+    entries INTEGER NOT NULL DEFAULT 0,
+    input_tokens INTEGER NOT NULL DEFAULT 0,
+    output_tokens INTEGER NOT NULL DEFAULT 0,
+    cache_creation_tokens INTEGER NOT NULL DEFAULT 0,
+    cache_read_tokens INTEGER NOT NULL DEFAULT 0,
+    cost REAL NOT NULL DEFAULT 0,
+    models TEXT NOT NULL DEFAULT '[]'
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS ingested_files (
+    path TEXT PRIMARY KEY,
+    inode INTEGER NOT NULL,
+    size INTEGER NOT NULL,
+    offset INTEGER NOT NULL
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+) WITHOUT ROWID;
+"""
+
+def open_rollup_db(readonly=False, timeout=0.1):
+    """Open the local spend rollup database; the writable one is created if needed"""
+    import sqlite3
+    if readonly:
+        from urllib.parse import quote
+        return sqlite3.connect(f"file:{quote(ROLLUP_DB)}?mode=ro", uri=True, timeout=timeout)
+    os.makedirs(os.path.dirname(ROLLUP_DB), exist_ok=True)
+    db = sqlite3.connect(ROLLUP_DB, timeout=timeout, isolation_level=None)
+    db.execute('PRAGMA journal_mode=WAL')
+    db.execute('PRAGMA synchronous=NORMAL')
+    db.executescript(ROLLUP_SCHEMA)
+    return db
+
+def run_rollup_transaction(db, body):
+    """Run body() inside BEGIN IMMEDIATE ... COMMIT, rolling back if it raises"""
+    db.execute('BEGIN IMMEDIATE')
+    try:
+        body()
+        db.execute('COMMIT')
+    except BaseException:
+        db.execute('ROLLBACK')
+        raise
+
+def ingest_rollup(db):
+    """Fold transcript lines appended since the last run into the daily rollup.
+
+    The first run backfills all history; afterwards each file is read from its
+    stored byte offset, so unchanged transcripts only cost a stat. Each file's
+    new lines are committed together with its new offset, so an interrupted
+    backfill keeps every file it finished. Entries are de-duplicated across
+    files (resumed sessions repeat earlier messages) and staged in
+    pending_entries; the burn tracker takes them in time order once every file
+    is in, whatever order the files were read in.
+    """
+    known = {row[0]: row[1:] for row in db.execute('SELECT path, inode, size, offset FROM ingested_files')}
+    present = set()
+    for project, path in iter_transcript_files():
+        present.add(path)
+        try:
+            st = os.stat(path)
+        except OSError:
+            continue
+        inode, size, offset = known.get(path, (None, 0, 0))
+        if inode == st.st_ino and size == st.st_size:
+            continue
+        if inode != st.st_ino or st.st_size < offset:
+            offset = 0  # New or rewritten file
+
+        try:
+            with open(path, 'rb') as f:
+                f.seek(offset)
+                chunk = f.read(st.st_size - offset)
+        except OSError:
+            continue
+        # Only complete lines; a partially written one is read again next time
+        end = chunk.rfind(b'\n')
+        chunk = chunk[:end + 1] if end >= 0 else b''
+
+        def ingest_file():
+            for line in chunk.decode('utf-8', 'replace').splitlines():
+                record = parse_usage_entry(line)
+                if record is None:
+                    continue
+                entry_time = parse_timestamp(record['timestamp'])
+                if entry_time is None:
+                    continue
+                day = entry_time.astimezone().strftime('%Y-%m-%d')
+                if record['key'] is not None:
+                    inserted = db.execute('INSERT OR IGNORE INTO seen_entries (key, day) VALUES (?, ?)',
+                                          (record['key'], day)).rowcount
+                    if not inserted:
+                        continue
+                db.execute(
+                    """INSERT INTO daily_usage (day, project, model, input_tokens, output_tokens,
+                                                cache_creation_tokens, cache_read_tokens, cost)
+                       VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                       ON CONFLICT (day, project, model) DO UPDATE SET
+                           input_tokens = input_tokens + excluded.input_tokens,
+                           output_tokens = output_tokens + excluded.output_tokens,
+                           cache_creation_tokens = cache_creation_tokens + excluded.cache_creation_tokens,
+                           cache_read_tokens = cache_read_tokens + excluded.cache_read_tokens,
+                           cost = cost + excluded.cost""",
+                    (day, project, record['model'], record['inputTokens'], record['outputTokens'],
+                     record['cacheCreationTokens'], record['cacheReadTokens'], record['cost'])
+                )
+                db.execute(
+                    """INSERT INTO pending_entries (ts, model, input_tokens, output_tokens,
+                                                  cache_creation_tokens, cache_read_tokens, cost)
+                       VALUES (?, ?, ?, ?, ?, ?, ?)""",
+                    (entry_time.timestamp(), record['model'], record['inputTokens'], record['outputTokens'],
+                     record['cacheCreationTokens'], record['cacheReadTokens'], record['cost'])
+                )
+            db.execute('INSERT OR REPLACE INTO ingested_files (path, inode, size, offset) VALUES (?, ?, ?, ?)',
+                       (path, st.st_ino, st.st_size, offset + len(chunk)))
+
+        run_rollup_transaction(db, ingest_file)
+
+    def finish():
+        for path in set(known) - present:
+            db.execute('DELETE FROM ingested_files WHERE path = ?', (path,))
+        fold_pending_entries(db)
+        compact_rollup(db)
+        db.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('ingested_at', ?)", (str(time.time()),))
+
+    run_rollup_transaction(db, finish)
+
+def fold_pending_entries(db):
+    """Feed staged entries to the burn tracker and block rows in time order (caller holds the write transaction)"""
+    rows = db.execute(
+        """SELECT ts, model, input_tokens, output_tokens, cache_creation_tokens, cache_read_tokens, cost
+           FROM pending_entries ORDER BY ts"""
+    ).fetchall()
+    if not rows:
+        return
+    tracker = load_burn_tracker(db)
+    for ts, model, input_tokens, output_tokens, cache_creation, cache_read, cost in rows:
+        record = {
+            'model': model, 'inputTokens': input_tokens, 'outputTokens': output_tokens,
+            'cacheCreationTokens': cache_creation, 'cacheReadTokens': cache_read, 'cost': cost,
+        }
+        tracker.add(datetime.fromtimestamp(ts, timezone.utc), record)
+        add_to_usage_block(db, ts, record)
+    db.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('burn_tracker', ?)",
+               (json.dumps(tracker.to_dict()),))
+    db.execute('DELETE FROM pending_entries')
+
+def add_to_usage_block(db, ts, record):
+    """Fold one usage record into its 5-hour block row (caller holds the write transaction).
+
+    Entries normally arrive after the latest block's; a late one joins the
+    block whose window covers it, or starts one of its own.
+    """
+    block_seconds = BLOCK_DURATION.total_seconds()
+    row = db.execute('SELECT start, last, models FROM usage_blocks WHERE start <= ? ORDER BY start DESC LIMIT 1',
+                     (ts,)).fetchone()
+    if row is None or ts - row[0] > block_seconds or ts - row[1] > block_seconds:
+        # Blocks start on the hour of their first entry, in UTC
+        start, models = ts - ts % 3600, []
+        db.execute('INSERT INTO usage_blocks (start, first, last) VALUES (?, ?, ?)', (start, ts, ts))
+    else:
+        start, models = row[0], json.loads(row[2])
+    if record['model'] and record['model'] not in models:
+        models.append(record['model'])
+    db.execute(
+        """UPDATE usage_blocks SET first = MIN(first, ?), last = MAX(last, ?), entries = entries + 1,
+               input_tokens = input_tokens + ?, output_tokens = output_tokens + ?,
+               cache_creation_tokens = cache_creation_tokens + ?, cache_read_tokens = cache_read_tokens + ?,
+               cost = cost + ?, models = ?
+           WHERE start = ?""",
+        (ts, ts, record['inputTokens'], record['outputTokens'], record['cacheCreationTokens'],
+         record['cacheReadTokens'], record['cost'], json.dumps(models), start)
+    )
+
+def load_burn_tracker(db):
+    """Burn rate state persisted alongside the rollup it was fed from"""
+    row = db.execute("SELECT value FROM meta WHERE key = 'burn_tracker'").fetchone()
+    try:
+        return BurnRateTracker(json.loads(row[0]) if row else None)
+    except (ValueError, TypeError):
+        return BurnRateTracker()
+
+def compact_rollup(db):
+    """Once a day, fold daily rows past the retention window into monthly rows"""
+    today = datetime.now().strftime('%Y-%m-%d')
+    row = db.execute("SELECT value FROM meta WHERE key = 'last_compaction'").fetchone()
+    if row and row[0] == today:
+        return
+    cutoff = (datetime.now() - timedelta(days=ROLLUP_RETENTION_DAYS)).strftime('%Y-%m-%d')
+    db.execute(
+        """INSERT INTO monthly_usage (month, project, model, input_tokens, output_tokens,
+                                      cache_creation_tokens, cache_read_tokens, cost)
+           SELECT substr(day, 1, 7), project, model, SUM(input_tokens), SUM(output_tokens),
+                  SUM(cache_creation_tokens), SUM(cache_read_tokens), SUM(cost)
+           FROM daily_usage WHERE day < ? GROUP BY substr(day, 1, 7), project, model
+           ON CONFLICT (month, project, model) DO UPDATE SET
+               input_tokens = input_tokens + excluded.input_tokens,
+               output_tokens = output_tokens + excluded.output_tokens,
+               cache_creation_tokens = cache_creation_tokens + excluded.cache_creation_tokens,
+               cache_read_tokens = cache_read_tokens + excluded.cache_read_tokens,
+               cost = cost + excluded.cost""",
+        (cutoff,)
+    )
+    db.execute('DELETE FROM daily_usage WHERE day < ?', (cutoff,))
+    db.execute('DELETE FROM seen_entries WHERE day < ?', (cutoff,))
+    db.execute('DELETE FROM usage_blocks WHERE start < ?',
+               ((datetime.now() - timedelta(days=ROLLUP_RETENTION_DAYS)).timestamp(),))
+    db.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('last_compaction', ?)", (today,))
+
+def transcript_signature():
+    """CRC of every transcript's (path, size, mtime); it changes whenever one is written"""
+    import zlib
+    crc = 0
+    for _, path in sorted(iter_transcript_files()):
+        try:
+            st = os.stat(path)
+        except OSError:
+            continue
+        crc = zlib.crc32(f"{path}\0{st.st_size}\0{st.st_mtime_ns}\n".encode('utf-8', 'surrogateescape'), crc)
+    return f"{crc:08x}"
+
+def read_rollup_spend():
+    """(today / 7-day / month-to-date spend or None, burn tracker state) from the rollup"""
+    db = open_rollup_db(readonly=True)
+    try:
+        now = datetime.now()
+        today = now.strftime('%Y-%m-%d')
+        week_start = (now - timedelta(days=6)).strftime('%Y-%m-%d')
+        month_start = now.strftime('%Y-%m-01')
+        query = 'SELECT COALESCE(SUM(cost), 0) FROM daily_usage WHERE day >= ?'
+        spend = {
+            'today': db.execute(query, (today,)).fetchone()[0],
+            'week': db.execute(query, (week_start,)).fetchone()[0],
+            'month': db.execute(query, (month_start,)).fetchone()[0],
+        }
+        if db.execute('SELECT 1 FROM ingested_files LIMIT 1').fetchone() is None:
+            spend = None
+        return spend, load_burn_tracker(db).to_dict()
+    finally:
+        db.close()
+
+def update_usage_summary():
+    """Ingest new transcript lines and rewrite the shared usage summary; never called from a one-shot render"""
+    import sqlite3
+    # Taken first: lines written during the ingest leave the summary stale
+    signature = transcript_signature()
+    with trace_span('ingest_rollup', cat='refresh') as span:
+        try:
+            usage = aggregate_usage()
+            if usage is None:
+                return None
+            spend, tracker = read_rollup_spend()
+        except (sqlite3.Error, OSError) as e:
+            span.error(e)  # Files finished before the error stay ingested
+            return None
+    summary = {
+        'fetchedAt': time.time(),
+        'signature': signature,
+        'usage': compact_provider_value('usage', usage),
+        'spend': spend,
+        'tracker': tracker,
+    }
+    try:
+        write_json_atomic(USAGE_SUMMARY_FILE, summary)
+    except OSError:
+        pass
+    return summary
+
+def read_usage_summary():
+    """(summary or None, fresh) from the shared usage summary file"""
+    try:
+        with open(USAGE_SUMMARY_FILE, 'r') as f:
+            summary = json.load(f)
+        fresh = (time.time() - summary['fetchedAt'] <= USAGE_SUMMARY_TTL
+                 and summary['signature'] == transcript_signature())
+    except (OSError, json.JSONDecodeError, ValueError, TypeError, KeyError):
+        return None, False
+    return summary, fresh
+
+def refresh_usage_summary():
+    """Refresh a stale usage summary in one process at a time across the host.
+
+    Usage and spend share this one key whichever window found the summary
+    stale, so the transcripts are ingested once however many windows ask.
+    """
+    return single_flight('usage', read_usage_summary, update_usage_summary, ROLLUP_WRITE_TIMEOUT)
+
+def spawn_usage_refresh():
+    """Refresh the usage summary in a detached process, unless one is already doing it"""
+    if claim_refresh('usage') and not spawn_background(['--refresh-usage']):
+        release_refresh('usage')
+
+def refresh_usage():
+    """Background refresher entry point (`--refresh-usage`)"""
+    try:
+        refresh_usage_summary()
+    finally:
+        release_refresh('usage')
+
+def current_usage_summary():
+    """The shared usage summary, with a stale one refreshed off the render path.
+
+    A one-shot render only reads the summary and leaves the refresh to a
+    detached process, since its provider threads are abandoned at the render
+    budget. The daemon's are not, so it refreshes in place.
+    """
+    if not any(os.path.isdir(d) for d in USAGE_PROJECT_DIRS):
+        return None
+    summary, fresh = read_usage_summary()
+    if not fresh:
+        if _daemon_mode:
+            summary = refresh_usage_summary() or summary
+        else:
+            spawn_usage_refresh()
+    return summary
+
+def get_spend_summary():
+    """Spend for today, the last 7 days and the month to date, with the current burn rate"""
+    summary = current_usage_summary()
+    if not summary or not summary.get('spend'):
+        return None
+    return dict(summary['spend'], burn=BurnRateTracker(summary.get('tracker')).snapshot())
 
 def get_current_working_directory():
     """Get the current working directory from environment or pwd"""
     try:
+        # Inside the daemon, the client forwards its own working directory
+        if _request_cwd:
+            return _request_cwd
         # Try to get from PWD environment variable first
         cwd = os.environ.get('PWD', '')
         if not cwd:
@@ -75,114 +1558,188 @@ def get_current_working_directory():
     except:
         return None
 
-def get_git_branch():
-    """Get current git branch with robust error handling"""
-    try:
-        cwd = get_current_working_directory()
-        if not cwd:
+_git_dir_cache = {}   # cwd -> git dir (daemon only benefits)
+_git_head_cache = {}  # HEAD path -> ((mtime_ns, size), branch)
+
+def find_git_dir(cwd):
+    """Find the git directory for cwd, following `gitdir:` files (worktrees, submodules)"""
+    cached = _git_dir_cache.get(cwd)
+    if cached and os.path.exists(os.path.join(cached, 'HEAD')):
+        return cached
+
+    path = os.path.abspath(cwd)
+    while True:
+        dotgit = os.path.join(path, '.git')
+        if os.path.isdir(dotgit):
+            git_dir = dotgit
+            break
+        if os.path.isfile(dotgit):
+            try:
+                with open(dotgit, 'r') as f:
+                    content = f.read().strip()
+            except OSError:
+                return None
+            if not content.startswith('gitdir:'):
+                return None
+            git_dir = content[len('gitdir:'):].strip()
+            if not os.path.isabs(git_dir):
+                git_dir = os.path.normpath(os.path.join(path, git_dir))
+            break
+        parent = os.path.dirname(path)
+        if parent == path:
             return None
+        path = parent
 
-        result = subprocess.run(
-            ["git", "branch", "--show-current"],
-            capture_output=True,
-            text=True,
-            timeout=0.5,
-            cwd=cwd
-        )
+    _git_dir_cache[cwd] = git_dir
+    return git_dir
 
-        if result.returncode == 0 and result.stdout.strip():
-            return result.stdout.strip()
+def git_common_dir(git_dir):
+    """Shared git dir holding refs for linked worktrees (the git dir itself otherwise)"""
+    try:
+        with open(os.path.join(git_dir, 'commondir'), 'r') as f:
+            common = f.read().strip()
+    except OSError:
+        return git_dir
+    return common if os.path.isabs(common) else os.path.normpath(os.path.join(git_dir, common))
+
+def read_packed_refs(common_dir):
+    """Map ref name -> SHA from packed-refs"""
+    refs = {}
+    try:
+        with open(os.path.join(common_dir, 'packed-refs'), 'r') as f:
+            for line in f:
+                if line.startswith(('#', '^')):
+                    continue
+                parts = line.split()
+                if len(parts) == 2:
+                    refs[parts[1]] = parts[0]
+    except OSError:
+        pass
+    return refs
+
+def resolve_git_ref(git_dir, ref, depth=0):
+    """Resolve a ref name to a SHA through loose refs, then packed-refs"""
+    if depth > 5:
         return None
-    except:
+    common_dir = git_common_dir(git_dir)
+    for base in (git_dir, common_dir):
+        try:
+            with open(os.path.join(base, ref), 'r') as f:
+                value = f.read().strip()
+        except OSError:
+            continue
+        if value.startswith('ref:'):
+            return resolve_git_ref(git_dir, value[4:].strip(), depth + 1)
+        return value
+    return read_packed_refs(common_dir).get(ref)
+
+def describe_detached_head(git_dir, sha):
+    """Name a detached HEAD by a tag pointing at it, else by its short SHA"""
+    common_dir = git_common_dir(git_dir)
+    tags_dir = os.path.join(common_dir, 'refs', 'tags')
+    for root, _, names in os.walk(tags_dir):
+        for name in names:
+            try:
+                with open(os.path.join(root, name), 'r') as f:
+                    if f.read().strip() == sha:
+                        return f"({os.path.relpath(os.path.join(root, name), tags_dir)})"
+            except OSError:
+                continue
+    for ref, ref_sha in read_packed_refs(common_dir).items():
+        if ref_sha == sha and ref.startswith('refs/tags/'):
+            return f"({ref[len('refs/tags/'):]})"
+    return f"({sha[:7]})"
+
+def get_git_branch(cwd=None):
+    """Get current git branch by reading .git/HEAD directly (no git subprocess).
+
+    Detached HEADs show as "(tag)" or "(abc1234)". The result is cached on
+    HEAD's mtime and size, so an unchanged repo costs a couple of stat calls.
+    """
+    cwd = cwd or get_current_working_directory()
+    if not cwd:
+        return None
+    git_dir = find_git_dir(cwd)
+    if not git_dir:
+        return None
+
+    head_path = os.path.join(git_dir, 'HEAD')
+    try:
+        st = os.stat(head_path)
+    except OSError:
         return None
+    signature = (st.st_mtime_ns, st.st_size)
+    cached = _git_head_cache.get(head_path)
+    if cached and cached[0] == signature:
+        return cached[1]
 
-def format_model_name(model_id):
-    """Format raw model ID into a friendly display name"""
-    if not model_id:
+    try:
+        with open(head_path, 'r') as f:
+            head = f.read().strip()
+    except OSError:
         return None
 
-    model_id_lower = model_id.lower()
-
-    # Anthropic models (order matters - check more specific patterns first)
-    if 'opus-4-7' in model_id_lower or 'opus 4.7' in model_id_lower:
-        return "Opus 4.7"
-    elif 'opus-4-6' in model_id_lower or 'opus 4.6' in model_id_lower:
-        return "Opus 4.6"
-    elif 'opus-4-5' in model_id_lower or 'opus 4.5' in model_id_lower:
-        return "Opus 4.5"
-    elif 'opus-4-1' in model_id_lower:
-        return "Opus 4.1"
-    elif 'opus-4' in model_id_lower:
-        return "Opus 4"
-    elif 'sonnet-4-7' in model_id_lower or 'sonnet 4.7' in model_id_lower:
-        return "Sonnet 4.7"
-    elif 'sonnet-4-6' in model_id_lower or 'sonnet 4.6' in model_id_lower:
-        return "Sonnet 4.6"
-    elif 'sonnet-4-5' in model_id_lower:
-        return "Sonnet 4.5"
-    elif 'sonnet-4' in model_id_lower:
-        return "Sonnet 4"
-    elif 'sonnet-3-5' in model_id_lower or 'sonnet-20241022' in model_id_lower:
-        return "Sonnet 3.5"
-    elif 'sonnet' in model_id_lower:
-        return "Sonnet"
-    elif 'haiku-4-5' in model_id_lower or 'haiku 4.5' in model_id_lower:
-        return "Haiku 4.5"
-    elif 'haiku' in model_id_lower:
-        return "Haiku"
-
-    # Google models (order matters - check more specific patterns first)
-    elif 'gemini-3.1-pro' in model_id_lower:
-        return "Gemini 3.1 Pro"
-    elif 'gemini-3-pro' in model_id_lower or 'gemini-3.0-pro' in model_id_lower:
-        return "Gemini 3 Pro"
-    elif 'gemini-3-flash' in model_id_lower or 'gemini-3.0-flash' in model_id_lower:
-        return "Gemini 3 Flash"
-    elif 'gemini-2.5-pro' in model_id_lower:
-        return "Gemini 2.5 Pro"
-    elif 'gemini-2.5-flash-lite' in model_id_lower:
-        return "Gemini 2.5 Flash Lite"
-    elif 'gemini-2.5-flash' in model_id_lower:
-        return "Gemini 2.5 Flash"
-    elif 'gemini-2' in model_id_lower:
-        return "Gemini 2"
-    elif 'gemini' in model_id_lower:
-        return "Gemini"
-
-    # xAI models (order matters - check more specific patterns first)
-    elif 'grok-4-2' in model_id_lower or 'grok-4.2' in model_id_lower:
-        return "Grok 4.2 Beta"
-    elif 'grok-4-1-fast' in model_id_lower or 'grok-4.1-fast' in model_id_lower:
-        return "Grok 4.1 Fast"
-    elif 'grok-4-1' in model_id_lower or 'grok-4.1' in model_id_lower:
-        return "Grok 4.1"
-    elif 'grok-4-fast' in model_id_lower:
-        return "Grok 4 Fast"
-    elif 'grok-4' in model_id_lower:
-        return "Grok 4"
-    elif 'grok' in model_id_lower:
-        return "Grok"
-
-    # OpenAI models (order matters - check more specific patterns first)
-    elif 'o3' in model_id_lower:
-        return "O3"
-    elif 'gpt-5-4-pro' in model_id_lower or 'gpt-5.4-pro' in model_id_lower:
-        return "GPT-5.4 Pro"
-    elif 'gpt-5-4' in model_id_lower or 'gpt-5.4' in model_id_lower:
-        return "GPT-5.4"
-    elif 'gpt-5-3' in model_id_lower or 'gpt-5.3' in model_id_lower:
-        return "GPT-5.3"
-    elif 'gpt-5' in model_id_lower:
-        return "GPT-5"
-    elif 'gpt-4' in model_id_lower:
-        return "GPT-4"
-
-    # Generic fallback
-    elif 'claude-' in model_id_lower:
-        return model_id.replace('claude-', '').replace('-', ' ').title()
+    if head.startswith('ref:'):
+        ref = head[4:].strip()
+        if ref.startswith('refs/heads/'):
+            branch = ref[len('refs/heads/'):]
+        else:
+            sha = resolve_git_ref(git_dir, ref)
+            branch = describe_detached_head(git_dir, sha) if sha else ref
+    elif re.fullmatch(r'[0-9a-f]{40}([0-9a-f]{24})?', head):
+        branch = describe_detached_head(git_dir, head)
     else:
-        # Return cleaned up version
-        return model_id.replace('-', ' ').title()
+        branch = None
+
+    _git_head_cache[head_path] = (signature, branch)
+    return branch
+
+def read_metrics_snapshot(session_id=None):
+    """Read real token usage from the proxy's binary snapshot without any JSON parsing.
+
+    Returns (available, total_tokens): available is False when there is no
+    usable snapshot or the session has no slot in it (callers fall back to
+    token-metrics.json); total_tokens is None when the session's slot has
+    nothing recent.
+    """
+    import mmap
+    header = METRICS_SNAPSHOT_HEADER
+    slot = METRICS_SNAPSHOT_SLOT
+    try:
+        with open(METRICS_SNAPSHOT_FILE, 'rb') as f:
+            data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    except (OSError, ValueError):
+        return False, None
+    try:
+        # Seqlock: retry while the proxy is mid-write (odd or changed sequence)
+        for _ in range(3):
+            magic, slot_count, seq, updated_ns, *totals, used = header.unpack_from(data, 0)
+            if magic != b'CTM1' or len(data) < header.size + slot.size * slot_count:
+                return False, None
+            if seq % 2:
+                continue
+            found = True
+            if session_id:
+                wanted = session_id.encode('utf-8')[:64]
+                for i in range(min(used, slot_count)):
+                    slot_id, slot_ns, *slot_totals = slot.unpack_from(data, header.size + i * slot.size)
+                    if slot_id.rstrip(b'\0') == wanted:
+                        updated_ns, totals = slot_ns, slot_totals
+                        break
+                else:
+                    found = False
+            if header.unpack_from(data, 0)[2] != seq:
+                continue
+            if not found:
+                # Only the most recent sessions get a slot; the JSON file has them all
+                return False, None
+            age_ns = time.monotonic_ns() - updated_ns
+            if not used or not 0 <= age_ns < METRICS_SNAPSHOT_MAX_AGE_NS:
+                return True, None
+            return True, sum(totals)
+        return False, None
+    finally:
+        data.close()
 
 def get_ccr_port():
     """Read CCR port from config file"""
@@ -196,236 +1753,673 @@ def get_ccr_port():
     except:
         return 8181  # Default CCR port
 
+class ServiceError(Exception):
+    """A localhost service request failed.
+
+    kind is 'unavailable' (connection refused/reset), 'timeout', 'http'
+    (non-2xx status), 'invalid' (body is not the expected JSON) or 'open'
+    (skipped because the service's circuit breaker is open).
+    """
+
+    def __init__(self, service, kind, detail=''):
+        super().__init__(f"{service}: {kind}{' - ' + detail if detail else ''}")
+        self.service = service
+        self.kind = kind
+        self.detail = detail
+
+_breaker_memo = None
+
+def load_breakers():
+    """Breaker state per service from the shared file (memoized on file mtime)"""
+    global _breaker_memo
+    try:
+        mtime = os.stat(BREAKER_FILE).st_mtime_ns
+    except OSError:
+        return {}
+    if _breaker_memo and _breaker_memo[0] == mtime:
+        return _breaker_memo[1]
+    try:
+        with open(BREAKER_FILE, 'r') as f:
+            states = json.load(f)
+    except (OSError, json.JSONDecodeError, ValueError):
+        return {}
+    if not isinstance(states, dict):
+        return {}
+    _breaker_memo = (mtime, states)
+    return states
+
+def update_breaker(service, change):
+    """Replace one service's breaker state with change(current state); None clears it.
+
+    Providers on other threads and in other processes update the same entries
+    at the same time, so the whole read-modify-write happens under a lock.
+    """
+    import fcntl
+    try:
+        os.makedirs(CACHE_DIR, exist_ok=True)
+        with open(BREAKER_FILE + '.lock', 'w') as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            states = dict(load_breakers())
+            current = states.get(service)
+            state = change(current)
+            if state == current:
+                return
+            if state is None:
+                states.pop(service, None)
+            else:
+                states[service] = state
+            write_json_atomic(BREAKER_FILE, states)
+    except OSError:
+        pass
+
+def breaker_allows(service):
+    """False while the service's breaker is open.
+
+    An open breaker whose back-off has expired is half-open: one background
+    `--probe-service` process tests the service while renders keep skipping it.
+    """
+    state = load_breakers().get(service)
+    if not state or state.get('openUntil') is None:
+        return True
+    if time.time() >= state['openUntil'] and claim_refresh(f"probe-{service}"):
+        if not spawn_background(['--probe-service', service]):
+            release_refresh(f"probe-{service}")
+    return False
+
+def record_service_result(service, error=None):
+    """Count consecutive unreachable results and open the breaker at the threshold.
+
+    Once open, only the half-open probe closes the breaker: an answer to a
+    request that started before it opened does not.
+    """
+    if error is None or error.kind not in ('unavailable', 'timeout'):
+        # Any answer, even a bad one, means the service is up
+        if load_breakers().get(service):
+            update_breaker(service, lambda state: state if state and state.get('openUntil') else None)
+        return
+
+    def count_failure(state):
+        if state and state.get('openUntil'):
+            return state
+        failures = (state or {}).get('failures', 0) + 1
+        state = {'failures': failures, 'openUntil': None, 'backoff': None}
+        if failures >= BREAKER_FAILURES:
+            state['backoff'] = BREAKER_BACKOFF
+            state['openUntil'] = time.time() + BREAKER_BACKOFF
+        return state
+    update_breaker(service, count_failure)
+
+def probe_service(service):
+    """Background half-open probe entry point (`--probe-service NAME`)"""
+    try:
+        if service not in SERVICE_ENDPOINTS:
+            return
+        try:
+            request_service_json(service, SERVICE_ENDPOINTS[service]['probe'])
+            alive = True
+        except ServiceError as e:
+            alive = e.kind not in ('unavailable', 'timeout')
+        if alive:
+            update_breaker(service, lambda state: None)
+        else:
+            def reopen(state):
+                state = state or {}
+                backoff = min((state.get('backoff') or BREAKER_BACKOFF) * 2, BREAKER_MAX_BACKOFF)
+                return {'failures': state.get('failures', BREAKER_FAILURES),
+                        'openUntil': time.time() + backoff, 'backoff': backoff}
+            update_breaker(service, reopen)
+    finally:
+        release_refresh(f"probe-{service}")
+
+_http_pool = {}
+_http_pool_lock = None
+
+def service_endpoint(service):
+    """(port, connect_timeout, read_timeout) for a localhost service; the read timeout is learned"""
+    endpoint = SERVICE_ENDPOINTS[service]
+    port = endpoint['port'] if endpoint['port'] is not None else get_ccr_port()
+    read_timeout = adaptive_timeout(service, endpoint['read_timeout'], TIMEOUT_BOUNDS[service])
+    return port, endpoint['connect_timeout'], read_timeout
+
+def http_get_json(service, path):
+    """GET a JSON document from a localhost service over a pooled keep-alive connection.
+
+    Connections are kept per (service, port) and reused across requests, which
+    inside the daemon means across renders. Raises ServiceError on any failure,
+    immediately (kind 'open') while the service's circuit breaker is open.
+    """
+    if not breaker_allows(service):
+        raise ServiceError(service, 'open', path)
+    try:
+        if _trace_events is None:
+            data = fetch_service_json(service, path)
+        else:
+            with trace_span(f"http {service}", cat='service', path=path):
+                data = fetch_service_json(service, path)
+    except ServiceError as e:
+        record_service_result(service, e)
+        raise
+    record_service_result(service)
+    return data
+
+def fetch_service_json(service, path):
+    """request_service_json, hedged and timed.
+
+    Every service request is an idempotent localhost GET, so one still
+    unanswered after the service's usual latency goes out again on a second
+    connection and the first answer wins. Each answer's latency is recorded.
+    """
+    def attempt():
+        start = time.perf_counter()
+        token = object()
+        _latency_inflight[token] = (service, start)
+        try:
+            data = request_service_json(service, path)
+        except ServiceError as e:
+            if e.kind == 'timeout':
+                record_latency(service, service_endpoint(service)[2] * 1000)
+            elif e.kind in ('http', 'invalid'):
+                record_latency(service, (time.perf_counter() - start) * 1000)
+            raise
+        finally:
+            _latency_inflight.pop(token, None)
+        record_latency(service, (time.perf_counter() - start) * 1000)
+        return data
+
+    hedge_after = latency_percentile(service, HEDGE_PERCENTILE) if HEDGE_REQUESTS else None
+    if hedge_after is None:
+        return attempt()
+
+    import queue
+    import threading
+    answers = queue.Queue()
+
+    def run_attempt():
+        try:
+            answers.put((attempt(), None))
+        except ServiceError as e:
+            answers.put((None, e))
+
+    threading.Thread(target=run_attempt, daemon=True).start()
+    try:
+        data, error = answers.get(timeout=max(hedge_after, HEDGE_MIN_MS) / 1000)
+    except queue.Empty:
+        threading.Thread(target=run_attempt, daemon=True).start()
+        # Both attempts are bounded by the connect and read timeouts
+        data, error = answers.get()
+        if error is not None:
+            data, error = answers.get()
+    if error is not None:
+        raise error
+    return data
+
+def request_service_json(service, path):
+    """One GET over a pooled connection; the body of fetch_service_json"""
+    import http.client
+    import socket
+    import threading
+    global _http_pool_lock
+    if _http_pool_lock is None:
+        _http_pool_lock = threading.Lock()
+
+    port, connect_timeout, read_timeout = service_endpoint(service)
+    pool_key = (service, port)
+
+    for attempt in range(2):
+        with _http_pool_lock:
+            idle = _http_pool.setdefault(pool_key, [])
+            conn = idle.pop() if idle else None
+        reused = conn is not None
+        if conn is None:
+            conn = http.client.HTTPConnection('localhost', port, timeout=connect_timeout)
+
+        try:
+            if conn.sock is None:
+                conn.connect()
+            conn.sock.settimeout(read_timeout)
+            conn.request('GET', path, headers={'Accept': 'application/json'})
+            response = conn.getresponse()
+            body = response.read()
+        except socket.timeout:
+            conn.close()
+            raise ServiceError(service, 'timeout', path)
+        except (http.client.RemoteDisconnected, ConnectionResetError, BrokenPipeError) as e:
+            conn.close()
+            # The server dropped an idle keep-alive connection; retry once on a fresh one
+            if reused and attempt == 0:
+                continue
+            raise ServiceError(service, 'unavailable', str(e))
+        except (OSError, http.client.HTTPException) as e:
+            conn.close()
+            raise ServiceError(service, 'unavailable', str(e))
+
+        if response.will_close:
+            conn.close()
+        else:
+            with _http_pool_lock:
+                _http_pool.setdefault(pool_key, []).append(conn)
+
+        if not 200 <= response.status < 300:
+            raise ServiceError(service, 'http', f"{response.status} {path}")
+        try:
+            return json.loads(body)
+        except (json.JSONDecodeError, ValueError, UnicodeDecodeError):
+            raise ServiceError(service, 'invalid', path)
+    raise ServiceError(service, 'unavailable', path)
+
 def get_ccr_routed_model(session_id):
     """Query CCR for the actual routed model for this session"""
+    from urllib.parse import quote
     try:
-        # Get CCR port from config
-        ccr_port = get_ccr_port()
+        data = http_get_json('ccr', f"/api/statusline/usage?sessionId={quote(session_id)}")
+    except ServiceError:
+        # CCR not running or not answering
+        return None
 
-        # Check if CCR is running
-        result = subprocess.run(
-            ["curl", "-s", f"http://localhost:{ccr_port}/api/statusline/usage?sessionId={session_id}"],
-            capture_output=True,
-            text=True,
-            timeout=1
-        )
+    # Check if CCR has actual routing info for this session
+    current_model = data.get('currentModel') if isinstance(data, dict) else None
+    if isinstance(current_model, dict) and current_model.get('isActual'):
+        # CCR has routed this session, return the formatted model name
+        raw_model = (current_model.get('model') or '').strip()
+        return format_model_name(raw_model)
+    # If not isActual, CCR doesn't have routing info for this session
+    # Return None to fall back to Claude Code's model
+    return None
+
+def get_codeindex_status(cwd=None):
+    """Get codeindex status with progress tracking"""
+    import threading
 
-        if result.returncode == 0 and result.stdout:
-            data = json.loads(result.stdout)
+    # Get current directory info
+    cwd = cwd or get_current_working_directory()
+    if not cwd:
+        return None  # Return None instead of error string
+
+    project_name = cwd.split('/')[-1]
+
+    # Check collections and logs in parallel
+    logs = {}
 
-            # Check if CCR has actual routing info for this session
-            current_model = data.get('currentModel', {})
-            if current_model.get('isActual'):
-                # CCR has routed this session, return the formatted model name
-                raw_model = current_model.get('model', '').strip()
-                return format_model_name(raw_model)
-            # If not isActual, CCR doesn't have routing info for this session
-            # Return None to fall back to Claude Code's model
+    def fetch_logs():
+        logs['state'] = get_codeindex_log_state()  # None: continue without logs
 
+    logs_thread = threading.Thread(target=fetch_logs, daemon=True)
+    logs_thread.start()
+    try:
+        index = get_collection_index()
+    finally:
+        _, connect_timeout, read_timeout = service_endpoint('codeindex')
+        logs_thread.join(connect_timeout + read_timeout)
+    if index is None:
+        return None  # Qdrant unreachable: skip the segment
+    log_state = logs.get('state')
+
+    try:
+        result = parse_codeindex_with_progress(index, log_state, project_name, cwd)
+    except (KeyError, TypeError, AttributeError, ValueError):
+        # Unexpected log/collection shapes: fall back to the collections-only view
+        collections = [{'name': name} for name in index['collections'].values()]
+        result = parse_codeindex_collections({'result': {'collections': collections}}, cwd)
+
+    # Validate result before returning
+    if result and isinstance(result, str) and len(result) > 0:
+        return result
+    return None
+
+_collection_index_memo = None
+
+def load_collection_index():
+    """Shared Qdrant collection index from disk (memoized on file mtime)"""
+    global _collection_index_memo
+    try:
+        mtime = os.stat(COLLECTION_INDEX_FILE).st_mtime_ns
+    except OSError:
         return None
-    except:
-        # CCR not available or error occurred
+    if _collection_index_memo and _collection_index_memo[0] == mtime:
+        return _collection_index_memo[1]
+    try:
+        with open(COLLECTION_INDEX_FILE, 'r') as f:
+            index = json.load(f)
+    except (OSError, json.JSONDecodeError, ValueError):
+        return None
+    if not isinstance(index, dict) or not isinstance(index.get('collections'), dict):
         return None
+    _collection_index_memo = (mtime, index)
+    return index
 
-def get_codeindex_status():
-    """Get codeindex status with progress tracking"""
+def save_collection_index(index):
+    global _collection_index_memo
     try:
-        # Get current directory info
-        cwd = get_current_working_directory()
-        if not cwd:
-            return None  # Return None instead of error string
-        
-        project_name = cwd.split('/')[-1]
-        expected_collection = f"codeindex-{project_name}"
-        
-        # Check collections and logs in parallel
-        collections_result = subprocess.run(
-            ["curl", "-s", "http://localhost:6333/collections"],
-            capture_output=True,
-            text=True,
-            timeout=2
-        )
-        
-        logs_result = subprocess.run(
-            ["curl", "-s", "http://localhost:3847/logs"],
-            capture_output=True,
-            text=True,
-            timeout=2
-        )
-        
-        # Parse results
-        collections_data = None
-        logs_data = None
-        
-        if collections_result.returncode == 0 and collections_result.stdout:
-            try:
-                collections_data = json.loads(collections_result.stdout)
-            except (json.JSONDecodeError, ValueError):
-                return None  # Return None on parse error
-        
-        if logs_result.returncode == 0 and logs_result.stdout:
-            try:
-                logs_data = json.loads(logs_result.stdout)
-            except (json.JSONDecodeError, ValueError):
-                logs_data = None  # Continue without logs
-        
-        result = parse_codeindex_with_progress(collections_data, logs_data, project_name, expected_collection, cwd)
-        
-        # Validate result before returning
-        if result and isinstance(result, str) and len(result) > 0:
-            return result
-        return None
-        
-    except Exception:
-        # Fallback to legacy method
-        try:
-            result = subprocess.run(
-                ["curl", "-s", "http://localhost:6333/collections"],
-                capture_output=True,
-                text=True,
-                timeout=2
-            )
-            if result.returncode == 0 and result.stdout:
-                try:
-                    data = json.loads(result.stdout)
-                    parsed = parse_codeindex_collections(data)
-                    # Validate parsed result
-                    if parsed and isinstance(parsed, str) and len(parsed) > 0:
-                        return parsed
-                except (json.JSONDecodeError, ValueError):
-                    pass
-            return None
-        except Exception:
-            return None
+        write_json_atomic(COLLECTION_INDEX_FILE, index)
+        _collection_index_memo = (os.stat(COLLECTION_INDEX_FILE).st_mtime_ns, index)
+    except OSError:
+        pass
+
+def fetch_collection_index(previous=None):
+    """Fetch all collection names plus every codeindex collection's points_count in one batch"""
+    import threading
+    from urllib.parse import quote
+    data = http_get_json('qdrant', '/collections')
+    try:
+        names = [col.get('name', '') for col in data['result']['collections']]
+    except (KeyError, TypeError, AttributeError):
+        raise ServiceError('qdrant', 'invalid', '/collections')
 
-def normalize_collection_name(folder_name):
-    """Normalize folder name to match codeindex collection naming convention.
+    points = {}
 
-    Codeindex normalizes names to: lowercase, spaces replaced with hyphens.
-    Example: 'Submittal RFI Processing System' -> 'submittal-rfi-processing-system'
+    def fetch_points(batch):
+        for name in batch:
+            try:
+                info = http_get_json('qdrant', f"/collections/{quote(name)}")
+                points[name] = info['result']['points_count']
+            except (ServiceError, KeyError, TypeError, AttributeError):
+                pass
+
+    # A few pooled connections in parallel; the counts are shared by every terminal
+    codeindex_names = [name for name in names if name.startswith('codeindex-')]
+    workers = [threading.Thread(target=fetch_points, args=(codeindex_names[i::4],), daemon=True)
+               for i in range(min(4, len(codeindex_names)))]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+
+    # Normalized (lowercase) name -> real name, for case-insensitive lookups
+    collections = {name.lower(): name for name in names}
+    matches = {}
+    if previous and previous.get('collections') == collections:
+        matches = previous.get('matches', {})  # Same names: cwd matches still hold
+
+    # Append this refresh's counts to each collection's sample history
+    now = time.time()
+    previous_samples = (previous or {}).get('samples', {})
+    samples = {}
+    for name, count in points.items():
+        history = [sample for sample in previous_samples.get(name, [])
+                   if now - sample[0] < CODEINDEX_SAMPLE_MAX_AGE]
+        history.append([now, count])
+        samples[name] = history[-CODEINDEX_SAMPLE_LIMIT:]
+    return {'fetchedAt': now, 'collections': collections, 'points': points,
+            'samples': samples, 'matches': matches}
+
+def get_collection_index():
+    """Collection index no older than COLLECTION_INDEX_TTL, refreshed by one terminal at a time.
+
+    Returns None only when Qdrant is unreachable and nothing is cached.
     """
-    return folder_name.lower().replace(' ', '-')
+    def cached():
+        index = load_collection_index()
+        return index, bool(index) and time.time() - index.get('fetchedAt', 0) < COLLECTION_INDEX_TTL
 
-def parse_codeindex_with_progress(collections_data, logs_data, project_name, expected_collection, cwd):
-    """Parse codeindex status with progress tracking and parent directory support"""
-    if not collections_data or 'result' not in collections_data:
-        return None  # Return None when service is unreachable
+    def compute():
+        fresh = fetch_collection_index(load_collection_index())
+        save_collection_index(fresh)
+        return fresh
 
+    # The names request, then the points requests in parallel
+    _, connect_timeout, read_timeout = service_endpoint('qdrant')
     try:
-        collections = collections_data['result']['collections']
-        collection_names = [col.get('name', '') for col in collections]
-        # Also create lowercase versions for case-insensitive matching
-        collection_names_lower = [name.lower() for name in collection_names]
-    except (KeyError, TypeError):
-        return None  # Return None on data structure errors
+        return single_flight('qdrant-collections', cached, compute, 2 * (connect_timeout + read_timeout))
+    except ServiceError:
+        return None
 
-    # Walk up directory tree to find indexed parent projects
-    current_collection = None
-    matched_project_name = None
-    matched_collection_name = None
+def match_codeindex_collection(index, cwd):
+    """(matched directory name, real collection name) for cwd or its nearest indexed ancestor.
 
+    The directory walk runs once per cwd; the result is remembered in the index.
+    """
+    matches = index.setdefault('matches', {})
+    if cwd in matches:
+        return matches[cwd]
+
+    collections = index['collections']
+    match = None
     path_parts = cwd.rstrip('/').split('/')
     for i in range(len(path_parts), 0, -1):
         # Get directory name at this level
         dir_name = path_parts[i-1]
         # Normalize the expected collection name (lowercase, spaces -> hyphens)
-        normalized_name = normalize_collection_name(dir_name)
-        expected_coll = f"codeindex-{normalized_name}"
-
-        # Check if this directory level has a collection (case-insensitive)
-        if expected_coll in collection_names_lower:
-            # Find the actual collection object
-            for collection in collections:
-                if collection.get('name', '').lower() == expected_coll:
-                    current_collection = collection
-                    matched_project_name = dir_name
-                    matched_collection_name = collection.get('name', '')
-                    break
-            if current_collection:
-                break
+        expected_coll = f"codeindex-{normalize_collection_name(dir_name)}"
+        if expected_coll in collections:
+            match = [dir_name, collections[expected_coll]]
+            break
 
         # Stop at reasonable boundaries (home directory, etc.)
         if dir_name in ['Users', 'home', 'root'] or len(path_parts[:i]) < 3:
             break
 
-    # If we didn't find a match, fall back to original behavior with normalization
-    if not current_collection:
-        normalized_expected = f"codeindex-{normalize_collection_name(project_name)}"
-        for collection in collections:
-            if collection.get('name', '').lower() == normalized_expected:
-                current_collection = collection
-                matched_project_name = project_name
-                matched_collection_name = collection.get('name', '')
-                break
+    if len(matches) >= COLLECTION_MATCH_LIMIT:
+        matches.clear()
+    matches[cwd] = match
+    save_collection_index(index)
+    return match
+
+def normalize_collection_name(folder_name):
+    """Normalize folder name to match codeindex collection naming convention.
+
+    Codeindex normalizes names to: lowercase, spaces replaced with hyphens.
+    Example: 'Submittal RFI Processing System' -> 'submittal-rfi-processing-system'
+    """
+    return folder_name.lower().replace(' ', '-')
+
+def codeindex_log_prefix_crc(entries, end):
+    """CRC of every entry before `end`; unchanged as long as the log only grows"""
+    import zlib
+    return zlib.crc32('\n'.join(map(str, entries[:end])).encode('utf-8', 'replace'))
+
+def codeindex_entry_crcs(entries):
+    """Per-entry CRCs, compared to find a remembered run of entries again"""
+    import zlib
+    return [zlib.crc32(str(entry).encode('utf-8', 'replace')) for entry in entries]
+
+def find_codeindex_log_cursor(entries, cursor):
+    """Index of the first entry not parsed yet; 0 when the log must be read again from the start.
+
+    An unchanged prefix means the log only grew since the cursor. Otherwise the
+    server trimmed or restarted its buffer, and the cursor's remembered tail is
+    looked for; it is trusted only where it occurs exactly once, since a
+    repetitive log repeats its tail.
+    """
+    if not isinstance(cursor, dict):
+        return 0
+    count = cursor.get('count', 0)
+    if count <= len(entries) and codeindex_log_prefix_crc(entries, count) == cursor.get('prefix'):
+        return count
+    tail = cursor.get('tail') or []
+    if not tail:
+        return 0
+    crcs = codeindex_entry_crcs(entries)
+    ends = [i + len(tail) for i in range(len(crcs) - len(tail) + 1) if crcs[i:i + len(tail)] == tail]
+    return ends[0] if len(ends) == 1 else 0
+
+_codeindex_log_memo = None
+
+def load_codeindex_log_state():
+    """Persisted log cursor and per-collection facts (memoized on file mtime)"""
+    global _codeindex_log_memo
+    try:
+        mtime = os.stat(CODEINDEX_LOG_STATE).st_mtime_ns
+    except OSError:
+        return {'cursor': None, 'entries': 0, 'collections': {}}
+    if _codeindex_log_memo and _codeindex_log_memo[0] == mtime:
+        return _codeindex_log_memo[1]
+    try:
+        with open(CODEINDEX_LOG_STATE, 'r') as f:
+            state = json.load(f)
+    except (OSError, json.JSONDecodeError, ValueError):
+        state = None
+    if not isinstance(state, dict) or not isinstance(state.get('collections'), dict):
+        return {'cursor': None, 'entries': 0, 'collections': {}}
+    _codeindex_log_memo = (mtime, state)
+    return state
+
+def update_codeindex_log_state(entries):
+    """Parse only the log entries after the persisted cursor into per-collection facts.
+
+    Facts per collection (lowercased name): trackedFiles, completedFiles,
+    completedChunks, lastInsertEntry (running entry number of the latest
+    "📝 Inserting" line) and lastInsertAt. The cursor is the entry count, a CRC
+    of the entries before it and the last few entries' CRCs (see
+    find_codeindex_log_cursor); a log that cannot be resumed is parsed again
+    from the start, which the facts tolerate since later lines overwrite
+    earlier ones. fetchedAt records when the entries were fetched.
+    """
+    state = load_codeindex_log_state()
+    cursor = state.get('cursor')
+    start = find_codeindex_log_cursor(entries, cursor)
+    now = time.time()
+    if start == len(entries) and isinstance(cursor, dict) and cursor.get('count') == start:
+        return save_codeindex_log_state(dict(state, fetchedAt=now))
+
+    collections = state['collections']
+    entry_number = state.get('entries', 0)
+    for entry in entries[start:]:
+        entry_number += 1
+        if not isinstance(entry, str) or 'codeindex-' not in entry:
+            continue
+        for name in set(CODEINDEX_COLLECTION_RE.findall(entry)):
+            facts = collections.setdefault(name.lower(), {})
+            if "📝 Inserting" in entry:
+                facts['lastInsertEntry'] = entry_number
+                facts['lastInsertAt'] = now
+            if "tracking" in entry:
+                match = CODEINDEX_TRACKING_RE.search(entry)
+                if match:
+                    facts['trackedFiles'] = int(match.group(1))
+            if "✅ Initial index completed:" in entry:
+                match = CODEINDEX_COMPLETED_RE.search(entry)
+                if match:
+                    facts['trackedFiles'] = facts['completedFiles'] = int(match.group(1))
+                    facts['completedChunks'] = int(match.group(2))
+
+    return save_codeindex_log_state({
+        'cursor': {
+            'count': len(entries),
+            'prefix': codeindex_log_prefix_crc(entries, len(entries)),
+            'tail': codeindex_entry_crcs(entries[-CODEINDEX_LOG_TAIL:]),
+        },
+        'entries': entry_number,
+        'collections': collections,
+        'fetchedAt': now,
+    })
+
+def save_codeindex_log_state(state):
+    """Persist the log state for every terminal; returns it"""
+    global _codeindex_log_memo
+    try:
+        write_json_atomic(CODEINDEX_LOG_STATE, state)
+        _codeindex_log_memo = (os.stat(CODEINDEX_LOG_STATE).st_mtime_ns, state)
+    except OSError:
+        pass
+    return state
+
+def get_codeindex_log_state():
+    """Log facts no older than CODEINDEX_LOGS_TTL, with /logs fetched by one terminal at a time.
+
+    Returns None when codeindex is unreachable and no log has been parsed yet.
+    """
+    def cached():
+        state = load_codeindex_log_state()
+        if not state.get('cursor'):
+            return None, False
+        return state, time.time() - state.get('fetchedAt', 0) < CODEINDEX_LOGS_TTL
+
+    def compute():
+        logs_data = http_get_json('codeindex', '/logs')
+        if not isinstance(logs_data, dict) or not isinstance(logs_data.get('output'), list):
+            return None
+        return update_codeindex_log_state(logs_data['output'])
+
+    _, connect_timeout, read_timeout = service_endpoint('codeindex')
+    try:
+        return single_flight('codeindex-logs', cached, compute, connect_timeout + read_timeout)
+    except ServiceError:
+        return None
+
+def learned_chunks_per_file(log_state, collection):
+    """Chunks per file from completed indexes: this collection's own, else all of them"""
+    facts = log_state['collections'].get(collection.lower(), {}) if collection else {}
+    if facts.get('completedFiles') and facts.get('completedChunks'):
+        return facts['completedChunks'] / facts['completedFiles']
+    files = chunks = 0
+    for facts in log_state['collections'].values():
+        if facts.get('completedFiles') and facts.get('completedChunks'):
+            files += facts['completedFiles']
+            chunks += facts['completedChunks']
+    return chunks / files if files else DEFAULT_CHUNKS_PER_FILE
+
+def indexing_rate(samples, now=None):
+    """(chunks per second over the rate window, seconds since the count last grew)"""
+    now = now or time.time()
+    recent = [sample for sample in samples if now - sample[0] <= CODEINDEX_RATE_WINDOW]
+    rate = None
+    if len(recent) >= 2 and recent[-1][0] - recent[0][0] >= 5:
+        rate = max(0.0, (recent[-1][1] - recent[0][1]) / (recent[-1][0] - recent[0][0]))
+    idle_since = samples[-1][0] if samples else now
+    for earlier, later in zip(reversed(samples[:-1]), reversed(samples)):
+        if later[1] > earlier[1]:
+            break
+        idle_since = earlier[0]
+    return rate, now - idle_since
+
+def format_eta(seconds):
+    """Compact duration like 45s, 12m or 2h05m"""
+    if seconds < 60:
+        return f"{int(seconds)}s"
+    if seconds < 3600:
+        return f"{int(seconds // 60)}m"
+    return f"{int(seconds // 3600)}h{int(seconds % 3600 // 60):02d}m"
+
+def parse_codeindex_with_progress(index, log_state, project_name, cwd):
+    """Parse codeindex status with progress tracking and parent directory support"""
+    match = match_codeindex_collection(index, cwd)
+    matched_project_name, matched_collection_name = match or (None, None)
     
     # Parse logs for progress information
     is_indexing = False
     total_files = None
     current_chunks = 0
 
-    if logs_data and 'output' in logs_data:
-        # Check last 50 log entries for broader detection
-        recent_logs = logs_data['output'][-50:]
-        all_logs = logs_data['output']
-
+    if log_state:
         # Look for any recent insertion activity for this collection
         # Use the actual matched collection name for log searching
         search_collection = matched_collection_name or f"codeindex-{normalize_collection_name(project_name)}"
-        for log_entry in recent_logs:
-            if f"📝 Inserting" in log_entry and search_collection in log_entry:
-                is_indexing = True
-                break
+        facts = log_state['collections'].get(search_collection.lower(), {})
+        last_insert = facts.get('lastInsertEntry')
+        if last_insert and last_insert > log_state['entries'] - CODEINDEX_RECENT_ENTRIES:
+            is_indexing = True
 
-        # Look for tracking count and completion info in all logs for this collection
+        # Tracking count and completion info for this collection
         if matched_collection_name:
-            for entry in all_logs:
-                if matched_collection_name in entry:
-                    # Parse total files being tracked
-                    if "tracking" in entry:
-                        match = re.search(r'tracking (\d+) files', entry)
-                        if match:
-                            total_files = int(match.group(1))
-
-                    # Parse completion status
-                    if "✅ Initial index completed:" in entry:
-                        match = re.search(r'(\d+) files, (\d+) chunks', entry)
-                        if match:
-                            total_files = int(match.group(1))
-                            current_chunks = int(match.group(2))
-
-    # If collection exists, get current document count using actual collection name
-    if current_collection and matched_collection_name:
-        try:
-            collection_result = subprocess.run(
-                ["curl", "-s", f"http://localhost:6333/collections/{matched_collection_name}"],
-                capture_output=True,
-                text=True,
-                timeout=1
-            )
-            if collection_result.returncode == 0:
-                collection_info = json.loads(collection_result.stdout)
-                current_chunks = collection_info.get('result', {}).get('points_count', current_chunks)
-        except:
-            pass
+            total_files = facts.get('trackedFiles')
+            current_chunks = facts.get('completedChunks', 0)
+
+    # If collection exists, use the points count from the last batched refresh
+    if matched_collection_name:
+        current_chunks = index.get('points', {}).get(matched_collection_name, current_chunks)
     
     # Determine status
-    if current_collection:
+    if matched_collection_name:
         # Use the matched project name (could be a parent directory)
         display_name = matched_project_name or project_name
         if is_indexing and total_files and current_chunks:
-            # Calculate rough progress (chunks vs estimated total chunks)
-            # Estimate ~100 chunks per file on average
-            estimated_total_chunks = total_files * 100
-            progress_pct = min(100, int((current_chunks / estimated_total_chunks) * 100))
+            # Progress against chunks per file learned from earlier completed indexes
+            estimated_total_chunks = total_files * learned_chunks_per_file(log_state, matched_collection_name)
+            progress_pct = min(99, int((current_chunks / estimated_total_chunks) * 100))
+
+            # ETA from the measured ingestion rate; flag a count that stopped growing
+            rate, idle_seconds = indexing_rate(index.get('samples', {}).get(matched_collection_name, []))
+            if idle_seconds >= CODEINDEX_STALL_SECONDS:
+                return f"🔄 ({progress_pct}%, stalled) {display_name}"
+            if rate:
+                remaining = max(0, estimated_total_chunks - current_chunks) / rate
+                return f"🔄 ({progress_pct}%, ~{format_eta(remaining)} left) {display_name}"
             return f"🔄 ({progress_pct}%) {display_name}"
         else:
             return f"✅ {display_name}"
     else:
         # Check if there are any codeindex collections (service is working)
-        has_any_codeindex = any(
-            col.get('name', '').startswith('codeindex-')
-            for col in collections
-        )
+        has_any_codeindex = any(name.startswith('codeindex-') for name in index['collections'].values())
         
         if has_any_codeindex:
             # Use immediate directory name for "not indexed" status
@@ -433,13 +2427,13 @@ def parse_codeindex_with_progress(collections_data, logs_data, project_name, exp
         else:
             return "idle"
 
-def parse_codeindex_collections(data):
+def parse_codeindex_collections(data, cwd=None):
     """Parse Qdrant collections response to show current project status"""
     if not data or 'result' not in data or 'collections' not in data['result']:
         return None  # Return None when data is invalid
     
     # Get current working directory to check if current project is indexed
-    cwd = get_current_working_directory()
+    cwd = cwd or get_current_working_directory()
     if not cwd:
         return None  # Return None when can't determine directory
     
@@ -485,10 +2479,9 @@ def parse_codeindex_data(data):
     
     return f"{indicator}{project_name}"
 
-def format_codeindex_status():
+def format_codeindex_status(status):
     """Format codeindex status for status line (optional)"""
     try:
-        status = get_codeindex_status()
         # Validate status is a proper string before formatting
         if status is None or not isinstance(status, str) or len(status) == 0:
             return None  # Service unavailable, skip section
@@ -499,11 +2492,273 @@ def format_codeindex_status():
     except Exception:
         return None  # Return None on any error
 
+# Providers that gather_providers() can fan out, by name
+PROVIDERS = {
+    'usage': get_usage_data,
+    'session_usage': read_session_usage,
+    'git_branch': get_git_branch,
+    'ccr_model': get_ccr_routed_model,
+    'codeindex': get_codeindex_status,
+    'spend': get_spend_summary,
+}
+_inflight = {}
+# Refreshed through their one host-wide key (see refresh_usage_summary), not per window
+SHARED_REFRESH_PROVIDERS = ('usage', 'spend')
+
+def provider_key(name, args):
+    """Stable string key for a provider call"""
+    return json.dumps([name] + list(args))
+
+def compact_provider_value(name, value):
+    """Shrink a provider result to what rendering needs before persisting it"""
+    if name == 'usage' and value:
+        blocks_data, session_data, daily_data = value
+        blocks_data = dict(blocks_data, blocks=(blocks_data.get('blocks') or [])[-3:])
+        daily_data = dict(daily_data, daily=(daily_data.get('daily') or [])[-2:])
+        return [blocks_data, session_data, daily_data]
+    return value
+
+def load_last_known(name, args):
+    """Last value a provider produced for these arguments, from the shared disk store"""
+    try:
+        with open(os.path.join(CACHE_DIR, 'last-known', f"{name}.json"), 'r') as f:
+            value = json.load(f).get(provider_key(name, args))
+    except (OSError, AttributeError, json.JSONDecodeError, ValueError):
+        return None
+    if name == 'usage' and isinstance(value, list):
+        return tuple(value)
+    return value
+
+def store_last_known(name, args, value):
+    """Remember a provider result so later renders can use it when the provider is slow"""
+    path = os.path.join(CACHE_DIR, 'last-known', f"{name}.json")
+    try:
+        with open(path, 'r') as f:
+            entries = json.load(f)
+        if not isinstance(entries, dict):
+            entries = {}
+    except (OSError, json.JSONDecodeError, ValueError):
+        entries = {}
+
+    key = provider_key(name, args)
+    value = compact_provider_value(name, value)
+    if key in entries and entries[key] == json.loads(json.dumps(value)):
+        return
+    entries.pop(key, None)
+    entries[key] = value
+    # Keep the most recent few argument sets (cwds, sessions) per provider
+    while len(entries) > LAST_KNOWN_LIMIT:
+        entries.pop(next(iter(entries)))
+    try:
+        write_json_atomic(path, entries)
+    except (OSError, TypeError, ValueError):
+        pass
+
+def run_provider(name, args, future):
+    """Worker thread body: run one provider and publish its result"""
+    with trace_span(f"provider {name}", cat='provider') as span:
+        try:
+            value = memoized_provider(name, PROVIDERS[name], *args)
+        except Exception as e:
+            span.error(e)
+            value = None
+    if value is not None:
+        store_last_known(name, args, value)
+    future.set_result(value)
+
+def gather_providers(calls, budget_ms=None):
+    """Run provider calls concurrently and return {name: value} within the render budget.
+
+    Providers that miss the deadline fall back to their last known value. In the
+    daemon they keep running and update it; in a one-shot run a detached
+    `--refresh-providers` process finishes them for the next render, except
+    usage and spend, which start the shared `--refresh-usage` instead.
+    """
+    import threading
+    from concurrent.futures import Future, wait
+
+    budget_ms = RENDER_BUDGET_MS if budget_ms is None else budget_ms
+    futures = {}
+    for name, args in calls:
+        key = provider_key(name, args)
+        future = _inflight.get(key)
+        if future is None or future.done():
+            future = Future()
+            _inflight[key] = future
+            # Daemon threads: a hung provider must never hold the process open
+            threading.Thread(target=run_provider, args=(name, args, future), daemon=True).start()
+        futures[name] = (args, future)
+
+    with trace_span('gather_providers', budget_ms=budget_ms) as span:
+        wait([future for _, future in futures.values()], timeout=budget_ms / 1000)
+
+        results = {}
+        missed = []
+        for name, (args, future) in futures.items():
+            if future.done():
+                results[name] = future.result()
+            else:
+                results[name] = load_last_known(name, args)
+                missed.append([name, list(args)])
+        span.annotate(missed=[name for name, _ in missed])
+
+    if missed and not _daemon_mode:
+        if any(name in SHARED_REFRESH_PROVIDERS for name, _ in missed):
+            spawn_usage_refresh()
+        missed = [call for call in missed if call[0] not in SHARED_REFRESH_PROVIDERS]
+    if missed and not _daemon_mode:
+        raw_calls = json.dumps(missed)
+        marker = refresh_marker('providers', raw_calls)
+        if claim_refresh(marker) and not spawn_background(['--refresh-providers', raw_calls]):
+            release_refresh(marker)
+    return results
+
+def refresh_providers(raw_calls):
+    """Background refresher entry point (`--refresh-providers JSON`)"""
+    try:
+        for name, args in json.loads(raw_calls):
+            if name not in PROVIDERS:
+                continue
+            try:
+                value = PROVIDERS[name](*args)
+            except Exception:
+                value = None
+            if value is not None:
+                store_last_known(name, args, value)
+    except (TypeError, ValueError):
+        pass
+    finally:
+        release_refresh(refresh_marker('providers', raw_calls))
+
+def summarize_usage(provided):
+    """Block, today and burn rate figures for the line from the usage and spend providers"""
+    blocks_data, session_data, daily_data = provided.get('usage') or ({}, {}, {})
+
+    # The rollup store covers every project and is authoritative for spend windows
+    spend = provided.get('spend')
+    burn = spend.get('burn') if spend else None
+    # One block limit (configured, or learned by the burn engine) for both paths
+    block_limit = burn['blockLimit'] if burn else BurnRateTracker().block_limit()
+
+    # Find current active block (last block if it's active)
+    current_block = None
+    block_cost = 0.0
+    block_usage_pct = 0.0
+    time_remaining_mins = 0
+    burn_rate = 0
+    hourly_rate = 0.0
+    block_tokens = 0
+
+    if 'blocks' in blocks_data and blocks_data['blocks']:
+        # Get the last block which should be the active one
+        last_block = blocks_data['blocks'][-1]
+        if last_block.get('isActive'):
+            current_block = last_block
+            block_cost = current_block.get('costUSD', 0.0)
+            block_tokens = current_block.get('totalTokens', 0)
+            
+            # Get burn rate
+            if 'burnRate' in current_block:
+                burn_rate_info = current_block['burnRate']
+                if isinstance(burn_rate_info, dict):
+                    burn_rate = int(burn_rate_info.get('tokensPerMinute', 0))
+                    hourly_rate = burn_rate_info.get('costPerHour', 0.0)
+            
+            # Get remaining time
+            if 'projection' in current_block:
+                projection_info = current_block['projection']
+                if isinstance(projection_info, dict):
+                    time_remaining_mins = projection_info.get('remainingMinutes', 0)
+            
+            block_usage_pct = (block_tokens / block_limit * 100) if block_limit > 0 else 0
+
+    # Get today's total cost
+    today_cost = 0.0
+    if 'daily' in daily_data:
+        today = datetime.now().strftime('%Y-%m-%d')
+        for day in daily_data['daily']:
+            if day.get('date', '') == today:
+                today_cost = day.get('totalCost', 0.0)
+                break
+
+    if spend:
+        today_cost = spend['today']
+    
+    # Prefer the rolling burn rate engine for 🔥, % used and time to the limit
+    time_to_limit_mins = time_remaining_mins
+    block_active = current_block is not None
+    if burn:
+        burn_rate = int(burn['tokensPerMinute'])
+        hourly_rate = burn['costPerHour']
+        if burn['blockActive']:
+            block_usage_pct = burn['blockUsedPercent']
+            time_to_limit_mins = burn['minutesToLimit']
+            block_active = True
+
+    # Format time remaining
+    if time_remaining_mins > 60:
+        hours = int(time_remaining_mins / 60)
+        mins = int(time_remaining_mins % 60)
+        time_remaining = f"{hours}h {mins}m"
+    else:
+        time_remaining = f"{int(time_remaining_mins)}m"
+    
+    # Format burn rate as tokens/min
+    if burn_rate > 1_000_000:
+        burn_str = f"{burn_rate/1_000_000:.1f}M/min"
+    elif burn_rate > 1000:
+        burn_str = f"{burn_rate/1000:.0f}K/min"
+    else:
+        burn_str = f"{burn_rate}/min"
+    
+    # Estimate time left based on remaining tokens and burn rate; with no
+    # active block there is nothing to run out of, so the field is left out
+    time_left = None
+    if block_active and time_to_limit_mins > 60:
+        hours = int(time_to_limit_mins / 60)
+        mins = int(time_to_limit_mins % 60)
+        time_left = f"~{hours}h{mins}m left"
+    elif block_active and time_to_limit_mins > 0:
+        time_left = f"~{time_to_limit_mins}m left"
+    elif block_active and block_usage_pct >= 100:
+        time_left = "limit reached"
+    
+    # Fallback to ccusage block models when neither CCR nor stdin names one
+    model_names = []
+    if current_block and current_block.get('models'):
+        for model_id in reversed(current_block['models']):
+            if model_id != '<synthetic>':
+                parsed_model = format_model_name(model_id)
+                # Add to list if we parsed it and haven't seen it before
+                if parsed_model and parsed_model not in model_names:
+                    model_names.append(parsed_model)
+
+    return {
+        'blockCost': block_cost,
+        'blockTokens': block_tokens,
+        'blockUsedPercent': block_usage_pct,
+        'blockModels': ", ".join(model_names) or None,
+        'todayCost': today_cost,
+        'timeRemaining': time_remaining,
+        'burnRate': burn_str,
+        'timeLeft': time_left,
+        'spendWindows': f"📅 ${spend['week']:.2f} 7d / ${spend['month']:.2f} month" if spend else None,
+    }
+
 def calculate_status(claude_data=None):
     """Calculate the status line values"""
     if claude_data is None:
         claude_data = {}
-    blocks_data, session_data, daily_data = get_ccusage_data()
+
+    # Fan out every external provider at once; none of them may hold up the line
+    cwd = get_current_working_directory()
+    session_id = claude_data.get('session_id')
+    provider_calls = [('usage', ()), ('spend', ()), ('git_branch', (cwd,)), ('codeindex', (cwd,))]
+    if session_id:
+        provider_calls.append(('ccr_model', (session_id,)))
+        provider_calls.append(('session_usage', (session_id, claude_data.get('transcript_path'))))
+    provided = gather_providers(provider_calls)
+    blocks_data, session_data, daily_data = provided.get('usage') or ({}, {}, {})
 
     # PRIORITY 1: Check for real context data from Claude Code's JSON input
     # The context_window object contains the actual context tracking data (v2.0.65+)
@@ -561,14 +2816,23 @@ def calculate_status(claude_data=None):
         exceeds_context_limit = True
 
     # PRIORITY 2: Check for real token metrics from OTLP proxy (fallback)
+    snapshot_available = False
     if real_tokens is None:
+        with trace_span('read_metrics_snapshot'):
+            snapshot_available, real_tokens = read_metrics_snapshot(session_id)
+    if real_tokens is None and not snapshot_available:
         metrics_file = os.path.expanduser('~/.claude/token-metrics.json')
         if os.path.exists(metrics_file):
             try:
                 with open(metrics_file, 'r') as f:
                     metrics_data = json.load(f)
+                    # The proxy keeps totals per session; never show another session's tokens
+                    if session_id and 'sessions' in metrics_data:
+                        session_metrics = metrics_data['sessions'].get(session_id) or {}
+                        metrics_data = {'timestamp': session_metrics.get('lastUpdate'),
+                                        'totalUsed': session_metrics.get('totalUsed', 0)}
                     # Only use metrics if they're recent (within last 60 seconds)
-                    if 'timestamp' in metrics_data:
+                    if metrics_data.get('timestamp'):
                         metrics_time = datetime.fromisoformat(metrics_data['timestamp'])
                         age_seconds = (datetime.now() - metrics_time).total_seconds()
                         if age_seconds < 60:
@@ -576,106 +2840,34 @@ def calculate_status(claude_data=None):
             except:
                 pass
     
-    # Get current working directory
-    cwd = get_current_working_directory()
-    
-    # Find current active block (last block if it's active)
-    current_block = None
-    block_cost = 0.0
-    block_usage_pct = 0.0
-    time_remaining_mins = 0
-    burn_rate = 0
-    hourly_rate = 0.0
-    block_tokens = 0
-    
-    if 'blocks' in blocks_data and blocks_data['blocks']:
-        # Get the last block which should be the active one
-        last_block = blocks_data['blocks'][-1]
-        if last_block.get('isActive'):
-            current_block = last_block
-            block_cost = current_block.get('costUSD', 0.0)
-            block_tokens = current_block.get('totalTokens', 0)
-            
-            # Get burn rate
-            if 'burnRate' in current_block:
-                burn_rate_info = current_block['burnRate']
-                if isinstance(burn_rate_info, dict):
-                    burn_rate = int(burn_rate_info.get('tokensPerMinute', 0))
-                    hourly_rate = burn_rate_info.get('costPerHour', 0.0)
-            
-            # Get remaining time
-            if 'projection' in current_block:
-                projection_info = current_block['projection']
-                if isinstance(projection_info, dict):
-                    time_remaining_mins = projection_info.get('remainingMinutes', 0)
-            
-            # Calculate usage percentage (based on 97.6M token limit for 5 hour block)
-            block_limit = 97_675_753  # Standard 5-hour block limit
-            block_usage_pct = (block_tokens / block_limit * 100) if block_limit > 0 else 0
-    
-    # Find current session based on working directory
+    # Find current session: tail this session's own transcript when Claude Code
+    # tells us which one it is, otherwise fall back to matching on working directory
     session_cost = 0.0
     session_tokens = 0
     session_found = False
-    
-    if 'sessions' in session_data and cwd:
-        # Convert cwd to session ID format (replace / with -)
-        session_id_from_cwd = cwd.replace('/', '-')
-        
-        for session in session_data['sessions']:
-            session_id = session.get('sessionId', '')
-            # Try exact match first
-            if session_id == session_id_from_cwd:
-                session_cost = session.get('totalCost', 0.0)
-                session_tokens = session.get('totalTokens', 0)
-                session_found = True
-                break
-            # Try partial match if cwd is in session_id
-            elif cwd and cwd.split('/')[-1] in session_id:
-                session_cost = session.get('totalCost', 0.0)
-                session_tokens = session.get('totalTokens', 0)
-                session_found = True
-                # Don't break, keep looking for exact match
+
+    session_usage = provided.get('session_usage')
+    if session_usage is not None:
+        session_cost = session_usage.get('totalCost', 0.0)
+        session_tokens = session_usage.get('totalTokens', 0)
+        session_found = True
+    elif 'sessions' in session_data and cwd:
+        # O(1) lookup in the persisted session index; build it in memory on first use
+        index = load_session_index() or update_session_index(session_data['sessions'], persist=False)
+        session = find_indexed_session(index, cwd)
+        if session is not None:
+            session_cost = session.get('totalCost', 0.0)
+            session_tokens = session.get('totalTokens', 0)
+            session_found = True
 
     # Use real session cost from Claude Code if available (more accurate than ccusage)
     if claude_session_cost is not None:
         session_cost = claude_session_cost
         session_found = True
 
-    # Get today's total cost
-    today_cost = 0.0
-    today_tokens = 0
-    if 'daily' in daily_data:
-        today = datetime.now().strftime('%Y-%m-%d')
-        for day in daily_data['daily']:
-            if day.get('date', '') == today:
-                today_cost = day.get('totalCost', 0.0)
-                today_tokens = day.get('totalTokens', 0)
-                break
-    
-    # Format time remaining
-    if time_remaining_mins > 60:
-        hours = int(time_remaining_mins / 60)
-        mins = int(time_remaining_mins % 60)
-        time_remaining = f"{hours}h {mins}m"
-    else:
-        time_remaining = f"{int(time_remaining_mins)}m"
-    
-    # Format burn rate as tokens/min
-    if burn_rate > 1_000_000:
-        burn_str = f"{burn_rate/1_000_000:.1f}M/min"
-    elif burn_rate > 1000:
-        burn_str = f"{burn_rate/1000:.0f}K/min"
-    else:
-        burn_str = f"{burn_rate}/min"
-    
-    # Estimate time left based on remaining tokens and burn rate
-    time_left = f"~{time_remaining_mins}m" if time_remaining_mins > 0 else "~30m"
-    if time_remaining_mins > 60:
-        hours = int(time_remaining_mins / 60)
-        mins = int(time_remaining_mins % 60)
-        time_left = f"~{hours}h{mins}m"
-    
+    with trace_span('summarize_usage'):
+        usage = summarize_usage(provided)
+
     # Detect model with CCR-aware priority:
     # 1. Check if CCR has routing info for this session (highest priority)
     # 2. Use Claude Code's model from stdin (vanilla claude sessions)
@@ -684,9 +2876,8 @@ def calculate_status(claude_data=None):
     model = "Claude"  # Default fallback
 
     # PRIORITY 1: Check if CCR has routing info for this session
-    session_id = claude_data.get('session_id')
     if session_id:
-        ccr_model = get_ccr_routed_model(session_id)
+        ccr_model = provided.get('ccr_model')
         if ccr_model:
             # CCR has routed this session, use the actual routed model
             model = ccr_model
@@ -711,28 +2902,13 @@ def calculate_status(claude_data=None):
                 model = parsed
 
     # PRIORITY 3: Fallback to ccusage block models if no model from CCR or stdin
-    if model == "Claude" and current_block and 'models' in current_block and current_block['models']:
-        # Get all non-synthetic models and parse them
-        model_names = []
-        seen_models = set()
-        
-        for model_id in reversed(current_block['models']):
-            if model_id != '<synthetic>':
-                parsed_model = format_model_name(model_id)
-
-                # Add to list if we parsed it and haven't seen it before
-                if parsed_model and parsed_model not in seen_models:
-                    model_names.append(parsed_model)
-                    seen_models.add(parsed_model)
-        
-        # Join models with commas if multiple, otherwise use single model
-        if model_names:
-            model = ", ".join(model_names)
+    if model == "Claude" and usage['blockModels']:
+        model = usage['blockModels']
     
     # Format costs
     session_str = f"${session_cost:.2f}" if session_found else "N/A"
-    today_str = f"${today_cost:.2f}"
-    block_str = f"${block_cost:.2f}"
+    today_str = f"${usage['todayCost']:.2f}"
+    block_str = f"${usage['blockCost']:.2f}"
     
     # Color constants for context display (defined early for use below)
     _RESET = "\033[0m"
@@ -767,7 +2943,7 @@ def calculate_status(claude_data=None):
         tokens_str = f"📊 {format_number(real_tokens)} tokens"
     else:
         # Fallback to ccusage estimates
-        display_tokens = block_tokens
+        display_tokens = usage['blockTokens']
         tokens_str = f"{format_number(display_tokens)} tokens"
 
 
@@ -800,49 +2976,235 @@ def calculate_status(claude_data=None):
     ]
 
     # Add git branch if available
-    git_branch = get_git_branch()
+    git_branch = provided.get('git_branch')
     if git_branch:
         status_parts.append(f"🌿 {git_branch}")
 
     # Add codeindex status if available (optional dependency)
-    codeindex_status = format_codeindex_status()
+    codeindex_status = format_codeindex_status(provided.get('codeindex'))
     if codeindex_status:
         status_parts.append(codeindex_status)
     
     
     # Continue with existing parts
+    status_parts.append(
+        f"💰 {session_str} session / {today_str} today / {block_str} block ({usage['timeRemaining']} left)"
+    )
+    if usage['spendWindows']:
+        status_parts.append(usage['spendWindows'])
     status_parts.extend([
-        f"💰 {session_str} session / {today_str} today / {block_str} block ({time_remaining} left)",
-        f"🔥 {burn_str}",
+        f"🔥 {usage['burnRate']}",
         tokens_str,  # Already fully formatted with context window info
-        f"{block_usage_pct:.1f}% used",
-        f"{time_left} left"
+        f"{usage['blockUsedPercent']:.1f}% used",
     ])
+    if usage['timeLeft']:
+        status_parts.append(usage['timeLeft'])
     
     return " | ".join(status_parts)
 
-def main():
-    """Main entry point"""
+def enrichment_key(cwd, session_id):
+    """Key of one enrichment entry; claude-statusline-fast.py builds the same string"""
+    return json.dumps([cwd or '', session_id or ''])
+
+def build_enrichment(cwd, session_id=None):
+    """Expensive segments for the fast path, gathered without the render budget"""
+    provider_calls = [('usage', ()), ('spend', ()), ('git_branch', (cwd,)), ('codeindex', (cwd,))]
+    if session_id:
+        provider_calls.append(('ccr_model', (session_id,)))
+    provided = gather_providers(provider_calls, budget_ms=CCUSAGE_REFRESH_TIMEOUT * 1000)
+
+    entry = summarize_usage(provided)
+    entry.update({
+        'fetchedAt': time.time(),
+        'ccrModel': provided.get('ccr_model'),
+        'gitBranch': provided.get('git_branch'),
+        'codeindex': format_codeindex_status(provided.get('codeindex')),
+    })
+    return entry
+
+def refresh_enrichment(raw_request):
+    """Background refresher entry point (`--refresh-enrichment JSON`)"""
+    try:
+        request = json.loads(raw_request)
+        cwd = request.get('cwd')
+        session_id = request.get('sessionId')
+    except (AttributeError, TypeError, ValueError):
+        return
+    key = enrichment_key(cwd, session_id)
     try:
-        # Read JSON input from stdin (from Claude)
-        input_data = sys.stdin.read()
-        if input_data:
+        entry = build_enrichment(cwd, session_id)
+
+        # Refreshers for other cwds and sessions write the same file
+        import fcntl
+        with open(ENRICHMENT_FILE + '.lock', 'w') as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
             try:
-                claude_data = json.loads(input_data)
-            except json.JSONDecodeError:
-                claude_data = {}
-        else:
-            claude_data = {}
-        
-        # Calculate status
-        status = calculate_status(claude_data)
-        
-        # Output the status line
-        print(status)
-        
-    except Exception as e:
-        # Fallback status on error
-        print(f"🤖 Opus 4.1 | 💰 Status unavailable | Error: {str(e)}")
+                with open(ENRICHMENT_FILE, 'r') as f:
+                    entries = json.load(f)
+                if not isinstance(entries, dict):
+                    entries = {}
+            except (OSError, json.JSONDecodeError, ValueError):
+                entries = {}
+            entries.pop(key, None)
+            entries[key] = entry
+            while len(entries) > LAST_KNOWN_LIMIT:
+                entries.pop(next(iter(entries)))
+            write_json_atomic(ENRICHMENT_FILE, entries)
+    except (OSError, AttributeError, TypeError, ValueError):
+        pass
+    finally:
+        release_refresh(refresh_marker('enrichment', key))
+
+def handle_daemon_request(raw_request):
+    """Render one status line for a request forwarded by the thin client"""
+    global _request_cwd
+    try:
+        request = json.loads(raw_request) if raw_request else {}
+    except (json.JSONDecodeError, ValueError):
+        request = {}
+
+    try:
+        claude_data = json.loads(request.get('payload') or '{}')
+    except (json.JSONDecodeError, ValueError):
+        claude_data = {}
+    if not isinstance(claude_data, dict):
+        claude_data = {}
+
+    _request_cwd = request.get('cwd')
+    try:
+        with trace_span('calculate_status') as span:
+            try:
+                return calculate_status(claude_data)
+            except Exception as e:
+                span.error(e)
+                return f"🤖 Opus 4.1 | 💰 Status unavailable | Error: {str(e)}"
+    finally:
+        _request_cwd = None
+        flush_trace()
+        flush_latency()
+
+def run_daemon(socket_path=DAEMON_SOCKET, idle_timeout=DAEMON_IDLE_TIMEOUT):
+    """Serve status lines over a Unix socket until idle for idle_timeout seconds"""
+    global _daemon_mode
+    import fcntl
+    import signal
+    import socket
+
+    os.makedirs(os.path.dirname(socket_path), exist_ok=True)
+
+    # Only one daemon per socket: losers of a concurrent auto-spawn just exit
+    lock_file = open(socket_path + '.lock', 'w')
+    try:
+        fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        return
+
+    # Holding the lock means any existing socket file is stale
+    try:
+        os.unlink(socket_path)
+    except FileNotFoundError:
+        pass
+
+    server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    server.bind(socket_path)
+    os.chmod(socket_path, 0o600)
+    server.listen(16)
+    server.settimeout(idle_timeout)
+    _daemon_mode = True
+
+    # Clean up the socket on `kill` as well as on idle exit
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+
+    # Exit after the script is upgraded so the next render spawns the new code
+    script_mtime = os.stat(__file__).st_mtime
+
+    try:
+        while True:
+            try:
+                conn, _ = server.accept()
+            except socket.timeout:
+                break  # Idle long enough, let the next client respawn us
+
+            with conn:
+                conn.settimeout(2)
+                chunks = []
+                try:
+                    while True:
+                        chunk = conn.recv(65536)
+                        if not chunk:
+                            break
+                        chunks.append(chunk)
+                    status = handle_daemon_request(b''.join(chunks).decode('utf-8', 'replace'))
+                    conn.sendall(status.encode('utf-8'))
+                except OSError:
+                    pass
+
+            try:
+                if os.stat(__file__).st_mtime != script_mtime:
+                    break
+            except OSError:
+                break
+    finally:
+        server.close()
+        try:
+            os.unlink(socket_path)
+        except OSError:
+            pass
+        lock_file.close()
+
+def main():
+    """Main entry point"""
+    if '--daemon' in sys.argv[1:]:
+        run_daemon()
+        return
+    if len(sys.argv) > 1 and sys.argv[1] == '--refresh-usage':
+        refresh_usage()
+        return
+    if len(sys.argv) > 1 and sys.argv[1] == '--refresh-ccusage':
+        refresh_ccusage_views(sys.argv[2:])
+        return
+    if len(sys.argv) > 2 and sys.argv[1] == '--refresh-providers':
+        refresh_providers(sys.argv[2])
+        return
+    if len(sys.argv) > 2 and sys.argv[1] == '--refresh-enrichment':
+        refresh_enrichment(sys.argv[2])
+        return
+    if len(sys.argv) > 2 and sys.argv[1] == '--probe-service':
+        probe_service(sys.argv[2])
+        return
+
+    with trace_span('render') as span:
+        try:
+            # Read JSON input from stdin (from Claude)
+            input_data = sys.stdin.read()
+            with trace_span('parse stdin', bytes=len(input_data)) as parse_span:
+                if input_data:
+                    try:
+                        claude_data = json.loads(input_data)
+                    except json.JSONDecodeError as e:
+                        parse_span.error(e)
+                        claude_data = {}
+                else:
+                    claude_data = {}
+
+            # Calculate status
+            with trace_span('calculate_status'):
+                status = calculate_status(claude_data)
+
+            # Output the status line
+            print(status)
+
+        except Exception as e:
+            # Fallback status on error
+            span.error(e)
+            print(f"🤖 Opus 4.1 | 💰 Status unavailable | Error: {str(e)}")
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    if PROFILE_FILE and not os.path.exists(os.path.expanduser(PROFILE_FILE)):
+        # Profile just this invocation; delete the file to profile another one
+        import cProfile
+        cProfile.run('main()', os.path.expanduser(PROFILE_FILE))
+    else:
+        main()
+    flush_trace()
+    flush_latency(at_exit=True)
\ No newline at end of file
@@ -17,18 +17,14 @@ echo "   Claude Code Enhanced Statusline - Binary Installer"
 echo "━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━"
 echo ""
 
-# Check if ccusage is installed
+# Check if ccusage is installed (optional - usage is aggregated natively from transcripts)
 if ! command -v ccusage &> /dev/null; then
-    echo -e "${RED}❌ Error: ccusage is not installed${NC}"
-    echo ""
-    echo "Please install ccusage first:"
-    echo "  npm install -g ccusage"
-    echo ""
-    exit 1
+    echo -e "${YELLOW}⚠${NC} ccusage is not installed (optional fallback for usage data)"
+    echo "  To install it: npm install -g ccusage"
+else
+    echo -e "${GREEN}✓${NC} ccusage is installed"
 fi
 
-echo -e "${GREEN}✓${NC} ccusage is installed"
-
 # Check if python3 is available
 if ! command -v python3 &> /dev/null; then
     echo -e "${RED}❌ Error: python3 is not installed${NC}"
@@ -92,6 +88,8 @@ fi
 
 cp "$SCRIPT_DIR/$SOURCE_SCRIPT" "$STATUSLINE_SCRIPT"
 chmod +x "$STATUSLINE_SCRIPT"
+# Shared model name table imported by the statusline
+cp "$SCRIPT_DIR/statusline_models.py" "$LOCAL_BIN/statusline_models.py"
 echo -e "${GREEN}✓${NC} Statusline script installed to $STATUSLINE_SCRIPT"
 
 # Check if ~/.local/bin is in PATH
@@ -0,0 +1,243 @@
+#!/usr/bin/env python3
+"""
+Local stand-ins for everything the statusline scripts talk to, used by
+bench-statusline.py and test-fault-injection.py: a throwaway HOME with Claude Code transcripts, a stub
+`ccusage` binary serving canned JSON, and fake CCR, Qdrant and codeindex HTTP
+servers on localhost.
+
+Qdrant and codeindex are served on their real ports (6333 and 3847), since the
+scripts do not make those configurable; CCR gets a free port written to the
+fake HOME's ~/.claude-code-router/config.json.
+
+Author: Claude Code Community
+License: MIT
+"""
+
+import json
+import os
+import re
+import sys
+import threading
+from datetime import datetime, timedelta, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+QDRANT_PORT = 6333
+CODEINDEX_PORT = 3847
+FAKE_MODEL = 'claude-sonnet-4-5-20250929'
+
+def iso(moment):
+    """UTC timestamp in the format Claude Code and ccusage write"""
+    return moment.astimezone(timezone.utc).strftime('%Y-%m-%dT%H:%M:%S.000Z')
+
+def encode_project_path(path):
+    """Encode a directory the way Claude Code names its ~/.claude/projects/ folders"""
+    return re.sub(r'[^a-zA-Z0-9]', '-', path.rstrip('/') or '/')
+
+def make_fake_home(home, project_dir, sessions=8, turns=150, now=None):
+    """Write transcripts for `sessions` sessions in project_dir; returns (id, path) pairs.
+
+    Turns are spread over the last four hours, so the newest block is active.
+    """
+    now = now or datetime.now(timezone.utc)
+    folder = os.path.join(home, '.claude', 'projects', encode_project_path(project_dir))
+    os.makedirs(folder, exist_ok=True)
+    os.makedirs(project_dir, exist_ok=True)
+
+    written = []
+    for s in range(sessions):
+        session_id = f"00000000-0000-4000-8000-{s:012d}"
+        path = os.path.join(folder, f"{session_id}.jsonl")
+        written.append((session_id, path))
+        with open(path, 'w') as f:
+            for t in range(turns):
+                moment = now - timedelta(minutes=240 * (turns - t) / turns, seconds=s)
+                f.write(json.dumps({'type': 'user', 'sessionId': session_id, 'cwd': project_dir,
+                                    'timestamp': iso(moment),
+                                    'message': {'role': 'user', 'content': 'x' * 200}}) + '\n')
+                f.write(json.dumps({
+                    'type': 'assistant',
+                    'sessionId': session_id,
+                    'cwd': project_dir,
+                    'requestId': f"req_{s}_{t}",
+                    'timestamp': iso(moment),
+                    'costUSD': 0.0125,
+                    'message': {
+                        'id': f"msg_{s}_{t}",
+                        'model': FAKE_MODEL,
+                        'usage': {'input_tokens': 1200, 'output_tokens': 300,
+                                  'cache_creation_input_tokens': 500,
+                                  'cache_read_input_tokens': 20000},
+                    },
+                }) + '\n')
+    return written
+
+def canned_ccusage(project_dir, now=None):
+    """ccusage blocks/session/daily documents for the fake HOME"""
+    now = now or datetime.now(timezone.utc)
+    start = now.replace(minute=0, second=0, microsecond=0) - timedelta(hours=2)
+    block = {
+        'id': iso(start), 'startTime': iso(start), 'endTime': iso(start + timedelta(hours=5)),
+        'isActive': True, 'isGap': False, 'entries': 600, 'costUSD': 7.5,
+        'totalTokens': 13_200_000, 'models': [FAKE_MODEL],
+        'burnRate': {'tokensPerMinute': 91_000, 'costPerHour': 3.1},
+        'projection': {'totalTokens': 27_000_000, 'totalCost': 15.6, 'remainingMinutes': 170},
+    }
+    session = {'sessionId': encode_project_path(project_dir), 'totalCost': 15.0,
+               'totalTokens': 26_400_000, 'lastActivity': now.strftime('%Y-%m-%d')}
+    day = {'date': now.astimezone().strftime('%Y-%m-%d'), 'totalCost': 15.0, 'totalTokens': 26_400_000}
+    return {
+        'blocks': {'blocks': [block]},
+        'session': {'sessions': [session], 'totals': {'totalCost': 15.0}},
+        'daily': {'daily': [day], 'totals': {'totalCost': 15.0, 'totalTokens': 26_400_000}},
+    }
+
+def install_fake_ccusage(bin_dir, project_dir):
+    """Write a `ccusage` stub into bin_dir that prints canned JSON for each view.
+
+    FAKE_CCUSAGE_MODE in the environment makes it misbehave: 'hang', 'slow'
+    (FAKE_CCUSAGE_DELAY seconds, default 3), 'garbage' or 'refuse' (exit 1).
+    """
+    os.makedirs(bin_dir, exist_ok=True)
+    for view, data in canned_ccusage(project_dir).items():
+        with open(os.path.join(bin_dir, f"ccusage-{view}.json"), 'w') as f:
+            json.dump(data, f)
+    stub = os.path.join(bin_dir, 'ccusage')
+    with open(stub, 'w') as f:
+        f.write(f"#!{sys.executable} -S\n"
+                "import os, sys, time\n"
+                "mode = os.environ.get('FAKE_CCUSAGE_MODE', 'ok')\n"
+                "if mode == 'hang':\n"
+                "    time.sleep(3600)\n"
+                "elif mode == 'slow':\n"
+                "    time.sleep(float(os.environ.get('FAKE_CCUSAGE_DELAY', '3')))\n"
+                "elif mode == 'garbage':\n"
+                "    sys.stdout.write('\\x00{\"blocks\": [ not json')\n"
+                "    sys.exit(0)\n"
+                "elif mode == 'refuse':\n"
+                "    sys.exit(1)\n"
+                "path = os.path.join(os.path.dirname(os.path.abspath(__file__)), f'ccusage-{sys.argv[1]}.json')\n"
+                "try:\n"
+                "    sys.stdout.write(open(path).read())\n"
+                "except (IndexError, OSError):\n"
+                "    sys.exit(1)\n")
+    os.chmod(stub, 0o755)
+    return stub
+
+def write_ccr_config(home, port):
+    """Point the fake HOME's CCR config at the fake CCR server"""
+    config_dir = os.path.join(home, '.claude-code-router')
+    os.makedirs(config_dir, exist_ok=True)
+    with open(os.path.join(config_dir, 'config.json'), 'w') as f:
+        json.dump({'PORT': port}, f)
+
+FAULT_MODES = ['ok', 'hang', 'slow', 'garbage', 'refuse']
+
+class FakeHandler(BaseHTTPRequestHandler):
+    """Answers CCR, Qdrant and codeindex requests, chosen by the server's role"""
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        services = self.server.services
+        role = self.server.role
+        mode, delay = services.modes.get(role, ('ok', 0))
+        if mode == 'hang':
+            # Accept and read the request, then never answer
+            services.released.wait()
+            self.close_connection = True
+            return
+        if mode == 'slow':
+            services.released.wait(delay)
+
+        path = self.path.split('?', 1)[0]
+        if mode == 'garbage':
+            payload = b'\x00{"result": [ not json'
+        elif role == 'ccr' and path == '/api/statusline/usage':
+            payload = json.dumps({'currentModel': {'model': FAKE_MODEL, 'isActual': True}}).encode('utf-8')
+        elif role == 'qdrant' and path == '/collections':
+            collections = [{'name': n} for n in services.collections]
+            payload = json.dumps({'result': {'collections': collections}}).encode('utf-8')
+        elif role == 'qdrant' and path.startswith('/collections/'):
+            payload = json.dumps({'result': {'points_count': services.points}}).encode('utf-8')
+        elif role == 'codeindex' and path == '/logs':
+            payload = json.dumps({'output': services.logs}).encode('utf-8')
+        else:
+            self.send_error(404)
+            return
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+class FakeServer(ThreadingHTTPServer):
+    """Threaded server that ignores clients exiting with keep-alive connections open"""
+    daemon_threads = True
+
+    def handle_error(self, request, client_address):
+        if not isinstance(sys.exc_info()[1], ConnectionError):
+            super().handle_error(request, client_address)
+
+class FakeServices:
+    """Fake CCR, Qdrant and codeindex servers running on daemon threads.
+
+    set_mode(role, mode) switches one of them between FAULT_MODES while running:
+    'hang' accepts and never answers, 'slow' answers after `delay` seconds,
+    'garbage' answers 200 with a body that is not JSON, and 'refuse' closes the
+    listening socket so connections are refused.
+    """
+
+    def __init__(self, project_dir, collections=40, points=12_000):
+        project = os.path.basename(project_dir.rstrip('/')).lower()
+        self.collections = [f"codeindex-{project}"] + [f"codeindex-other-{i}" for i in range(collections - 1)]
+        self.points = points
+        self.logs = [f"Watching codeindex-{project}: tracking 120 files"] + [
+            f"📝 Inserting 50 chunks into codeindex-other-{i % 8}" for i in range(200)]
+        self.ports = {'ccr': 0, 'qdrant': QDRANT_PORT, 'codeindex': CODEINDEX_PORT}
+        self.modes = {}
+        self.servers = {}
+        self.released = threading.Event()
+
+    @property
+    def ccr_port(self):
+        return self.ports['ccr']
+
+    def serve(self, role):
+        server = FakeServer(('localhost', self.ports[role]), FakeHandler)
+        server.role = role
+        server.services = self
+        self.ports[role] = server.server_address[1]  # keep a free CCR port across restarts
+        self.servers[role] = server
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    def start(self):
+        """Bind every server; raises OSError if a fixed port is already taken"""
+        for role in self.ports:
+            self.serve(role)
+        return self
+
+    def set_mode(self, role, mode, delay=3.0):
+        """Make one service misbehave (or behave again with mode 'ok')"""
+        self.modes[role] = (mode, delay)
+        if mode == 'refuse' and role in self.servers:
+            server = self.servers.pop(role)
+            server.shutdown()
+            server.server_close()
+        elif mode != 'refuse' and role not in self.servers:
+            self.serve(role)
+
+    def reset(self):
+        """Release hung requests and put every service back to 'ok'"""
+        self.released.set()
+        self.released = threading.Event()
+        for role in self.ports:
+            self.set_mode(role, 'ok')
+
+    def stop(self):
+        self.released.set()
+        for server in self.servers.values():
+            server.shutdown()
+            server.server_close()
+        self.servers = {}
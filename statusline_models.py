@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+"""
+Model name resolution shared by the Claude Code statusline scripts.
+
+Raw model IDs ("claude-opus-4-1-20250805", "gemini-2.5-pro", ...) are mapped to
+display names through one rule table. More rules can be added without touching
+code in ~/.claude/statusline-models.json (or $CLAUDE_STATUSLINE_MODELS):
+
+    [{"match": ["opus-5", "opus 5"], "name": "Opus 5"}]
+
+Author: Claude Code Community
+License: MIT
+"""
+
+import json
+import os
+from functools import lru_cache
+
+MODEL_NAMES_FILE = os.environ.get(
+    'CLAUDE_STATUSLINE_MODELS',
+    os.path.expanduser('~/.claude/statusline-models.json')
+)
+
+# (substrings, display name), matched case-insensitively against the model ID.
+# First match wins, so order matters: more specific patterns first.
+MODEL_NAME_RULES = [
+    # Anthropic models
+    (('opus-4-7', 'opus 4.7'), "Opus 4.7"),
+    (('opus-4-6', 'opus 4.6'), "Opus 4.6"),
+    (('opus-4-5', 'opus 4.5'), "Opus 4.5"),
+    (('opus-4-1', 'opus 4.1'), "Opus 4.1"),
+    (('opus-4', 'opus 4'), "Opus 4"),
+    (('sonnet-4-7', 'sonnet 4.7'), "Sonnet 4.7"),
+    (('sonnet-4-6', 'sonnet 4.6'), "Sonnet 4.6"),
+    (('sonnet-4-5', 'sonnet 4.5'), "Sonnet 4.5"),
+    (('sonnet-4', 'sonnet 4'), "Sonnet 4"),
+    (('sonnet-3-5', 'sonnet 3.5', 'sonnet-20241022'), "Sonnet 3.5"),
+    (('sonnet',), "Sonnet"),
+    (('haiku-4-5', 'haiku 4.5'), "Haiku 4.5"),
+    (('haiku',), "Haiku"),
+
+    # Google models
+    (('gemini-3.1-pro',), "Gemini 3.1 Pro"),
+    (('gemini-3-pro', 'gemini-3.0-pro'), "Gemini 3 Pro"),
+    (('gemini-3-flash', 'gemini-3.0-flash'), "Gemini 3 Flash"),
+    (('gemini-2.5-pro',), "Gemini 2.5 Pro"),
+    (('gemini-2.5-flash-lite',), "Gemini 2.5 Flash Lite"),
+    (('gemini-2.5-flash',), "Gemini 2.5 Flash"),
+    (('gemini-2',), "Gemini 2"),
+    (('gemini',), "Gemini"),
+
+    # xAI models
+    (('grok-4-2', 'grok-4.2'), "Grok 4.2 Beta"),
+    (('grok-4-1-fast', 'grok-4.1-fast'), "Grok 4.1 Fast"),
+    (('grok-4-1', 'grok-4.1'), "Grok 4.1"),
+    (('grok-4-fast',), "Grok 4 Fast"),
+    (('grok-4',), "Grok 4"),
+    (('grok',), "Grok"),
+
+    # OpenAI models
+    (('o3',), "O3"),
+    (('gpt-5-4-pro', 'gpt-5.4-pro'), "GPT-5.4 Pro"),
+    (('gpt-5-4', 'gpt-5.4'), "GPT-5.4"),
+    (('gpt-5-3', 'gpt-5.3'), "GPT-5.3"),
+    (('gpt-5',), "GPT-5"),
+    (('gpt-4',), "GPT-4"),
+]
+
+_compiled_rules = None
+
+def load_extra_rules(path=MODEL_NAMES_FILE):
+    """User rules from the JSON data file; missing or malformed files add nothing"""
+    try:
+        with open(path, 'r') as f:
+            rows = json.load(f)
+    except (OSError, json.JSONDecodeError, ValueError):
+        return []
+    rules = []
+    for row in rows if isinstance(rows, list) else []:
+        if not isinstance(row, dict) or not isinstance(row.get('name'), str):
+            continue
+        match = row.get('match')
+        if isinstance(match, str):
+            match = [match]
+        if isinstance(match, list):
+            rules.append((tuple(m for m in match if isinstance(m, str) and m), row['name']))
+    return rules
+
+def compile_rules(rules):
+    """Flatten rules into (substring, name) pairs, keeping the rules' order.
+
+    Matching is first-match-wins in that order, as in the if/elif chains this
+    table replaced; user rules are passed first so they take precedence.
+    """
+    return tuple((pattern.lower(), name) for patterns, name in rules for pattern in patterns)
+
+@lru_cache(maxsize=256)
+def format_model_name(model_id):
+    """Format raw model ID into a friendly display name"""
+    global _compiled_rules
+    if not model_id:
+        return None
+    if _compiled_rules is None:
+        _compiled_rules = compile_rules(load_extra_rules() + MODEL_NAME_RULES)
+
+    model_id_lower = model_id.lower()
+    for pattern, name in _compiled_rules:
+        if pattern in model_id_lower:
+            return name
+
+    # Generic fallback
+    if 'claude-' in model_id_lower:
+        return model_id.replace('claude-', '').replace('-', ' ').title()
+    return model_id.replace('-', ' ').title()
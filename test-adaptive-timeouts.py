@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+"""
+Test script to verify timeouts learned from observed latency and hedged service requests
+"""
+
+import importlib.util
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Point the statusline at a throwaway home before it resolves ~/.claude paths
+home = tempfile.mkdtemp()
+os.environ['HOME'] = home
+os.environ['CLAUDE_STATUSLINE_TIMEOUT_BOUNDS'] = '{"ccusage": [2, 20]}'
+
+script = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'claude-statusline.py')
+spec = importlib.util.spec_from_file_location('claude_statusline', script)
+statusline = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(statusline)
+
+results = []
+
+def check(name, actual, expected):
+    passed = actual == expected
+    results.append(passed)
+    status = "✅ PASS" if passed else "❌ FAIL"
+    print(f"{status} | {name:45s} → {actual!r} (expected: {expected!r})")
+
+def learn(key, samples):
+    for ms in samples:
+        statusline.record_latency(key, ms)
+    statusline.flush_latency()
+
+print("Testing Adaptive Timeouts")
+print("=" * 60)
+
+bounds = statusline.TIMEOUT_BOUNDS['qdrant']
+check("default until enough samples", statusline.adaptive_timeout('qdrant', 2.0, bounds), 2.0)
+check("default clamped to the bounds", statusline.adaptive_timeout('qdrant', 60.0, bounds), bounds[1])
+learn('qdrant', [40] * 7 + [100])
+check("p99 latency plus headroom", statusline.adaptive_timeout('qdrant', 2.0, bounds), 0.2)
+learn('qdrant', [1] * 64)
+check("old samples roll out, clamped to minimum", statusline.adaptive_timeout('qdrant', 2.0, bounds), 0.05)
+with open(statusline.LATENCY_FILE) as f:
+    check("samples kept per key", len(json.load(f)['qdrant']), statusline.LATENCY_SAMPLES)
+learn('ccusage-blocks', [30_000] * 8)
+check("bounds from the environment", statusline.adaptive_timeout(
+    'ccusage-blocks', 5, statusline.TIMEOUT_BOUNDS['ccusage']), 20.0)
+
+# A CCR stand-in whose first request stalls; only a hedged request can answer in time
+class StallFirstHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    requests = 0
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        StallFirstHandler.requests += 1
+        if StallFirstHandler.requests == 1:
+            time.sleep(1)
+        payload = json.dumps({'currentModel': {'model': 'claude-sonnet-4-5', 'isActual': True}}).encode()
+        self.send_response(200)
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+server = ThreadingHTTPServer(('localhost', 0), StallFirstHandler)
+server.daemon_threads = True
+threading.Thread(target=server.serve_forever, daemon=True).start()
+os.makedirs(os.path.join(home, '.claude-code-router'))
+with open(os.path.join(home, '.claude-code-router', 'config.json'), 'w') as f:
+    json.dump({'PORT': server.server_address[1]}, f)
+
+learn('ccr', [100] * 16)  # 200 ms timeout, hedge after 100 ms
+start = time.perf_counter()
+data = statusline.http_get_json('ccr', '/api/statusline/usage')
+elapsed = (time.perf_counter() - start) * 1000
+check("stalled request answered by its hedge", data['currentModel']['isActual'], True)
+check(f"hedged answer before the timeout ({elapsed:.0f} ms)", elapsed < 200, True)
+check("second connection was used", StallFirstHandler.requests, 2)
+
+# A render abandons a CCR request at its budget; the exit still records how long it ran
+StallFirstHandler.requests = 0
+render_home = tempfile.mkdtemp()
+os.makedirs(os.path.join(render_home, '.claude-code-router'))
+with open(os.path.join(render_home, '.claude-code-router', 'config.json'), 'w') as f:
+    json.dump({'PORT': server.server_address[1]}, f)
+subprocess.run([sys.executable, script], input=json.dumps({'session_id': 's1'}), capture_output=True, text=True,
+               env=dict(os.environ, HOME=render_home, CLAUDE_STATUSLINE_BUDGET_MS='150'))
+with open(os.path.join(render_home, '.claude', 'statusline-cache', 'latency.json')) as f:
+    abandoned = json.load(f).get('ccr', [])
+check("abandoned request recorded as censored sample", len(abandoned) == 1 and abandoned[0] >= 100, True)
+server.shutdown()
+
+print("=" * 60)
+all_passed = all(results)
+if all_passed:
+    print("✅ All tests passed!")
+else:
+    print("❌ Some tests failed!")
+
+exit(0 if all_passed else 1)
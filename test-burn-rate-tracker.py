@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+"""
+Test script to verify the rolling-window burn rate and block projection engine
+"""
+
+import importlib.util
+import os
+import subprocess
+import sys
+import tempfile
+from datetime import datetime, timedelta, timezone
+
+# Point the statusline at a throwaway home before it resolves ~/.claude paths
+home = tempfile.mkdtemp()
+os.environ['HOME'] = home
+os.environ['CLAUDE_STATUSLINE_BURN_WINDOW'] = '10'
+os.environ['CLAUDE_STATUSLINE_BLOCK_LIMIT'] = 'max'
+os.environ['CLAUDE_STATUSLINE_MODEL_WEIGHTS'] = '{"haiku": 0.5}'
+
+script = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'claude-statusline.py')
+spec = importlib.util.spec_from_file_location('claude_statusline', script)
+statusline = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(statusline)
+
+def record(tokens, model='claude-sonnet-4-5', cost=0.0):
+    return {'inputTokens': tokens, 'outputTokens': 0, 'cacheCreationTokens': 0,
+            'cacheReadTokens': 0, 'model': model, 'cost': cost}
+
+results = []
+
+def check(name, actual, expected):
+    passed = actual == expected
+    results.append(passed)
+    status = "✅ PASS" if passed else "❌ FAIL"
+    print(f"{status} | {name:45s} → {actual!r} (expected: {expected!r})")
+
+print("Testing Burn Rate Tracker")
+print("=" * 60)
+
+tracker = statusline.BurnRateTracker()
+
+# A finished block in the past teaches the limit
+day_one = datetime(2025, 10, 1, 8, 0, tzinfo=timezone.utc)
+tracker.add(day_one, record(400_000))
+tracker.add(day_one + timedelta(hours=1), record(600_000))
+
+# Current block: 1000 tokens/min for ten minutes, half of it on a half-weight model
+start = datetime(2025, 10, 2, 9, 0, tzinfo=timezone.utc)
+for minute in range(10):
+    tracker.add(start + timedelta(minutes=minute), record(500, cost=0.01))
+    tracker.add(start + timedelta(minutes=minute, seconds=30), record(500, model='claude-haiku-4-5'))
+
+# Late record from the closed block only lands in the ring if it is recent enough
+tracker.add(day_one + timedelta(hours=2), record(10**9))
+
+now = start + timedelta(minutes=9, seconds=59)
+snapshot = statusline.BurnRateTracker(tracker.to_dict()).snapshot(now)
+
+check("learned block limit", snapshot['blockLimit'], 1_000_000)
+check("sliding window tokens/min", snapshot['windowTokensPerMinute'], 1000.0)
+check("window cost per hour", round(snapshot['costPerHour'], 2), 0.6)
+check("EWMA below window during ramp-up", 0 < snapshot['tokensPerMinute'] < 1000, True)
+check("block active", snapshot['blockActive'], True)
+check("block tokens unweighted", snapshot['blockTokens'], 10_000)
+check("block % uses model weights", round(snapshot['blockUsedPercent'], 2), 0.75)
+check("time to limit capped at block end", snapshot['minutesToLimit'], snapshot['blockRemainingMinutes'])
+
+idle = statusline.BurnRateTracker(tracker.to_dict()).snapshot(now + timedelta(hours=6))
+check("idle tracker has no active block", idle['blockActive'], False)
+check("idle tracker rates decay to zero", idle['windowTokensPerMinute'], 0.0)
+
+# Time left only shows while a block is running
+def time_left(burn):
+    return statusline.summarize_usage({'spend': {'today': 0.0, 'week': 0.0, 'month': 0.0, 'burn': burn}})['timeLeft']
+
+check("active block shows time left", time_left(snapshot).startswith('~'), True)
+check("no active block hides time left", time_left(idle), None)
+at_limit = dict(snapshot, minutesToLimit=0, blockUsedPercent=120.0)
+check("burning past the limit says so", time_left(at_limit), "limit reached")
+check("no minutes left under the limit hides it", time_left(dict(at_limit, blockUsedPercent=99.0)), None)
+
+# Without the burn engine's block, % used and time left come from the usage
+# block, measured against the same configured or learned limit
+usage = ({'blocks': [{'isActive': True, 'totalTokens': 1_000_000, 'costUSD': 1.0,
+                      'projection': {'remainingMinutes': 90}}]}, {}, {})
+statusline.BLOCK_LIMIT_SETTING = '2000000'
+fallback = statusline.summarize_usage({'usage': usage})
+check("fallback % uses the configured limit", fallback['blockUsedPercent'], 50.0)
+check("fallback time left from the block", fallback['timeLeft'], "~1h30m left")
+statusline.BLOCK_LIMIT_SETTING = 'auto'
+learned = dict(idle, blockLimit=4_000_000)
+fallback = statusline.summarize_usage({'usage': usage, 'spend': {'today': 0.0, 'week': 0.0, 'month': 0.0,
+                                                                 'burn': learned}})
+check("fallback % uses the learned limit", fallback['blockUsedPercent'], 25.0)
+
+# A weight that is not a number voids the whole setting instead of failing later
+weights = subprocess.run(
+    [sys.executable, '-c',
+     "import importlib.util\n"
+     f"spec = importlib.util.spec_from_file_location('claude_statusline', {script!r})\n"
+     "statusline = importlib.util.module_from_spec(spec)\n"
+     "spec.loader.exec_module(statusline)\n"
+     "print(statusline.get_model_weight('claude-haiku-4-5'), statusline.get_model_weight('claude-opus-4-1'))\n"],
+    env=dict(os.environ, CLAUDE_STATUSLINE_MODEL_WEIGHTS='{"haiku": "x", "opus": 2}'),
+    capture_output=True, text=True)
+check("non-numeric weights ignored", weights.stdout.split(), ['1.0', '1.0'])
+
+print("=" * 60)
+all_passed = all(results)
+if all_passed:
+    print("✅ All tests passed!")
+else:
+    print("❌ Some tests failed!")
+
+exit(0 if all_passed else 1)
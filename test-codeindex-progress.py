@@ -0,0 +1,151 @@
+#!/usr/bin/env python3
+"""
+Test script to verify the codeindex segment's shared state: the /logs cursor
+across growth, trimming and restarts (repetitive logs included), the cached
+Qdrant collection index with its cwd matches, and the measured indexing rate
+and ETA
+"""
+
+import importlib.util
+import os
+import tempfile
+import time
+
+# Point the statusline at a throwaway home before it resolves ~/.claude paths
+home = tempfile.mkdtemp()
+os.environ['HOME'] = home
+
+script = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'claude-statusline.py')
+spec = importlib.util.spec_from_file_location('claude_statusline', script)
+statusline = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(statusline)
+
+results = []
+
+def check(name, actual, expected):
+    passed = actual == expected
+    results.append(passed)
+    status = "✅ PASS" if passed else "❌ FAIL"
+    print(f"{status} | {name:45s} → {actual!r} (expected: {expected!r})")
+
+def insert(collection='codeindex-other', chunks=50):
+    return f"📝 Inserting {chunks} chunks into {collection}"
+
+def tracking(files, collection='codeindex-proj'):
+    return f"Watching {collection}: tracking {files} files"
+
+def parse(entries):
+    return statusline.update_codeindex_log_state(list(entries))
+
+print("Testing Codeindex Progress")
+print("=" * 60)
+
+# Log cursor: growth is parsed incrementally, even when it repeats itself
+log = [tracking(120)] + [insert()] * 10
+state = parse(log)
+check("first fetch parses every entry", (state['entries'], state['collections']['codeindex-proj']['trackedFiles']),
+      (11, 120))
+log += [insert()] * 5
+check("repetitive growth parses only new entries", parse(log)['entries'], 16)
+check("unchanged log parses nothing", parse(log)['entries'], 16)
+
+# A trimmed buffer whose tail repeats itself: the remembered tail is ambiguous,
+# so the log is read again rather than resumed at the wrong entry
+log = [insert()] * 8 + [tracking(130)] + [insert()] * 3
+state = parse(log)
+check("ambiguous trim re-reads the log", state['collections']['codeindex-proj']['trackedFiles'], 130)
+check("re-read entries counted after the old ones", state['entries'], 16 + len(log))
+
+# Rotation with distinct entries: the tail is found again and only new entries parsed
+log = [insert(chunks=i) for i in range(40)]
+before = parse(log)['entries']
+log = log[10:] + [insert(chunks=i) for i in range(40, 43)] + [tracking(140)]
+state = parse(log)
+check("trimmed log resumes after the old tail", state['entries'] - before, 4)
+check("new entries after the trim parsed", state['collections']['codeindex-proj']['trackedFiles'], 140)
+
+# A restarted server with a short new log is read from the start
+before = state['entries']
+state = parse([tracking(7, 'codeindex-fresh'), "✅ Initial index completed: 7 files, 350 chunks in codeindex-fresh"])
+check("restarted log read from the start", state['entries'] - before, 2)
+check("completion facts parsed", state['collections']['codeindex-fresh'],
+      {'trackedFiles': 7, 'completedFiles': 7, 'completedChunks': 350})
+
+# The state is shared through the cache directory
+statusline._codeindex_log_memo = None
+check("log state persisted", statusline.load_codeindex_log_state()['entries'], state['entries'])
+
+# Collection index: one batched fetch shared until the TTL, names matched case-insensitively
+requests = []
+names = ['codeindex-My-Proj', 'codeindex-other', 'unrelated']
+def fake_http_get_json(service, path):
+    requests.append(path)
+    if path == '/collections':
+        return {'result': {'collections': [{'name': name} for name in names]}}
+    return {'result': {'points_count': 100 * len(requests)}}
+statusline.http_get_json = fake_http_get_json
+
+index = statusline.get_collection_index()
+check("names and codeindex counts in one batch", sorted(requests),
+      ['/collections', '/collections/codeindex-My-Proj', '/collections/codeindex-other'])
+check("normalized names map to real ones", index['collections']['codeindex-my-proj'], 'codeindex-My-Proj')
+check("points only for codeindex collections", sorted(index['points']), ['codeindex-My-Proj', 'codeindex-other'])
+requests.clear()
+statusline.get_collection_index()
+check("fresh index fetches nothing", requests, [])
+
+cwd = '/home/dev/work/My Proj/src/lib'
+check("nearest indexed ancestor matched", statusline.match_codeindex_collection(index, cwd),
+      ['My Proj', 'codeindex-My-Proj'])
+check("unindexed directory matches nothing", statusline.match_codeindex_collection(index, '/home/dev/work/none'),
+      None)
+statusline._collection_index_memo = None
+check("matches remembered for other terminals", statusline.load_collection_index()['matches'][cwd],
+      ['My Proj', 'codeindex-My-Proj'])
+
+index = statusline.fetch_collection_index(statusline.load_collection_index())
+check("same names keep the matches", cwd in index['matches'], True)
+check("each refresh adds a sample", len(index['samples']['codeindex-other']), 2)
+names.append('codeindex-src')
+index = statusline.fetch_collection_index(index)
+check("changed names drop the matches", index['matches'], {})
+
+# Indexing rate, stall detection and ETA
+now = time.time()
+check("rate over the window", statusline.indexing_rate([[now - 20, 0], [now - 10, 100], [now, 300]], now),
+      (15.0, 0.0))
+check("flat count reports how long it stalled",
+      statusline.indexing_rate([[now - 90, 100], [now - 30, 100], [now, 100]], now), (0.0, 90.0))
+check("too few samples give no rate", statusline.indexing_rate([[now, 100]], now), (None, 0.0))
+check("ETA formats", [statusline.format_eta(s) for s in (45, 720, 7500)], ['45s', '12m', '2h05m'])
+
+log_state = {'entries': 100, 'collections': {
+    'codeindex-proj': {'trackedFiles': 20, 'lastInsertEntry': 99},
+    'codeindex-done': {'completedFiles': 10, 'completedChunks': 500},
+    'codeindex-big': {'completedFiles': 10, 'completedChunks': 1500},
+}}
+check("chunks per file learned from completed indexes",
+      statusline.learned_chunks_per_file(log_state, 'codeindex-proj'), 100.0)
+check("own completion preferred", statusline.learned_chunks_per_file(log_state, 'codeindex-done'), 50.0)
+check("default without completed indexes",
+      statusline.learned_chunks_per_file({'collections': {}}, 'codeindex-proj'), statusline.DEFAULT_CHUNKS_PER_FILE)
+
+def segment(samples, log_state=log_state):
+    index = {'collections': {'codeindex-proj': 'codeindex-proj'}, 'points': {'codeindex-proj': 500},
+             'samples': {'codeindex-proj': samples}, 'matches': {}}
+    statusline.save_collection_index = lambda index: None
+    return statusline.parse_codeindex_with_progress(index, log_state, 'proj', '/home/dev/proj')
+
+check("progress with an ETA", segment([[now - 20, 300], [now, 500]]), "🔄 (25%, ~2m left) proj")
+check("stalled indexing flagged", segment([[now - 90, 500], [now, 500]]), "🔄 (25%, stalled) proj")
+idle = dict(log_state, entries=200)
+check("no recent inserts means indexed", segment([[now - 20, 300], [now, 500]], idle), "✅ proj")
+
+print("=" * 60)
+all_passed = all(results)
+if all_passed:
+    print("✅ All tests passed!")
+else:
+    print("❌ Some tests failed!")
+
+exit(0 if all_passed else 1)
@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+"""
+Test script to verify the stdin-only fast path and its startup-to-print budget
+"""
+
+import importlib.util
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import zlib
+
+here = os.path.dirname(os.path.abspath(__file__))
+script = os.path.join(here, 'claude-statusline-fast.py')
+home = tempfile.mkdtemp()
+cwd = tempfile.mkdtemp()
+env = dict(os.environ, HOME=home, PWD=cwd, CLAUDE_STATUSLINE_FAST_TTL='3600',
+           CLAUDE_STATUSLINE_SCRIPT=os.path.join(home, 'missing-statusline.py'))
+
+payload = json.dumps({
+    'session_id': 's1',
+    'model': {'id': 'claude-sonnet-4-5-20250929'},
+    'cost': {'total_cost_usd': 1.5},
+    'context_window': {'context_window_size': 200000, 'used_percentage': 25,
+                       'current_usage': {'input_tokens': 50000}},
+})
+
+def render():
+    result = subprocess.run([sys.executable, script], input=payload, env=env, cwd=cwd,
+                            capture_output=True, text=True)
+    return result.stdout.strip()
+
+results = []
+
+def check(name, actual, expected):
+    passed = actual == expected
+    results.append(passed)
+    status = "✅ PASS" if passed else "❌ FAIL"
+    print(f"{status} | {name:40s} → {actual!r} (expected: {expected!r})")
+
+print("Testing Fast Path")
+print("=" * 60)
+
+cold = render()
+check("cold render uses the payload only", cold,
+      "🤖 Sonnet 4.5 | 💰 $1.50 session | 📊 \033[32m50.0K/200.0K (25%)\033[0m")
+
+cache_dir = os.path.join(home, '.claude', 'statusline-cache')
+key = json.dumps([cwd, 's1'])
+marker = os.path.join(cache_dir, f"enrichment-{zlib.crc32(key.encode('utf-8')):08x}.refreshing")
+check("cold render claims this entry's refresh", os.path.exists(marker), True)
+os.makedirs(cache_dir, exist_ok=True)
+with open(os.path.join(cache_dir, 'enrichment.json'), 'w') as f:
+    json.dump({key: {
+        'fetchedAt': time.time(), 'ccrModel': None, 'gitBranch': 'main', 'codeindex': None,
+        'todayCost': 4.0, 'blockCost': 2.0, 'timeRemaining': '1h 5m', 'spendWindows': None,
+        'burnRate': '12K/min', 'blockTokens': 0, 'blockUsedPercent': 3.2, 'timeLeft': '~1h5m left',
+    }}, f)
+os.unlink(marker)
+
+check("cached segments are appended", render(),
+      "🤖 Sonnet 4.5 | 🌿 main | 💰 $1.50 session / $4.00 today / $2.00 block (1h 5m left)"
+      " | 🔥 12K/min | 📊 \033[32m50.0K/200.0K (25%)\033[0m | 3.2% used | ~1h5m left")
+check("fresh entry claims no refresh", os.path.exists(marker), False)
+
+# Startup-to-print budget, measured against a bare interpreter start
+def median_ms(args, runs=15):
+    samples = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        subprocess.run(args, input=payload, env=env, cwd=cwd, capture_output=True, text=True)
+        samples.append((time.perf_counter() - start) * 1000)
+    return statistics.median(samples)
+
+spec = importlib.util.spec_from_file_location('claude_statusline_fast', script)
+fast = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(fast)
+budget_ms = fast.FAST_PATH_BUDGET_MS
+overhead = median_ms([sys.executable, script]) - median_ms([sys.executable, '-c', 'pass'])
+print(f"   fast path overhead: {overhead:.1f} ms (budget {budget_ms} ms)")
+check("startup-to-print within budget", overhead < budget_ms, True)
+
+print("=" * 60)
+all_passed = all(results)
+if all_passed:
+    print("✅ All tests passed!")
+else:
+    print("❌ Some tests failed!")
+
+exit(0 if all_passed else 1)
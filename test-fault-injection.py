@@ -0,0 +1,157 @@
+#!/usr/bin/env python3
+"""
+Test script to verify the statusline never freezes when a dependency misbehaves.
+
+Each scenario makes one stand-in (ccusage, CCR, Qdrant or codeindex) hang,
+answer slowly, answer garbage or refuse connections, renders
+claude-statusline.py a few times and asserts the worst-case render time, and
+that no ccusage process outlives the background refresh that started it.
+"""
+
+import json
+import os
+import shutil
+import signal
+import subprocess
+import sys
+import tempfile
+import time
+
+from statusline_fakes import FakeServices, install_fake_ccusage, make_fake_home, write_ccr_config
+
+RUNS = 3
+RENDER_BUDGET_MS = 150
+# Worst case allowed on top of the slowest healthy render: the render budget
+# plus headroom for a loaded machine. Anything near a service timeout (0.5-5 s)
+# means a dependency is blocking the line.
+HEADROOM_MS = 250
+# Background ccusage refreshes give up on each view after this long (the
+# learned timeout is clamped to it) and run the views one after another; a
+# ccusage stub still running once every refresher has exited has leaked
+CCUSAGE_TIMEOUT_S = 1
+CCUSAGE_VIEWS = 3
+LEAK_SLACK_S = 3
+
+script = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'claude-statusline.py')
+root = tempfile.mkdtemp(prefix='statusline-faults-')
+cwd = os.path.join(root, 'work', 'fault-project')
+bin_dir = os.path.join(root, 'bin')
+install_fake_ccusage(bin_dir, cwd)
+
+try:
+    services = FakeServices(cwd).start()
+except OSError as e:
+    print(f"❌ Cannot start the fake Qdrant/codeindex servers on ports 6333/3847: {e}")
+    exit(1)
+
+def render_times(name, ccusage_mode='ok', runs=RUNS, budget_ms=RENDER_BUDGET_MS):
+    """Render `runs` times in a fresh HOME; returns (worst ms, last line)"""
+    home = os.path.join(root, name)
+    session_id, transcript = make_fake_home(home, cwd, sessions=2, turns=50)[0]
+    write_ccr_config(home, services.ccr_port)
+    payload = json.dumps({'session_id': session_id, 'transcript_path': transcript,
+                          'model': {'id': 'claude-sonnet-4-5-20250929'},
+                          'context_window': {'context_window_size': 200000, 'used_percentage': 30}})
+    env = dict(os.environ, HOME=home, PWD=cwd, PATH=bin_dir + os.pathsep + os.environ.get('PATH', ''),
+               CLAUDE_STATUSLINE_BUDGET_MS=str(budget_ms), FAKE_CCUSAGE_MODE=ccusage_mode,
+               CLAUDE_STATUSLINE_TIMEOUT_BOUNDS=json.dumps({'ccusage': [CCUSAGE_TIMEOUT_S, CCUSAGE_TIMEOUT_S]}))
+    if ccusage_mode != 'ok':
+        env['CLAUDE_STATUSLINE_USAGE'] = 'ccusage'
+
+    worst, line = 0.0, ''
+    for _ in range(runs):
+        start = time.perf_counter()
+        result = subprocess.run([sys.executable, script], input=payload, env=env, cwd=cwd,
+                                capture_output=True, text=True, timeout=30)
+        worst = max(worst, (time.perf_counter() - start) * 1000)
+        line = result.stdout.strip()
+    return worst, line
+
+def live_processes(*needles):
+    """PIDs of running processes whose command line contains every needle"""
+    ps = subprocess.run(['ps', '-eo', 'pid=,args='], capture_output=True, text=True).stdout
+    return [int(line.split()[0]) for line in ps.splitlines() if all(n in line for n in needles)]
+
+def live_ccusage():
+    """PIDs of this run's ccusage stubs that are still running"""
+    return live_processes(os.path.join(bin_dir, 'ccusage'))
+
+def live_refreshers():
+    """PIDs of background ccusage refreshers that are still running"""
+    return live_processes(script, '--refresh-ccusage')
+
+results = []
+
+def check(name, worst, line, limit):
+    passed = worst < limit and line.startswith("🤖") and "Error" not in line
+    results.append(passed)
+    status = "✅ PASS" if passed else "❌ FAIL"
+    print(f"{status} | {name:28s} → worst {worst:7.1f} ms (limit {limit:.0f} ms)")
+    if not passed:
+        print(f"         line: {line!r}")
+    check_no_leaks(name)
+
+def check_no_leaks(name):
+    deadline = time.monotonic() + CCUSAGE_VIEWS * CCUSAGE_TIMEOUT_S + LEAK_SLACK_S
+    # Refreshers queued behind one another may still start a stub legitimately
+    while (live_ccusage() or live_refreshers()) and time.monotonic() < deadline:
+        time.sleep(0.1)
+    leaked = live_ccusage()
+    results.append(not leaked)
+    if leaked:
+        print(f"❌ FAIL | {name:28s} → ccusage processes left running: {leaked}")
+
+print("Testing Fault Injection")
+print("=" * 60)
+
+try:
+    healthy, line = render_times('healthy')
+    limit = healthy + RENDER_BUDGET_MS + HEADROOM_MS
+    check("all services healthy", healthy, line, limit)
+
+    for target in ('ccusage', 'ccr', 'qdrant', 'codeindex'):
+        for mode in ('hang', 'slow', 'garbage', 'refuse'):
+            name = f"{target} {mode}"
+            if target == 'ccusage':
+                worst, line = render_times(name.replace(' ', '-'), ccusage_mode=mode)
+            else:
+                services.set_mode(target, mode)
+                worst, line = render_times(name.replace(' ', '-'))
+                services.reset()
+            check(name, worst, line, limit)
+
+    for target in ('ccr', 'qdrant', 'codeindex'):
+        services.set_mode(target, 'hang')
+    worst, line = render_times('everything-hung', ccusage_mode='hang')
+    services.reset()
+    check("everything hung", worst, line, limit)
+
+    # With a budget generous enough to wait out CCR's timeout, the first renders
+    # pay for the hung service; once its circuit breaker opens, renders skip it
+    services.set_mode('ccr', 'hang')
+    slow, slow_line = render_times('breaker', runs=3, budget_ms=3000)
+    worst, line = render_times('breaker', runs=2, budget_ms=3000)
+    services.reset()
+    check("ccr hang, breaker closed", slow, slow_line, 3000 + limit)
+    waited = slow > limit
+    results.append(waited)
+    if not waited:
+        print(f"❌ FAIL | {'ccr hang, breaker closed':28s} → worst {slow:7.1f} ms never waited on CCR (over {limit:.0f} ms)")
+    check("ccr hang, breaker open", worst, line, limit)
+finally:
+    services.stop()
+    for pid in live_ccusage():
+        try:
+            os.kill(pid, signal.SIGKILL)
+        except OSError:
+            pass
+    shutil.rmtree(root, ignore_errors=True)
+
+print("=" * 60)
+all_passed = all(results)
+if all_passed:
+    print("✅ All tests passed!")
+else:
+    print("❌ Some tests failed!")
+
+exit(0 if all_passed else 1)
@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+"""
+Test script to verify the incremental session transcript reader
+"""
+
+import importlib.util
+import json
+import os
+import tempfile
+
+# Point the statusline at a throwaway home before it resolves ~/.claude paths
+home = tempfile.mkdtemp()
+os.environ['HOME'] = home
+
+script = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'claude-statusline.py')
+spec = importlib.util.spec_from_file_location('claude_statusline', script)
+statusline = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(statusline)
+
+SESSION_ID = 'a1b2c3d4-0000-0000-0000-000000000001'
+transcript = os.path.join(home, '.claude', 'projects', '-work-demo', f"{SESSION_ID}.jsonl")
+os.makedirs(os.path.dirname(transcript))
+
+def assistant_line(msg_id, request_id, input_tokens, output_tokens, cost=None):
+    entry = {
+        'type': 'assistant',
+        'sessionId': SESSION_ID,
+        'requestId': request_id,
+        'timestamp': '2025-10-01T10:00:00.000Z',
+        'message': {
+            'id': msg_id,
+            'model': 'claude-sonnet-4-5-20250929',
+            'usage': {'input_tokens': input_tokens, 'output_tokens': output_tokens},
+        },
+    }
+    if cost is not None:
+        entry['costUSD'] = cost
+    return json.dumps(entry) + '\n'
+
+def user_line():
+    return json.dumps({'type': 'user', 'message': {'role': 'user', 'content': 'hi'}}) + '\n'
+
+results = []
+
+def check(name, actual, expected):
+    passed = actual == expected
+    results.append(passed)
+    status = "✅ PASS" if passed else "❌ FAIL"
+    print(f"{status} | {name:45s} → {actual!r} (expected: {expected!r})")
+
+print("Testing Session Tail Reader")
+print("=" * 60)
+
+with open(transcript, 'w') as f:
+    f.write(user_line())
+    f.write(assistant_line('msg_1', 'req_1', 1000, 100, cost=0.5))
+    # Same message split across content blocks is only counted once
+    f.write(assistant_line('msg_1', 'req_1', 1000, 100, cost=0.5))
+
+totals = statusline.read_session_usage(SESSION_ID)
+check("first read tokens", totals['totalTokens'], 1100)
+check("first read cost", round(totals['totalCost'], 4), 0.5)
+
+state_file = os.path.join(home, '.claude', 'statusline-cache', 'sessions', f"{SESSION_ID}.json")
+with open(state_file) as f:
+    offset_after_first = json.load(f)['offset']
+check("offset persisted at end of file", offset_after_first, os.path.getsize(transcript))
+
+# Append a priced-by-table turn plus a partial line that is still being written
+with open(transcript, 'a') as f:
+    f.write(assistant_line('msg_2', 'req_2', 1_000_000, 0))
+    f.write('{"type": "assistant", "mess')
+
+totals = statusline.read_session_usage(SESSION_ID)
+check("incremental read tokens", totals['totalTokens'], 1_001_100)
+check("incremental read cost (sonnet pricing)", round(totals['totalCost'], 4), 3.5)
+
+with open(state_file) as f:
+    offset_after_second = json.load(f)['offset']
+check("partial line left for next read", offset_after_second < os.path.getsize(transcript), True)
+
+# Truncated transcript resets the running totals
+with open(transcript, 'w') as f:
+    f.write(assistant_line('msg_3', 'req_3', 10, 5, cost=0.01))
+totals = statusline.read_session_usage(SESSION_ID)
+check("truncation resets totals", totals['totalTokens'], 15)
+
+check("unknown session", statusline.read_session_usage('missing-session'), None)
+check("path-like session id rejected", statusline.read_session_usage('../etc'), None)
+
+print("=" * 60)
+all_passed = all(results)
+if all_passed:
+    print("✅ All tests passed!")
+else:
+    print("❌ Some tests failed!")
+
+exit(0 if all_passed else 1)
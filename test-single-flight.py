@@ -0,0 +1,153 @@
+#!/usr/bin/env python3
+"""
+Test script to verify concurrent statuslines share one ccusage run and one
+transcript ingest through single-flight locks, and that rendering never leaves
+ccusage or refresher processes behind
+"""
+
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+here = os.path.dirname(os.path.abspath(__file__))
+home = tempfile.mkdtemp()
+bin_dir = os.path.join(home, 'bin')
+runs_log = os.path.join(home, 'ccusage-runs.log')
+os.makedirs(bin_dir)
+
+# A slow ccusage that logs every run
+with open(os.path.join(bin_dir, 'ccusage'), 'w') as f:
+    f.write(f"#!{sys.executable} -S\n"
+            "import json, sys, time\n"
+            f"open({runs_log!r}, 'a').write(sys.argv[1] + '\\n')\n"
+            "time.sleep(0.5)\n"
+            "print(json.dumps({'blocks': [{'costUSD': 1.25}]}))\n")
+os.chmod(os.path.join(bin_dir, 'ccusage'), 0o755)
+
+env = dict(os.environ, HOME=home, PATH=bin_dir + os.pathsep + os.environ.get('PATH', ''))
+# Each window: load the statusline and ask for the blocks view, waiting up to 5 s
+window = (
+    "import importlib.util, json\n"
+    f"spec = importlib.util.spec_from_file_location('claude_statusline', {os.path.join(here, 'claude-statusline.py')!r})\n"
+    "statusline = importlib.util.module_from_spec(spec)\n"
+    "spec.loader.exec_module(statusline)\n"
+    "print(json.dumps(statusline.fetch_ccusage_view('blocks', wait=5)))\n"
+)
+
+def open_windows(count):
+    procs = [subprocess.Popen([sys.executable, '-c', window], env=env, stdout=subprocess.PIPE, text=True)
+             for _ in range(count)]
+    return [json.loads(proc.communicate()[0]) for proc in procs]
+
+def ccusage_runs():
+    try:
+        with open(runs_log) as f:
+            return len(f.read().split())
+    except OSError:
+        return 0
+
+def live_ccusage():
+    """PIDs of this test's ccusage stubs that are still running"""
+    ps = subprocess.run(['ps', '-eo', 'pid=,args='], capture_output=True, text=True).stdout
+    return [int(line.split()[0]) for line in ps.splitlines() if os.path.join(bin_dir, 'ccusage') in line]
+
+results = []
+
+def check(name, actual, expected):
+    passed = actual == expected
+    results.append(passed)
+    status = "✅ PASS" if passed else "❌ FAIL"
+    print(f"{status} | {name:45s} → {actual!r} (expected: {expected!r})")
+
+print("Testing Single-Flight Refresh")
+print("=" * 60)
+
+answers = open_windows(6)
+check("six cold windows run ccusage once", ccusage_runs(), 1)
+check("every window gets the result", [a and a['blocks'][0]['costUSD'] for a in answers], [1.25] * 6)
+
+answers = open_windows(6)
+check("a fresh cache runs nothing", ccusage_runs(), 1)
+
+# Age the cache past its TTL: windows behind the lock holder serve the stale copy
+cache_file = os.path.join(home, '.claude', 'statusline-cache', 'ccusage-blocks.json')
+with open(cache_file) as f:
+    cached = json.load(f)
+cached['fetchedAt'] -= 3600
+with open(cache_file, 'w') as f:
+    json.dump(cached, f)
+answers = open_windows(6)
+check("six stale windows run ccusage once", ccusage_runs(), 2)
+check("every window still gets a value", all(answers), True)
+
+# Six cold windows through the real entry point: the renders must not run
+# ccusage themselves, and their background refreshers run each view once
+render_home = os.path.join(home, 'render-home')
+render_env = dict(env, HOME=render_home, CLAUDE_STATUSLINE_USAGE='ccusage')
+os.remove(runs_log)
+renders = [subprocess.Popen([sys.executable, os.path.join(here, 'claude-statusline.py')], env=render_env,
+                            stdin=subprocess.PIPE, stdout=subprocess.PIPE, text=True)
+           for _ in range(6)]
+lines = [proc.communicate('{}')[0].strip() for proc in renders]
+check("cold renders print a line", all(line.startswith("🤖") for line in lines), True)
+
+markers = os.path.join(render_home, '.claude', 'statusline-cache')
+deadline = time.monotonic() + 15
+while time.monotonic() < deadline and (
+        live_ccusage() or any(name.endswith('.refreshing') for name in os.listdir(markers))):
+    time.sleep(0.1)
+check("ccusage runs for six cold renders", ccusage_runs(), 3)
+check("ccusage processes left behind", live_ccusage(), [])
+
+# Six windows in different directories and sessions find the usage summary
+# stale at once: the transcripts are still ingested by one process
+usage_home = os.path.join(home, 'usage-home')
+transcripts = os.path.join(usage_home, '.claude', 'projects', '-work-big')
+os.makedirs(transcripts)
+with open(os.path.join(transcripts, 'big.jsonl'), 'w') as f:
+    for i in range(20_000):
+        f.write(json.dumps({'type': 'assistant', 'sessionId': 'big', 'requestId': f"req_{i}",
+                            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()),
+                            'message': {'id': f"msg_{i}", 'model': 'claude-sonnet-4-5',
+                                        'usage': {'input_tokens': 10, 'output_tokens': 5}}}) + '\n')
+trace_file = os.path.join(home, 'usage-trace.json')
+usage_env = dict(env, HOME=usage_home, CLAUDE_STATUSLINE_TRACE=trace_file)
+windows = []
+for i in range(6):
+    cwd = os.path.join(usage_home, f"window-{i}")
+    os.makedirs(cwd)
+    windows.append(subprocess.Popen([sys.executable, os.path.join(here, 'claude-statusline.py')], env=usage_env,
+                                    cwd=cwd, stdin=subprocess.PIPE, stdout=subprocess.PIPE, text=True))
+lines = [proc.communicate(json.dumps({'session_id': f"window-{i}"}))[0].strip()
+         for i, proc in enumerate(windows)]
+check("six windows print a line", all(line.startswith("🤖") for line in lines), True)
+
+def live_refreshers():
+    """PIDs of refreshers started for the usage home that are still running"""
+    ps = subprocess.run(['ps', '-eo', 'pid=,args='], capture_output=True, text=True).stdout
+    script = os.path.join(here, 'claude-statusline.py')
+    return [int(line.split()[0]) for line in ps.splitlines() if script in line and '--refresh' in line]
+
+markers = os.path.join(usage_home, '.claude', 'statusline-cache')
+deadline = time.monotonic() + 30
+while time.monotonic() < deadline and (
+        live_refreshers() or any(name.endswith('.refreshing') for name in os.listdir(markers))):
+    time.sleep(0.1)
+with open(trace_file) as f:
+    spans = json.loads(f.read().rstrip().rstrip(',') + ']')
+check("six windows ingest the transcripts once",
+      sum(event['ph'] == 'X' and event['name'] == 'ingest_rollup' for event in spans), 1)
+check("usage summary written", os.path.exists(os.path.join(markers, 'usage-summary.json')), True)
+check("refreshers left behind", live_refreshers(), [])
+
+print("=" * 60)
+all_passed = all(results)
+if all_passed:
+    print("✅ All tests passed!")
+else:
+    print("❌ Some tests failed!")
+
+exit(0 if all_passed else 1)
@@ -3,27 +3,15 @@
 Test script to verify Sonnet 4.5 model name detection
 """
 
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from statusline_models import format_model_name
+
 def test_model_detection(model_id):
     """Test the model detection logic"""
-    model = "Claude"  # Default
-    model_id_lower = model_id.lower()
-
-    if 'opus-4-1' in model_id_lower or 'opus 4.1' in model_id_lower:
-        model = "Opus 4.1"
-    elif 'opus-4' in model_id_lower or 'opus 4' in model_id_lower:
-        model = "Opus 4"
-    elif 'sonnet-4-5' in model_id_lower or 'sonnet 4.5' in model_id_lower:
-        model = "Sonnet 4.5"
-    elif 'sonnet-4' in model_id_lower or 'sonnet 4' in model_id_lower:
-        model = "Sonnet 4"
-    elif 'sonnet-3-5' in model_id_lower or 'sonnet 3.5' in model_id_lower or 'sonnet-20241022' in model_id_lower:
-        model = "Sonnet 3.5"
-    elif 'sonnet' in model_id_lower:
-        model = "Sonnet"
-    elif 'haiku' in model_id_lower:
-        model = "Haiku"
-
-    return model
+    return format_model_name(model_id)
 
 # Test cases
 test_cases = [
@@ -35,6 +23,16 @@ test_cases = [
     ("claude-opus-4-1-20250805", "Opus 4.1"),
     ("claude-opus-4-20241022", "Opus 4"),
     ("claude-3-haiku-20240307", "Haiku"),
+    ("claude-haiku-4-5-20251001", "Haiku 4.5"),
+    ("gemini-2.5-flash-lite", "Gemini 2.5 Flash Lite"),
+    ("grok-4-1-fast-reasoning", "Grok 4.1 Fast"),
+    ("gpt-5.4-pro", "GPT-5.4 Pro"),
+    # IDs matching several rules resolve to the first one, as the old if/elif chains did
+    ("opus-4-1-sonnet-4-5-fallback", "Opus 4.1"),
+    ("claude-opus-4-7-sonnet-20241022", "Opus 4.7"),
+    ("haiku-4-5-sonnet-router", "Sonnet"),
+    ("gemini-2-grok-4-fast", "Gemini 2"),
+    ("o3-gpt-5.4-pro", "O3"),
 ]
 
 print("Testing Model Name Detection")
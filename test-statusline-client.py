@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+"""
+Test script to verify the daemon client never waits much past the render
+budget: a late daemon reply or a slow direct render prints the last line shown
+"""
+
+import json
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+here = os.path.dirname(os.path.abspath(__file__))
+client = os.path.join(here, 'claude-statusline-client.py')
+home = tempfile.mkdtemp()
+delay_file = os.path.join(home, 'delay')
+
+# Stand-in statusline: never starts a daemon, renders after the delay in delay_file
+stub = os.path.join(home, 'stub-statusline.py')
+with open(stub, 'w') as f:
+    f.write("import json, sys, time\n"
+            "if '--daemon' in sys.argv:\n"
+            "    sys.exit(0)\n"
+            f"time.sleep(float(open({delay_file!r}).read()))\n"
+            "print('🤖 line for ' + json.loads(sys.stdin.read()).get('session_id', ''))\n")
+env = dict(os.environ, HOME=home, CLAUDE_STATUSLINE_SCRIPT=stub, PWD=home)
+
+def render(session_id, delay):
+    with open(delay_file, 'w') as f:
+        f.write(str(delay))
+    start = time.monotonic()
+    result = subprocess.run([sys.executable, client], input=json.dumps({'session_id': session_id}),
+                            env=env, capture_output=True, text=True)
+    return result.stdout.strip(), time.monotonic() - start
+
+results = []
+
+def check(name, actual, expected):
+    passed = actual == expected
+    results.append(passed)
+    status = "✅ PASS" if passed else "❌ FAIL"
+    print(f"{status} | {name:45s} → {actual!r} (expected: {expected!r})")
+
+print("Testing Statusline Client")
+print("=" * 60)
+
+# No daemon: the client waits SPAWN_WAIT for one, then renders directly
+line, _ = render('s1', 0)
+check("direct render printed", line, "🤖 line for s1")
+line, elapsed = render('s1', 30)
+check("slow direct render shows the last line", line, "🤖 line for s1")
+check(f"and gives up on it ({elapsed:.1f} s)", elapsed < 5, True)
+line, _ = render('s2', 30)
+check("nothing remembered for another session", line.startswith("🤖 Claude | 💰 Status unavailable"), True)
+
+# A daemon that accepts and never answers: the reply wait follows the render budget
+socket_path = os.path.join(home, '.claude', 'statusline.sock')
+server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+server.bind(socket_path)
+server.listen(8)
+held = []
+threading.Thread(target=lambda: [held.append(server.accept()) for _ in range(8)], daemon=True).start()
+line, elapsed = render('s1', 0)
+check("late daemon reply shows the last line", line, "🤖 line for s1")
+check(f"after about the render budget ({elapsed:.2f} s)", elapsed < 1.0, True)
+server.close()
+
+print("=" * 60)
+all_passed = all(results)
+if all_passed:
+    print("✅ All tests passed!")
+else:
+    print("❌ Some tests failed!")
+
+exit(0 if all_passed else 1)
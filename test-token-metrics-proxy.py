@@ -0,0 +1,237 @@
+#!/usr/bin/env python3
+"""
+Test script to verify the token metrics proxy: protobuf and JSON decoding,
+compressed and rejected bodies, per-session deltas, batched flushing and the
+binary snapshot read back by the statusline
+"""
+
+import gzip
+import http.client
+import importlib.util
+import json
+import os
+import struct
+import tempfile
+import threading
+import time
+import zlib
+from http.server import ThreadingHTTPServer
+
+# Point both scripts at a throwaway home before they resolve ~/.claude paths
+home = tempfile.mkdtemp()
+os.environ['HOME'] = home
+os.environ['TOKEN_METRICS_MAX_BODY'] = '65536'
+os.environ['TOKEN_METRICS_FLUSH_INTERVAL'] = '0.3'
+
+here = os.path.dirname(os.path.abspath(__file__))
+
+def load(name, filename):
+    spec = importlib.util.spec_from_file_location(name, os.path.join(here, filename))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+proxy = load('token_metrics_proxy', 'token-metrics-proxy.py')
+statusline = load('claude_statusline', 'claude-statusline.py')
+
+# Hand-rolled protobuf encoding of ExportMetricsServiceRequest, field numbers
+# from opentelemetry/proto/metrics/v1/metrics.proto
+
+def varint(n):
+    out = bytearray()
+    while True:
+        byte = n & 0x7F
+        n >>= 7
+        if n:
+            out.append(byte | 0x80)
+        else:
+            out.append(byte)
+            return bytes(out)
+
+def field(number, payload):
+    return varint(number << 3 | 2) + varint(len(payload)) + payload
+
+def fixed64(number, payload):
+    return varint(number << 3 | 1) + payload
+
+def number(number, n):
+    return varint(number << 3) + varint(n)
+
+def key_value(key, value):
+    return field(1, key.encode()) + field(2, field(1, value.encode()))
+
+def data_point(value, attrs, start=1_000):
+    encoded = b''.join(field(7, key_value(k, v)) for k, v in attrs.items())
+    encoded += fixed64(2, struct.pack('<Q', start)) + fixed64(3, struct.pack('<Q', start + 5))
+    if isinstance(value, float):
+        return encoded + fixed64(4, struct.pack('<d', value))
+    return encoded + fixed64(6, struct.pack('<q', value))
+
+def sum_metric(name, points, temporality=proxy.TEMPORALITY_CUMULATIVE):
+    body = b''.join(field(1, point) for point in points) + number(2, temporality) + number(3, 1)
+    return field(1, name.encode()) + field(3, b'tokens') + field(7, body)
+
+def gauge_metric(name, points):
+    return field(1, name.encode()) + field(5, b''.join(field(1, point) for point in points))
+
+def export_request(metrics, resource_attrs=None):
+    resource = b''.join(field(1, key_value(k, v)) for k, v in (resource_attrs or {}).items())
+    scope = field(1, field(1, b'com.anthropic.claude_code')) + b''.join(field(2, m) for m in metrics)
+    return field(1, field(1, resource) + field(2, scope))
+
+def token_point(value, session, token_type, model='claude-sonnet-4-5', start=1_000):
+    return data_point(value, {'session.id': session, 'model': model, 'type': token_type}, start)
+
+server = ThreadingHTTPServer(('localhost', 0), proxy.OTLPHandler)
+server.daemon_threads = True
+threading.Thread(target=server.serve_forever, daemon=True).start()
+
+def post(body, content_type='application/x-protobuf', encoding=None, length=None):
+    """POST a body to the proxy; returns the HTTP status"""
+    conn = http.client.HTTPConnection('localhost', server.server_address[1], timeout=5)
+    conn.putrequest('POST', '/v1/metrics')
+    conn.putheader('Content-Type', content_type)
+    conn.putheader('Content-Length', str(len(body) if length is None else length))
+    if encoding:
+        conn.putheader('Content-Encoding', encoding)
+    conn.endheaders()
+    if length is None:
+        conn.send(body)
+    response = conn.getresponse()
+    response.read()
+    conn.close()
+    return response.status
+
+def totals(session):
+    with proxy.state_lock:
+        return dict(proxy.sessions[session]['totals']) if session in proxy.sessions else None
+
+results = []
+
+def check(name, actual, expected):
+    passed = actual == expected
+    results.append(passed)
+    status = "✅ PASS" if passed else "❌ FAIL"
+    print(f"{status} | {name:45s} → {actual!r} (expected: {expected!r})")
+
+print("Testing Token Metrics Proxy")
+print("=" * 60)
+
+# Sum points with int and double values; a gauge of the same name is skipped
+body = export_request([
+    sum_metric(proxy.TOKEN_METRIC_NAME, [token_point(1200, 's1', 'input'), token_point(340.0, 's1', 'output'),
+                                         token_point(5000, 's1', 'cacheRead')]),
+    gauge_metric(proxy.TOKEN_METRIC_NAME, [token_point(999_999, 's1', 'input')]),
+    sum_metric('claude_code.cost.usage', [token_point(7, 's1', 'input')]),
+])
+check("protobuf export accepted", post(body), 200)
+check("int and double sum points decoded", totals('s1'),
+      {'input': 1200, 'output': 340, 'cacheRead': 5000, 'cacheCreation': 0})
+
+# Cumulative points count only their growth; a new start time is a restart
+post(export_request([sum_metric(proxy.TOKEN_METRIC_NAME, [token_point(1500, 's1', 'input')])]))
+check("cumulative point adds its delta", totals('s1')['input'], 1500)
+post(export_request([sum_metric(proxy.TOKEN_METRIC_NAME, [token_point(200, 's1', 'input', start=2_000)])]))
+check("restarted exporter counts from zero", totals('s1')['input'], 1700)
+delta = sum_metric(proxy.TOKEN_METRIC_NAME, [token_point(50, 's1', 'output')], proxy.TEMPORALITY_DELTA)
+post(export_request([delta]))
+post(export_request([delta]))
+check("delta points add up", totals('s1')['output'], 440)
+
+# Session id from the resource attributes keeps sessions apart
+point = data_point(800, {'model': 'claude-haiku-4-5', 'type': 'input'})
+post(export_request([sum_metric(proxy.TOKEN_METRIC_NAME, [point])], {'session.id': 's2'}))
+check("resource attributes apply to points", totals('s2')['input'], 800)
+check("other session untouched", totals('s1')['input'], 1700)
+
+# Compressed bodies
+body = export_request([sum_metric(proxy.TOKEN_METRIC_NAME, [token_point(100, 's3', 'input')])])
+check("gzip body accepted", post(gzip.compress(body), encoding='gzip'), 200)
+check("gzip body decoded", totals('s3')['input'], 100)
+body = export_request([sum_metric(proxy.TOKEN_METRIC_NAME, [token_point(250, 's3', 'input')])])
+check("zlib deflate body accepted", post(zlib.compress(body), encoding='deflate'), 200)
+raw = zlib.compressobj(wbits=-zlib.MAX_WBITS)
+body = export_request([sum_metric(proxy.TOKEN_METRIC_NAME, [token_point(400, 's3', 'input')])])
+check("raw deflate body accepted", post(raw.compress(body) + raw.flush(), encoding='deflate'), 200)
+check("deflate bodies decoded", totals('s3')['input'], 400)
+
+# OTLP/JSON carries int64 values as strings
+json_body = json.dumps({'resourceMetrics': [{'scopeMetrics': [{'metrics': [{
+    'name': proxy.TOKEN_METRIC_NAME,
+    'sum': {'aggregationTemporality': proxy.TEMPORALITY_DELTA, 'dataPoints': [{
+        'asInt': '75', 'attributes': [{'key': 'session.id', 'value': {'stringValue': 's4'}},
+                                      {'key': 'model', 'value': {'stringValue': 'claude-sonnet-4-5'}},
+                                      {'key': 'type', 'value': {'stringValue': 'cacheCreation'}}]}]}}]}]}]})
+check("JSON export accepted", post(json_body.encode(), 'application/json'), 200)
+check("JSON point decoded", totals('s4')['cacheCreation'], 75)
+
+# Rejected bodies leave the totals alone
+before = totals('s1')
+body = export_request([sum_metric(proxy.TOKEN_METRIC_NAME, [token_point(9_000, 's1', 'input', start=3_000)])])
+check("truncated protobuf is 400", post(body[:-3]), 400)
+check("corrupt gzip is 400", post(b'\x1f\x8b' + b'\0' * 16, encoding='gzip'), 400)
+check("invalid JSON is 400", post(b'{"resourceMetrics": [', 'application/json'), 400)
+check("unknown content encoding is 415", post(body, encoding='br'), 415)
+check("unknown content type is 415", post(body, 'text/plain'), 415)
+check("oversized Content-Length is 413", post(b'', length=proxy.MAX_BODY_BYTES + 1), 413)
+check("gzip expanding past the cap is 413", post(gzip.compress(b'\0' * 200_000), encoding='gzip'), 413)
+check("rejected posts change nothing", totals('s1'), before)
+
+# Posts only mark the state dirty; the flush thread writes once per interval
+writes = []
+write_metrics_file = proxy.write_metrics_file
+proxy.write_metrics_file = lambda data: (writes.append(data), write_metrics_file(data))
+proxy.open_metrics_snapshot()
+stop_event = threading.Event()
+flusher = threading.Thread(target=proxy.flush_loop, args=(stop_event,), daemon=True)
+flusher.start()
+delta = sum_metric(proxy.TOKEN_METRIC_NAME, [token_point(10, 's5', 'output')], proxy.TEMPORALITY_DELTA)
+for _ in range(5):
+    post(export_request([delta]))
+check("posts do not write the file", writes, [])
+deadline = time.monotonic() + 3
+while not writes and time.monotonic() < deadline:
+    time.sleep(0.05)
+time.sleep(proxy.FLUSH_INTERVAL * 2)
+check("burst of posts flushed in one write", len(writes), 1)
+with open(proxy.METRICS_FILE) as f:
+    check("flushed file has the latest session", json.load(f)['sessions']['s5']['totals']['output'], 50)
+
+# The statusline reads the same totals back from the binary snapshot
+check("snapshot read for a session", statusline.read_metrics_snapshot('s5'), (True, 50))
+check("snapshot read for another session", statusline.read_metrics_snapshot('s2'), (True, 800))
+check("unknown session falls back to the JSON", statusline.read_metrics_snapshot('nope'), (False, None))
+proxy.SNAPSHOT_SEQ.pack_into(proxy.metrics_snapshot.map, proxy.SNAPSHOT_SEQ_OFFSET, proxy.metrics_snapshot.seq + 1)
+check("snapshot mid-write is not trusted", statusline.read_metrics_snapshot('s5'), (False, None))
+proxy.SNAPSHOT_SEQ.pack_into(proxy.metrics_snapshot.map, proxy.SNAPSHOT_SEQ_OFFSET, proxy.metrics_snapshot.seq)
+
+# Past the slot count only the most recent sessions are in the snapshot; the
+# rest are still in the JSON file, so their lookups must fall back to it
+for i in range(proxy.SNAPSHOT_SLOTS + 6):
+    post(export_request([sum_metric(proxy.TOKEN_METRIC_NAME, [token_point(i + 1, f"many-{i}", 'input')],
+                                    proxy.TEMPORALITY_DELTA)]))
+    time.sleep(0.002)  # distinct last-seen times order the slots
+writes.clear()
+deadline = time.monotonic() + 3
+while not writes and time.monotonic() < deadline:
+    time.sleep(0.05)
+newest = f"many-{proxy.SNAPSHOT_SLOTS + 5}"
+check("newest of many sessions in the snapshot", statusline.read_metrics_snapshot(newest),
+      (True, proxy.SNAPSHOT_SLOTS + 6))
+check("session without a slot falls back", statusline.read_metrics_snapshot('many-0'), (False, None))
+with open(proxy.METRICS_FILE) as f:
+    check("that session is in the JSON", json.load(f)['sessions']['many-0']['totals']['input'], 1)
+
+stop_event.set()
+flusher.join()
+server.shutdown()
+proxy.metrics_snapshot.close()
+
+print("=" * 60)
+all_passed = all(results)
+if all_passed:
+    print("✅ All tests passed!")
+else:
+    print("❌ Some tests failed!")
+
+exit(0 if all_passed else 1)
@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+"""
+Test script to verify the opt-in trace file: Chrome trace event format,
+rotation past the size cap and concurrent appends from several processes
+"""
+
+import json
+import os
+import re
+import subprocess
+import sys
+import tempfile
+
+here = os.path.dirname(os.path.abspath(__file__))
+script = os.path.join(here, 'claude-statusline.py')
+home = tempfile.mkdtemp()
+trace_dir = os.path.join(home, 'traces')
+
+def trace_env(path, max_mb='32'):
+    return dict(os.environ, HOME=home, CLAUDE_STATUSLINE_TRACE=path, CLAUDE_STATUSLINE_TRACE_MAX_MB=max_mb)
+
+def read_trace(path):
+    """Parse an unterminated trace array the way trace viewers do"""
+    with open(path) as f:
+        text = f.read()
+    return text, json.loads(text.rstrip().rstrip(',') + ']')
+
+# Each writer: load the statusline and flush `flushes` batches of `spans` spans
+writer = (
+    "import importlib.util, sys\n"
+    f"spec = importlib.util.spec_from_file_location('claude_statusline', {script!r})\n"
+    "statusline = importlib.util.module_from_spec(spec)\n"
+    "spec.loader.exec_module(statusline)\n"
+    "writer, flushes, spans = sys.argv[1], int(sys.argv[2]), int(sys.argv[3])\n"
+    "for flush in range(flushes):\n"
+    "    for span in range(spans):\n"
+    "        with statusline.trace_span(f'{writer} {flush} {span}', cat='test', padding='x' * 64):\n"
+    "            pass\n"
+    "    statusline.flush_trace()\n"
+)
+
+def run_writers(path, count, flushes, spans, max_mb='32'):
+    procs = [subprocess.Popen([sys.executable, '-c', writer, f"w{i}", str(flushes), str(spans)],
+                              env=trace_env(path, max_mb)) for i in range(count)]
+    return [proc.wait() for proc in procs]
+
+results = []
+
+def check(name, actual, expected):
+    passed = actual == expected
+    results.append(passed)
+    status = "✅ PASS" if passed else "❌ FAIL"
+    print(f"{status} | {name:45s} → {actual!r} (expected: {expected!r})")
+
+print("Testing Tracing")
+print("=" * 60)
+
+# Two renders append to one file, each named as its own process (background
+# refreshers they start append to it too)
+path = os.path.join(trace_dir, 'render.json')
+for _ in range(2):
+    subprocess.run([sys.executable, script], input='{}', env=trace_env(path), capture_output=True, text=True)
+text, events = read_trace(path)
+check("file opens a JSON array once", (text.startswith('[\n'), text.count('[\n')), (True, 1))
+names = [event['args']['name'] for event in events if event['ph'] == 'M' and event['name'] == 'process_name']
+check("one process_name event per render", sum(name.startswith('statusline render (') for name in names), 2)
+check("processes named after role and pid", all(re.fullmatch(r'statusline [a-z-]+ \(\d+\)', n) for n in names), True)
+spans = [event for event in events if event['ph'] == 'X']
+check("complete events carry the trace fields",
+      all({'name', 'cat', 'ts', 'dur', 'pid', 'tid', 'args'} <= set(event) for event in spans), True)
+check("render and parse steps traced", {'render', 'parse stdin'} <= {event['name'] for event in spans}, True)
+check("durations are non-negative", all(event['dur'] >= 0 for event in spans), True)
+
+# Several processes appending at once never interleave their lines
+path = os.path.join(trace_dir, 'concurrent.json')
+check("writers exit cleanly", run_writers(path, 6, 20, 5), [0] * 6)
+text, events = read_trace(path)
+spans = [event for event in events if event['ph'] == 'X']
+check("every span from every writer kept", len(spans), 6 * 20 * 5)
+check("every span kept exactly once", len({event['name'] for event in spans}), 6 * 20 * 5)
+check("one process_name per writer", sum(event['ph'] == 'M' for event in events), 6)
+
+# A small cap rotates the file and keeps TRACE_BACKUPS old copies, each parseable
+path = os.path.join(trace_dir, 'rotated.json')
+check("rotating writers exit cleanly", run_writers(path, 3, 40, 5, max_mb='0.01'), [0] * 3)
+files = sorted(name for name in os.listdir(trace_dir) if name.startswith('rotated.json') and not name.endswith('.lock'))
+check("rotated files kept", files, ['rotated.json'] + [f'rotated.json.{i}' for i in range(1, 5)])
+sizes = [os.path.getsize(os.path.join(trace_dir, name)) for name in files]
+check("no file far past the cap", all(size <= 0.01 * 1024 * 1024 + 2048 for size in sizes), True)
+parsed = all(read_trace(os.path.join(trace_dir, name))[0].startswith('[\n') for name in files)
+check("every rotated file is a trace", parsed, True)
+
+# A bad cap falls back to the default instead of breaking the render
+result = subprocess.run([sys.executable, script], input='{}', capture_output=True, text=True,
+                        env=trace_env(os.path.join(trace_dir, 'badcap.json'), max_mb='lots'))
+check("bad size cap still renders", result.stdout.startswith("🤖"), True)
+
+print("=" * 60)
+all_passed = all(results)
+if all_passed:
+    print("✅ All tests passed!")
+else:
+    print("❌ Some tests failed!")
+
+exit(0 if all_passed else 1)
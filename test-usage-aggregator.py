@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+"""
+Test script to verify the native usage aggregator: ccusage-shaped blocks,
+sessions and days built incrementally from the rollup store, and the shared
+summary renders read
+"""
+
+import importlib.util
+import json
+import os
+import tempfile
+import time
+from datetime import datetime, timedelta, timezone
+
+# Point the statusline at a throwaway home before it resolves ~/.claude paths
+home = tempfile.mkdtemp()
+os.environ['HOME'] = home
+os.environ['TZ'] = 'UTC'
+time.tzset()
+
+script = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'claude-statusline.py')
+spec = importlib.util.spec_from_file_location('claude_statusline', script)
+statusline = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(statusline)
+
+projects = os.path.join(home, '.claude', 'projects')
+
+# Two days ending yesterday, so the rollup never compacts them away
+day1 = (datetime.now(timezone.utc) - timedelta(days=2)).strftime('%Y-%m-%d')
+day2 = (datetime.now(timezone.utc) - timedelta(days=1)).strftime('%Y-%m-%d')
+
+def write_transcript(project, session_id, turns, mode='w'):
+    os.makedirs(os.path.join(projects, project), exist_ok=True)
+    with open(os.path.join(projects, project, f"{session_id}.jsonl"), mode) as f:
+        for msg_id, timestamp, tokens, cost in turns:
+            f.write(json.dumps({
+                'type': 'assistant',
+                'sessionId': session_id,
+                'requestId': f"req_{msg_id}",
+                'timestamp': timestamp,
+                'costUSD': cost,
+                'message': {
+                    'id': msg_id,
+                    'model': 'claude-opus-4-1-20250805',
+                    'usage': {'input_tokens': tokens, 'output_tokens': 0},
+                },
+            }) + '\n')
+
+write_transcript('-work-alpha', 's1', [
+    ('m1', f'{day1}T01:10:00Z', 100, 1.0),
+    ('m1', f'{day1}T01:10:00Z', 100, 1.0),  # duplicate content block
+    ('m2', f'{day1}T02:10:00Z', 200, 2.0),
+])
+write_transcript('-work-beta', 's2', [
+    ('m3', f'{day2}T09:30:00Z', 300, 3.0),
+    ('m4', f'{day2}T10:30:00Z', 600, 6.0),
+])
+
+now = datetime.fromisoformat(f'{day2}T11:00:00+00:00')
+blocks_data, session_data, daily_data = statusline.aggregate_usage(now=now)
+
+results = []
+
+def check(name, actual, expected):
+    passed = actual == expected
+    results.append(passed)
+    status = "✅ PASS" if passed else "❌ FAIL"
+    print(f"{status} | {name:40s} → {actual!r} (expected: {expected!r})")
+
+print("Testing Native Usage Aggregator")
+print("=" * 60)
+
+blocks = blocks_data['blocks']
+check("block count (block, gap, block)", len(blocks), 3)
+check("first block start floored to hour", blocks[0]['startTime'], f'{day1}T01:00:00Z')
+check("first block tokens (deduplicated)", blocks[0]['totalTokens'], 300)
+check("gap block marked", blocks[1]['isGap'], True)
+check("last block active", blocks[-1]['isActive'], True)
+check("last block cost", blocks[-1]['costUSD'], 9.0)
+check("burn rate tokens/min", blocks[-1]['burnRate']['tokensPerMinute'], 15.0)
+check("projection remaining minutes", blocks[-1]['projection']['remainingMinutes'], 180)
+
+sessions = {s['sessionId']: s for s in session_data['sessions']}
+check("session keyed by project dir", sorted(sessions), ['-work-alpha', '-work-beta'])
+check("session total cost", sessions['-work-alpha']['totalCost'], 3.0)
+
+daily = {d['date']: d for d in daily_data['daily']}
+check("daily totals", daily[day2]['totalTokens'], 900)
+check("grand total cost", daily_data['totals']['totalCost'], 12.0)
+
+# A later call parses only the lines appended since the previous one
+parsed = []
+parse_usage_entry = statusline.parse_usage_entry
+statusline.parse_usage_entry = lambda line: (parsed.append(line), parse_usage_entry(line))[1]
+write_transcript('-work-beta', 's2', [('m5', f'{day2}T10:45:00Z', 150, 1.5)], mode='a')
+blocks_data, session_data, daily_data = statusline.aggregate_usage(now=now)
+statusline.parse_usage_entry = parse_usage_entry
+check("only the appended line parsed", len(parsed), 1)
+check("active block carries on from its stored state", blocks_data['blocks'][-1]['totalTokens'], 1050)
+check("block count unchanged", len(blocks_data['blocks']), 3)
+check("daily totals updated", {d['date']: d for d in daily_data['daily']}[day2]['totalTokens'], 1050)
+
+# The shared summary is fresh until a transcript changes
+check("no summary before a refresh", statusline.read_usage_summary(), (None, False))
+summary = statusline.update_usage_summary()
+check("refresh writes the spend windows", summary['spend']['month'] >= 1.5, True)
+check("summary keeps the recent blocks", len(summary['usage'][0]['blocks']), 3)
+check("summary fresh while transcripts unchanged", statusline.read_usage_summary()[1], True)
+write_transcript('-work-beta', 's2', [('m6', f'{day2}T10:50:00Z', 10, 0.1)], mode='a')
+check("summary stale once a transcript grows", statusline.read_usage_summary()[1], False)
+
+print("=" * 60)
+all_passed = all(results)
+if all_passed:
+    print("✅ All tests passed!")
+else:
+    print("❌ Some tests failed!")
+
+exit(0 if all_passed else 1)
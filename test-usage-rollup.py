@@ -0,0 +1,175 @@
+#!/usr/bin/env python3
+"""
+Test script to verify the incremental spend rollup: de-duplication across
+re-ingests, partially written lines, per-file progress, monthly compaction
+and renders that only read the store
+"""
+
+import importlib.util
+import json
+import os
+import tempfile
+import time
+from datetime import datetime, timedelta, timezone
+
+# Point the statusline at a throwaway home before it resolves ~/.claude paths
+home = tempfile.mkdtemp()
+os.environ['HOME'] = home
+os.environ['TZ'] = 'UTC'
+time.tzset()
+
+script = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'claude-statusline.py')
+spec = importlib.util.spec_from_file_location('claude_statusline', script)
+statusline = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(statusline)
+
+projects = os.path.join(home, '.claude', 'projects')
+
+def turn(msg_id, timestamp, tokens, cost=1.0, session_id='s1'):
+    return json.dumps({
+        'type': 'assistant',
+        'sessionId': session_id,
+        'requestId': f"req_{msg_id}",
+        'timestamp': timestamp.isoformat().replace('+00:00', 'Z'),
+        'costUSD': cost,
+        'message': {'id': msg_id, 'model': 'claude-sonnet-4-5', 'usage': {'input_tokens': tokens}},
+    }) + '\n'
+
+def transcript(project, session_id):
+    os.makedirs(os.path.join(projects, project), exist_ok=True)
+    return os.path.join(projects, project, f"{session_id}.jsonl")
+
+def write(path, text, mode='w'):
+    with open(path, mode) as f:
+        f.write(text)
+
+def ingest():
+    db = statusline.open_rollup_db()
+    try:
+        statusline.ingest_rollup(db)
+    finally:
+        db.close()
+
+def query(sql, *args):
+    db = statusline.open_rollup_db()
+    try:
+        return db.execute(sql, args).fetchall()
+    finally:
+        db.close()
+
+def total_tokens():
+    return query('SELECT COALESCE(SUM(input_tokens), 0) FROM daily_usage')[0][0]
+
+results = []
+
+def check(name, actual, expected):
+    passed = actual == expected
+    results.append(passed)
+    status = "✅ PASS" if passed else "❌ FAIL"
+    print(f"{status} | {name:45s} → {actual!r} (expected: {expected!r})")
+
+print("Testing Usage Rollup")
+print("=" * 60)
+
+now = datetime.now(timezone.utc).replace(microsecond=0)
+alpha = transcript('-work-alpha', 's1')
+beta = transcript('-work-beta', 's2')
+write(alpha, turn('m1', now - timedelta(minutes=30), 100) * 2 + turn('m2', now - timedelta(minutes=20), 200))
+# A resumed session repeats an earlier message from another file
+write(beta, turn('m1', now - timedelta(minutes=30), 100, session_id='s2')
+      + turn('m3', now - timedelta(minutes=25), 400, session_id='s2'))
+ingest()
+check("duplicates counted once across files", total_tokens(), 700)
+ingest()
+check("re-ingest of unchanged files adds nothing", total_tokens(), 700)
+
+# A rewritten file (new inode) is read from the start; seen entries stay deduplicated
+tmp = alpha + '.tmp'
+write(tmp, turn('m1', now - timedelta(minutes=30), 100) + turn('m2', now - timedelta(minutes=20), 200)
+      + turn('m4', now - timedelta(minutes=10), 50))
+os.replace(tmp, alpha)
+ingest()
+check("rewritten file only adds its new entry", total_tokens(), 750)
+
+# Half a line is left for the next pass, then counted exactly once
+line = turn('m5', now - timedelta(minutes=5), 1000)
+write(beta, line[:40], 'a')
+ingest()
+check("partial trailing line not counted", total_tokens(), 750)
+write(beta, line[40:], 'a')
+ingest()
+check("completed line counted once", total_tokens(), 1750)
+ingest()
+check("and not again", total_tokens(), 1750)
+
+# Entries from files read in any order reach the burn tracker in time order
+db = statusline.open_rollup_db()
+tracker = statusline.load_burn_tracker(db)
+db.close()
+check("active block has every file's entries", tracker.block and tracker.block['tokens'], 1750)
+check("staged entries folded and cleared", query('SELECT COUNT(*) FROM pending_entries')[0][0], 0)
+
+# A pass that fails after the per-file commits keeps their progress
+gamma = transcript('-work-gamma', 's3')
+write(gamma, turn('m6', now - timedelta(minutes=2), 5))
+compact_rollup = statusline.compact_rollup
+def failing_compaction(db):
+    raise OSError("disk full")
+statusline.compact_rollup = failing_compaction
+try:
+    ingest()
+except OSError:
+    pass
+statusline.compact_rollup = compact_rollup
+check("finished file committed before the failure", total_tokens(), 1755)
+check("its entries wait for the tracker", query('SELECT COUNT(*) FROM pending_entries')[0][0], 1)
+ingest()
+check("next pass does not read the file again", total_tokens(), 1755)
+check("and folds the waiting entries", query('SELECT COUNT(*) FROM pending_entries')[0][0], 0)
+
+# Compaction: days before the retention cutoff move to monthly rows, the cutoff day stays
+local_today = datetime.now().replace(hour=12, minute=0, second=0, microsecond=0)
+cutoff = local_today - timedelta(days=statusline.ROLLUP_RETENTION_DAYS)
+old_day, kept_day = cutoff - timedelta(days=1), cutoff
+write(transcript('-work-old', 's4'), turn('o1', old_day.astimezone(timezone.utc), 7)
+      + turn('o2', kept_day.astimezone(timezone.utc), 11))
+query("DELETE FROM meta WHERE key = 'last_compaction'")
+ingest()
+check("day before the cutoff left daily rows",
+      query('SELECT COUNT(*) FROM daily_usage WHERE day = ?', old_day.strftime('%Y-%m-%d'))[0][0], 0)
+check("cutoff day kept as a daily row",
+      query('SELECT SUM(input_tokens) FROM daily_usage WHERE day = ?', kept_day.strftime('%Y-%m-%d'))[0][0], 11)
+check("older day folded into its month",
+      query('SELECT SUM(input_tokens) FROM monthly_usage WHERE month = ?', old_day.strftime('%Y-%m'))[0][0], 7)
+check("its dedupe keys dropped with it", query("SELECT key FROM seen_entries WHERE key LIKE 'o%'"), [('o2:req_o2',)])
+query("DELETE FROM meta WHERE key = 'last_compaction'")
+db = statusline.open_rollup_db()
+statusline.run_rollup_transaction(db, lambda: statusline.compact_rollup(db))
+db.close()
+check("compacting again adds nothing",
+      query('SELECT SUM(input_tokens) FROM monthly_usage')[0][0], 7)
+
+# A render only reads: with no summary yet it comes back empty while a detached process ingests
+write(gamma, turn('m7', now - timedelta(minutes=1), 5), 'a')
+start = time.perf_counter()
+summary = statusline.get_spend_summary()
+elapsed_ms = (time.perf_counter() - start) * 1000
+check("cold render does not ingest", (summary, total_tokens()), (None, 1766))
+check(f"cold render returns at once ({elapsed_ms:.0f} ms)", elapsed_ms < 100, True)
+
+marker = os.path.join(statusline.CACHE_DIR, 'usage.refreshing')
+deadline = time.monotonic() + 15
+while os.path.exists(marker) and time.monotonic() < deadline:
+    time.sleep(0.05)
+check("background refresher ingested", total_tokens(), 1771)
+summary = statusline.get_spend_summary()
+check("next render reads its summary", summary is not None and summary['today'] > 0, True)
+
+print("=" * 60)
+all_passed = all(results)
+if all_passed:
+    print("✅ All tests passed!")
+else:
+    print("❌ Some tests failed!")
+
+exit(0 if all_passed else 1)
@@ -5,10 +5,13 @@ Captures OpenTelemetry metrics from Claude Code and makes them available to the
 """
 
 import json
+import mmap
 import os
+import struct
 import time
 import threading
-from http.server import HTTPServer, BaseHTTPRequestHandler
+import zlib
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
 from datetime import datetime
 from pathlib import Path
 
@@ -16,83 +19,511 @@ from pathlib import Path
 METRICS_FILE = Path.home() / '.claude' / 'token-metrics.json'
 METRICS_FILE.parent.mkdir(parents=True, exist_ok=True)
 
-# Track cumulative token usage
-token_totals = {
-    'input': 0,
-    'output': 0,
-    'cacheRead': 0,
-    'cacheCreation': 0,
-    'lastUpdate': None
-}
+# Fixed-layout binary copy of the totals, memory-mapped so the statusline can read
+# it with one struct.unpack and no JSON parsing. Layout (little-endian), shared
+# with read_metrics_snapshot() in claude-statusline.py:
+#   header: magic 'CTM1', slot count u32, sequence u64 (odd while a write is in
+#           progress), CLOCK_MONOTONIC ns of the last update u64, totals of the most
+#           recent session (input, output, cacheRead, cacheCreation) 4*u64, used slots u32
+#   slots:  session id (64 bytes, NUL padded), monotonic ns of its last update u64,
+#           its totals 4*u64; most recently active session first
+SNAPSHOT_FILE = Path.home() / '.claude' / 'token-metrics.bin'
+SNAPSHOT_MAGIC = b'CTM1'
+SNAPSHOT_HEADER = struct.Struct('<4sIQQ4QI4x')
+SNAPSHOT_SEQ = struct.Struct('<Q')
+SNAPSHOT_SEQ_OFFSET = 8
+SNAPSHOT_SLOT = struct.Struct('<64sQ4Q')
+SNAPSHOT_SLOTS = 64
+
+# Updates are coalesced into at most one write per flush interval (seconds)
+FLUSH_INTERVAL = 1.0
+try:
+    FLUSH_INTERVAL = float(os.environ.get('TOKEN_METRICS_FLUSH_INTERVAL', '1.0'))
+except ValueError:
+    pass
+
+# Series limits: at most MAX_SERIES (session, model, type) series are tracked;
+# series and sessions idle for longer than SERIES_TTL seconds are evicted
+MAX_SERIES = 1000
+SERIES_TTL = 21600
+try:
+    MAX_SERIES = max(1, int(os.environ.get('TOKEN_METRICS_MAX_SERIES', '1000')))
+except ValueError:
+    pass
+try:
+    SERIES_TTL = int(os.environ.get('TOKEN_METRICS_SERIES_TTL', '21600'))
+except ValueError:
+    pass
+
+TOKEN_TYPES = ('input', 'output', 'cacheRead', 'cacheCreation')
+
+# Request bodies (compressed or not) larger than this are rejected with 413
+MAX_BODY_BYTES = 4 * 1024 * 1024
+try:
+    MAX_BODY_BYTES = int(os.environ.get('TOKEN_METRICS_MAX_BODY', str(MAX_BODY_BYTES)))
+except ValueError:
+    pass
+
+TOKEN_METRIC_NAME = 'claude_code.token.usage'
+
+# OTLP AggregationTemporality values
+TEMPORALITY_DELTA = 1
+TEMPORALITY_CUMULATIVE = 2
+
+# Aggregation state, guarded by state_lock:
+#   series:   (session_id, model, type) -> {'last', 'start', 'seen'} for cumulative points
+#   sessions: session_id -> per-session totals, per-model totals and last update
+series = {}
+sessions = {}
+state_lock = threading.Lock()
+state_dirty = threading.Event()
+
+def new_token_totals():
+    return {token_type: 0 for token_type in TOKEN_TYPES}
+
+def record_data_point(session_id, model, token_type, value, temporality, start_time, now):
+    """Apply one data point to its series and return the token delta (caller holds state_lock)"""
+    if temporality == TEMPORALITY_CUMULATIVE:
+        key = (session_id, model, token_type)
+        state = series.get(key)
+        if state is None:
+            if len(series) >= MAX_SERIES:
+                evict_series(now)
+            state = series[key] = {'last': 0, 'start': start_time, 'seen': now}
+        if state['start'] != start_time or value < state['last']:
+            # Exporter restarted: the new cumulative value is all new usage
+            state['last'] = 0
+            state['start'] = start_time
+        delta = value - state['last']
+        state['last'] = value
+        state['seen'] = now
+    else:
+        delta = value
+
+    session = sessions.get(session_id)
+    if session is None:
+        if len(sessions) >= MAX_SERIES:
+            evict_series(now)
+        session = sessions[session_id] = {'totals': new_token_totals(), 'models': {}}
+    session['totals'][token_type] += delta
+    session['models'].setdefault(model, new_token_totals())[token_type] += delta
+    session['model'] = model
+    session['seen'] = now
+    return delta
+
+def evict_series(now):
+    """Drop idle series and sessions; if still at the cap, drop the least recently seen series"""
+    for key in [key for key, state in series.items() if now - state['seen'] > SERIES_TTL]:
+        del series[key]
+    if len(series) >= MAX_SERIES:
+        oldest = min(series, key=lambda key: series[key]['seen'])
+        del series[oldest]
+    live = {key[0] for key in series}
+    for session_id in [sid for sid, session in sessions.items()
+                       if sid not in live and now - session['seen'] > SERIES_TTL]:
+        del sessions[session_id]
+    while len(sessions) > MAX_SERIES:
+        del sessions[min(sessions, key=lambda sid: sessions[sid]['seen'])]
+
+def session_document(session):
+    """On-disk view of one session's totals"""
+    totals = dict(session['totals'])
+    return {
+        'totals': totals,
+        'totalUsed': sum(totals.values()),
+        'model': session['model'],
+        'models': {model: dict(counts) for model, counts in session['models'].items()},
+        'lastUpdate': datetime.fromtimestamp(session['seen']).isoformat(),
+    }
+
+def snapshot_metrics():
+    """Copy the current state into the on-disk document (caller holds state_lock)"""
+    evict_series(time.time())
+    documents = {sid: session_document(session) for sid, session in sessions.items()}
+    # Top-level fields mirror the most recently active session for older readers
+    latest = max(sessions, key=lambda sid: sessions[sid]['seen'], default=None)
+    latest_doc = documents.get(latest) or {'totals': new_token_totals(), 'totalUsed': 0,
+                                           'model': None, 'lastUpdate': None}
+    return {
+        'timestamp': datetime.now().isoformat(),
+        'totals': dict(latest_doc['totals'], lastUpdate=latest_doc['lastUpdate'], model=latest_doc['model']),
+        'totalUsed': latest_doc['totalUsed'],
+        'model': latest_doc['model'],
+        'sessionId': latest,
+        'sessions': documents
+    }
+
+def write_metrics_file(metrics_data):
+    """Replace the metrics file atomically so readers never see a partial write"""
+    tmp_path = METRICS_FILE.with_name(f".{METRICS_FILE.name}.{os.getpid()}.tmp")
+    with open(tmp_path, 'w') as f:
+        json.dump(metrics_data, f, indent=2)
+    os.replace(tmp_path, METRICS_FILE)
+
+def snapshot_slots():
+    """(session id, monotonic ns, totals) for the most recently active sessions (caller holds state_lock)"""
+    wall_now = time.time()
+    mono_now = time.monotonic_ns()
+    recent = sorted(sessions.items(), key=lambda item: item[1]['seen'], reverse=True)[:SNAPSHOT_SLOTS]
+    return [(sid.encode('utf-8')[:64], mono_now - int((wall_now - session['seen']) * 1e9),
+             tuple(session['totals'][token_type] for token_type in TOKEN_TYPES))
+            for sid, session in recent]
+
+class MetricsSnapshot:
+    """Writer side of the memory-mapped snapshot, guarded by a seqlock"""
+
+    def __init__(self, path):
+        size = SNAPSHOT_HEADER.size + SNAPSHOT_SLOT.size * SNAPSHOT_SLOTS
+        fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            os.ftruncate(fd, size)
+            self.map = mmap.mmap(fd, size)
+        finally:
+            os.close(fd)
+        self.seq = 0
+        self.map[:] = bytes(size)
+
+    def publish(self, slots):
+        """Write all slots between two sequence bumps so readers can detect torn reads"""
+        self.seq += 1
+        SNAPSHOT_SEQ.pack_into(self.map, SNAPSHOT_SEQ_OFFSET, self.seq)
+        offset = SNAPSHOT_HEADER.size
+        for session_id, updated_ns, totals in slots:
+            SNAPSHOT_SLOT.pack_into(self.map, offset, session_id, updated_ns, *totals)
+            offset += SNAPSHOT_SLOT.size
+        latest_ns, latest_totals = (slots[0][1], slots[0][2]) if slots else (0, (0, 0, 0, 0))
+        SNAPSHOT_HEADER.pack_into(self.map, 0, SNAPSHOT_MAGIC, SNAPSHOT_SLOTS, self.seq,
+                                  latest_ns, *latest_totals, len(slots))
+        self.seq += 1
+        SNAPSHOT_SEQ.pack_into(self.map, SNAPSHOT_SEQ_OFFSET, self.seq)
+
+    def close(self):
+        self.map.close()
+
+metrics_snapshot = None
+
+def flush_metrics():
+    """Write the latest totals if anything changed since the last flush"""
+    if not state_dirty.is_set():
+        return
+    with state_lock:
+        state_dirty.clear()
+        metrics_data = snapshot_metrics()
+        slots = snapshot_slots()
+    if metrics_snapshot is not None:
+        metrics_snapshot.publish(slots)
+    try:
+        write_metrics_file(metrics_data)
+    except OSError as e:
+        state_dirty.set()  # Retry on the next tick
+        print(f"Error writing metrics: {e}")
+        return
+    print(f"[{datetime.now().strftime('%H:%M:%S')}] Updated metrics - "
+          f"{len(metrics_data['sessions'])} session(s), latest: {metrics_data['totalUsed']:,} tokens")
+
+def flush_loop(stop_event):
+    """Background writer: wake on new data, then wait out the flush interval to batch it"""
+    while not stop_event.is_set():
+        if not state_dirty.wait(timeout=1.0):
+            continue
+        if stop_event.wait(FLUSH_INTERVAL):
+            break
+        flush_metrics()
+
+class PayloadError(Exception):
+    """Request body that cannot be decoded; answered with a 4xx status"""
+
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+def decompress_body(body, encoding):
+    """Inflate a gzip/deflate body without letting it expand past MAX_BODY_BYTES"""
+    encoding = (encoding or 'identity').strip().lower()
+    if encoding == 'identity':
+        return body
+    if encoding == 'gzip':
+        wbits_options = (16 + zlib.MAX_WBITS,)
+    elif encoding == 'deflate':
+        # "deflate" is zlib-wrapped by spec, but raw deflate is common in practice
+        wbits_options = (zlib.MAX_WBITS, -zlib.MAX_WBITS)
+    else:
+        raise PayloadError(415, f"unsupported content encoding: {encoding}")
+    for wbits in wbits_options:
+        try:
+            inflater = zlib.decompressobj(wbits)
+            data = inflater.decompress(body, MAX_BODY_BYTES)
+        except zlib.error:
+            continue
+        if inflater.unconsumed_tail:
+            raise PayloadError(413, "decompressed body too large")
+        return data
+    raise PayloadError(400, f"invalid {encoding} body")
+
+# Minimal protobuf reader for ExportMetricsServiceRequest. Only the fields on the
+# path to claude_code.token.usage data points are decoded; everything else is
+# skipped by wire type, so the opentelemetry-proto package is not needed.
+
+def read_varint(buf, pos):
+    result = 0
+    shift = 0
+    while True:
+        byte = buf[pos]
+        pos += 1
+        result |= (byte & 0x7F) << shift
+        if byte < 0x80:
+            return result, pos
+        shift += 7
+
+def iter_fields(buf, pos, end):
+    """Yield (field_number, wire_type, value) where length-delimited values are (start, end) offsets"""
+    while pos < end:
+        tag, pos = read_varint(buf, pos)
+        field, wire_type = tag >> 3, tag & 7
+        if wire_type == 0:
+            value, pos = read_varint(buf, pos)
+        elif wire_type == 1:
+            value = (pos, pos + 8)
+            pos += 8
+        elif wire_type == 2:
+            length, pos = read_varint(buf, pos)
+            value = (pos, pos + length)
+            pos += length
+        elif wire_type == 5:
+            value = (pos, pos + 4)
+            pos += 4
+        else:
+            raise ValueError(f"unsupported wire type {wire_type}")
+        if pos > end:
+            raise ValueError("truncated message")
+        yield field, wire_type, value
+
+def decode_key_value(raw):
+    """KeyValue{1: key, 2: AnyValue{1: string_value}} bytes -> (key, string value or None)"""
+    key = ''
+    value = None
+    for field, wire_type, span in iter_fields(raw, 0, len(raw)):
+        if field == 1 and wire_type == 2:
+            key = raw[span[0]:span[1]].decode('utf-8', 'replace')
+        elif field == 2 and wire_type == 2:
+            for any_field, any_wire, any_span in iter_fields(raw, *span):
+                if any_field == 1 and any_wire == 2:
+                    value = raw[any_span[0]:any_span[1]].decode('utf-8', 'replace')
+    return key, value
+
+# Every export repeats the same attribute sets (session, model, type, ...), so each
+# data point's encoded attribute run is memoized instead of decoded again
+_attribute_cache = {}
+
+def decode_attributes(raw):
+    """Concatenated KeyValue fields (tag 7 of a data point) -> dict of string values"""
+    attrs = _attribute_cache.get(raw)
+    if attrs is None:
+        attrs = {}
+        for field, wire_type, span in iter_fields(raw, 0, len(raw)):
+            if field == 7 and wire_type == 2:
+                key, value = decode_key_value(raw[span[0]:span[1]])
+                if value is not None:
+                    attrs[key] = value
+        if len(_attribute_cache) >= 4096:
+            _attribute_cache.clear()
+        _attribute_cache[raw] = attrs
+    return attrs
+
+def decode_data_point(buf, pos, end, resource_attrs):
+    """NumberDataPoint -> (attrs, value, start_time); the hot loop, so single-byte tags are read inline"""
+    start_time = ''
+    value = 0
+    run_start = run_end = None
+    attr_runs = []
+    while pos < end:
+        tag_pos = pos
+        tag = buf[pos]
+        pos += 1
+        if tag > 0x7F:
+            tag, pos = read_varint(buf, pos - 1)
+        wire_type = tag & 7
+        if tag == 0x3A:  # 7: attributes, collected as one contiguous byte run
+            if run_start is None:
+                run_start = tag_pos
+        elif run_start is not None:
+            attr_runs.append(buf[run_start:tag_pos])
+            run_start = None
+        if wire_type == 2:
+            length = buf[pos]
+            pos += 1
+            if length > 0x7F:
+                length, pos = read_varint(buf, pos - 1)
+            pos += length
+        elif wire_type == 1:
+            if tag == 0x11:  # 2: start_time_unix_nano
+                start_time = str(int.from_bytes(buf[pos:pos + 8], 'little'))
+            elif tag == 0x31:  # 6: as_int
+                value = int.from_bytes(buf[pos:pos + 8], 'little', signed=True)
+            elif tag == 0x21:  # 4: as_double
+                value = int(struct.unpack_from('<d', buf, pos)[0])
+            pos += 8
+        elif wire_type == 0:
+            _, pos = read_varint(buf, pos)
+        elif wire_type == 5:
+            pos += 4
+        else:
+            raise ValueError(f"unsupported wire type {wire_type}")
+    if pos != end:
+        raise ValueError("truncated data point")
+    if run_start is not None:
+        attr_runs.append(buf[run_start:end])
+    attrs = dict(resource_attrs)
+    for run in attr_runs:
+        attrs.update(decode_attributes(run))
+    return attrs, value, start_time
+
+def protobuf_token_points(body):
+    """Token data points from an ExportMetricsServiceRequest as (attrs, value, temporality, start_time)"""
+    points = []
+    for field, wire_type, rm_span in iter_fields(body, 0, len(body)):
+        if field != 1 or wire_type != 2:
+            continue
+        resource_attrs = {}
+        metric_spans = []
+        for rm_field, rm_wire, span in iter_fields(body, *rm_span):
+            if rm_field == 1 and rm_wire == 2:
+                for res_field, res_wire, attr_span in iter_fields(body, *span):
+                    if res_field == 1 and res_wire == 2:
+                        key, value = decode_key_value(body[attr_span[0]:attr_span[1]])
+                        if value is not None:
+                            resource_attrs[key] = value
+            elif rm_field == 2 and rm_wire == 2:
+                metric_spans.extend(sm_span for sm_field, sm_wire, sm_span in iter_fields(body, *span)
+                                    if sm_field == 2 and sm_wire == 2)
+        for metric_span in metric_spans:
+            name = None
+            sum_span = None
+            for m_field, m_wire, span in iter_fields(body, *metric_span):
+                if m_field == 1 and m_wire == 2:
+                    name = body[span[0]:span[1]].decode('utf-8', 'replace')
+                elif m_field == 7 and m_wire == 2:
+                    sum_span = span
+            if name != TOKEN_METRIC_NAME or sum_span is None:
+                continue
+            temporality = TEMPORALITY_CUMULATIVE
+            point_spans = []
+            for s_field, s_wire, span in iter_fields(body, *sum_span):
+                if s_field == 1 and s_wire == 2:
+                    point_spans.append(span)
+                elif s_field == 2 and s_wire == 0:
+                    temporality = span
+            for point_start, point_end in point_spans:
+                attrs, value, start_time = decode_data_point(body, point_start, point_end, resource_attrs)
+                points.append((attrs, value, temporality, start_time))
+    return points
+
+def json_token_points(data):
+    """Token data points from an OTLP/JSON body as (attrs, value, temporality, start_time)"""
+    points = []
+    for resource_metric in data.get('resourceMetrics', []):
+        resource_attrs = parse_attributes(resource_metric.get('resource', {}).get('attributes', []))
+        for scope_metric in resource_metric.get('scopeMetrics', []):
+            for metric in scope_metric.get('metrics', []):
+                if metric.get('name') != TOKEN_METRIC_NAME:
+                    continue
+                sum_data = metric.get('sum', {})
+                temporality = sum_data.get('aggregationTemporality', TEMPORALITY_CUMULATIVE)
+                for data_point in sum_data.get('dataPoints', []):
+                    attrs = dict(resource_attrs)
+                    attrs.update(parse_attributes(data_point.get('attributes', [])))
+                    # int64 values arrive as strings in OTLP/JSON
+                    try:
+                        value = int(data_point.get('asInt', data_point.get('asDouble', 0)))
+                    except (TypeError, ValueError):
+                        continue
+                    points.append((attrs, value, temporality, str(data_point.get('startTimeUnixNano', ''))))
+    return points
+
+def ingest_token_points(points):
+    """Fold a decoded batch into the per-session series under one lock acquisition"""
+    now = time.time()
+    updated = False
+    with state_lock:
+        for attrs, value, temporality, start_time in points:
+            token_type = attrs.get('type', 'unknown')
+            if token_type not in TOKEN_TYPES:
+                continue
+            record_data_point(attrs.get('session.id', 'unknown'), attrs.get('model', 'unknown'),
+                              token_type, value, temporality, start_time, now)
+            updated = True
+    # The flush thread persists the batch; nothing touches the disk here
+    if updated:
+        state_dirty.set()
+
+def parse_attributes(attributes):
+    """OTLP key/value attribute list -> dict of string values"""
+    attrs = {}
+    for attr in attributes:
+        val = attr.get('value', {})
+        if 'stringValue' in val:
+            attrs[attr.get('key', '')] = val['stringValue']
+    return attrs
 
 class OTLPHandler(BaseHTTPRequestHandler):
     def do_POST(self):
-        """Handle OTLP metric posts from Claude Code"""
-        global token_totals
+        """Handle OTLP metric posts (JSON or protobuf, optionally gzip/deflate) from Claude Code"""
+        content_type = (self.headers.get('Content-Type') or 'application/json').split(';')[0].strip().lower()
+        is_protobuf = content_type == 'application/x-protobuf'
         
-        content_length = int(self.headers['Content-Length'])
-        post_data = self.rfile.read(content_length)
+        try:
+            points = self._read_payload(content_type)
+        except PayloadError as e:
+            self._respond(e.status, is_protobuf, str(e))
+            return
         
         try:
-            data = json.loads(post_data)
-            
-            # Process OpenTelemetry metrics
-            if 'resourceMetrics' in data:
-                for resource_metric in data['resourceMetrics']:
-                    for scope_metric in resource_metric.get('scopeMetrics', []):
-                        for metric in scope_metric.get('metrics', []):
-                            if metric.get('name') == 'claude_code.token.usage':
-                                self._process_token_metric(metric)
+            ingest_token_points(points)
         except Exception as e:
             print(f"Error processing metrics: {e}")
         
-        # Always respond with 200 OK
-        self.send_response(200)
-        self.send_header('Content-Type', 'application/json')
-        self.end_headers()
-        self.wfile.write(b'{"status":"ok"}')
+        # Always respond with 200 OK once the payload decoded
+        self._respond(200, is_protobuf)
     
-    def _process_token_metric(self, metric):
-        """Extract and save token usage metrics"""
-        global token_totals
+    def _read_payload(self, content_type):
+        """Read, size-check, inflate and decode the request body into token data points"""
+        if content_type not in ('application/json', 'application/x-protobuf'):
+            self.close_connection = True
+            raise PayloadError(415, f"unsupported content type: {content_type}")
+        try:
+            content_length = int(self.headers['Content-Length'])
+        except (TypeError, ValueError):
+            self.close_connection = True
+            raise PayloadError(411, "Content-Length required")
+        if content_length > MAX_BODY_BYTES:
+            # Refuse before reading; the unread body makes the connection unusable
+            self.close_connection = True
+            raise PayloadError(413, "request body too large")
         
-        for data_point in metric.get('sum', {}).get('dataPoints', []):
-            # Extract attributes
-            attrs = {}
-            for attr in data_point.get('attributes', []):
-                key = attr.get('key', '')
-                val = attr.get('value', {})
-                if 'stringValue' in val:
-                    attrs[key] = val['stringValue']
-            
-            # Get the token count
-            value = data_point.get('asInt', 0)
-            token_type = attrs.get('type', 'unknown')
-            model = attrs.get('model', 'unknown')
-            
-            # Update totals
-            if token_type in token_totals:
-                token_totals[token_type] += value
-            
-            token_totals['lastUpdate'] = datetime.now().isoformat()
-            token_totals['model'] = model
-            
-            # Calculate total tokens used
-            total_used = token_totals['input'] + token_totals['output'] + \
-                        token_totals['cacheRead'] + token_totals['cacheCreation']
-            
-            # Save to file for statusline
-            metrics_data = {
-                'timestamp': datetime.now().isoformat(),
-                'totals': token_totals,
-                'totalUsed': total_used,
-                'model': model
-            }
-            
-            with open(METRICS_FILE, 'w') as f:
-                json.dump(metrics_data, f, indent=2)
-            
-            print(f"[{datetime.now().strftime('%H:%M:%S')}] Updated metrics - Total: {total_used:,} tokens")
+        body = decompress_body(self.rfile.read(content_length), self.headers.get('Content-Encoding'))
+        try:
+            if content_type == 'application/x-protobuf':
+                return protobuf_token_points(body)
+            return json_token_points(json.loads(body))
+        except (ValueError, IndexError, AttributeError, struct.error) as e:
+            raise PayloadError(400, f"invalid payload: {e}")
+    
+    def _respond(self, status, is_protobuf, message=None):
+        """Send an OTLP/HTTP response in the request's encoding"""
+        if status != 200:
+            print(f"Rejected metrics post ({status}): {message}")
+        if is_protobuf:
+            # An empty ExportMetricsServiceResponse encodes to zero bytes
+            body = b''
+            content_type = 'application/x-protobuf'
+        else:
+            body = b'{"status":"ok"}' if status == 200 else json.dumps({'message': message}).encode('utf-8')
+            content_type = 'application/json'
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
     
     def log_message(self, format, *args):
         """Suppress normal HTTP logging"""
@@ -104,10 +535,19 @@ def cleanup_old_metrics():
         METRICS_FILE.unlink()
         print(f"Cleaned up old metrics file")
 
+def open_metrics_snapshot():
+    """Map the binary snapshot; the proxy still works (JSON only) if that fails"""
+    global metrics_snapshot
+    try:
+        metrics_snapshot = MetricsSnapshot(SNAPSHOT_FILE)
+    except (OSError, ValueError) as e:
+        print(f"Binary snapshot disabled: {e}")
+
 def main():
     PORT = 4318  # OTLP HTTP port
     
     cleanup_old_metrics()
+    open_metrics_snapshot()
     
     print("=" * 60)
     print("Claude Code Token Metrics Proxy")
@@ -125,12 +565,22 @@ def main():
     print(f"Listening on port {PORT}...")
     print()
     
-    server = HTTPServer(('localhost', PORT), OTLPHandler)
+    stop_event = threading.Event()
+    flusher = threading.Thread(target=flush_loop, args=(stop_event,), daemon=True)
+    flusher.start()
+    
+    server = ThreadingHTTPServer(('localhost', PORT), OTLPHandler)
     try:
         server.serve_forever()
     except KeyboardInterrupt:
         print("\nShutting down...")
-        server.shutdown()
+    finally:
+        stop_event.set()
+        flusher.join()
+        flush_metrics()
+        server.server_close()
+        if metrics_snapshot is not None:
+            metrics_snapshot.close()
 
 if __name__ == '__main__':
     main()
\ No newline at end of file
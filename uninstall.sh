@@ -38,6 +38,7 @@ if [ -f "$STATUSLINE_SCRIPT" ]; then
 else
     echo -e "${YELLOW}!${NC} Statusline script not found at $STATUSLINE_SCRIPT"
 fi
+rm -f "$CLAUDE_DIR/statusline_models.py"
 
 # Update settings.json
 if [ -f "$CLAUDE_SETTINGS" ]; then